@@ -5,13 +5,22 @@
 # -----------------------
 
 import os
-import json
 import faiss
-from sentence_transformers import SentenceTransformer
+
+from almacen_chunks import escribir_almacen
+from articulos_io import iterar_articulos
+from build_faiss import iterar_chunks
+from deduplicacion import ALIAS_JSON, detectar_duplicados, filtrar_duplicados, guardar_alias
+from embedding_cache import encode_con_cache
+from fabrica_indices import indice_con_vectores
+from indice_lexico import publicar_lexico
+from registro_modelos import obtener_motor
 
 # Ruta al JSON que generaste con "fetch_full_articles.py".
 # Asegurate de que el nombre coincida exactamente con tu archivo.
 INPUT_JSON = "articulos_completos.json"
+# Si existe el .jsonl (salida en streaming de fetch_full_articles) lo preferimos
+INPUT_JSONL = "articulos_completos.jsonl"
 
 # Carpeta donde tenés los .txt, en caso quieras usar esos en lugar del JSON.
 # Si preferís leer los .txt en vez del JSON, seteá USE_JSON = False.
@@ -20,7 +29,8 @@ USE_JSON = True  # Cambiá a False si querés leer desde los .txt en lugar del J
 
 # Nombre de salida para el índice FAISS y el mapping
 FAISS_INDEX_FILE = "noticias_politica.index"
-MAPPING_PICKLE_FILE = "mapping_id2chunk.pkl"
+# El mapping es una carpeta con el almacén columnar de chunks (antes un pickle)
+MAPPING_DIR = "mapping_chunks"
 
 
 # Chunking parameters
@@ -28,6 +38,11 @@ MIN_CHARS = 300           # minimum characters to keep a chunk
 MAX_CHARS = 1000         # maximum characters per chunk before splitting
 OVERLAP_CHARS = 200      # overlap characters between subchunks
 
+# Contexto de los embeddings: "pooling" (promedio ponderado de embeddings vecinos
+# del mismo artículo) o "texto" (concatenar el texto de los vecinos y encodear)
+MODO_CONTEXTO = "pooling"
+PESO_VECINOS = 0.5       # peso de un vecino a distancia d: PESO_VECINOS ** d
+
 
 # ---------------------------
 # 2. Funciones de carga de datos
@@ -35,15 +50,14 @@ OVERLAP_CHARS = 200      # overlap characters between subchunks
 
 def cargar_articulos_desde_json(path_json):
     """
-    Lee el JSON que contiene la lista de artículos completos.
-    Cada elemento de la lista debe ser un diccionario con al menos la clave "texto".
-    Retorna esa lista de diccionarios.
+    Lee el JSON (o JSONL) que contiene los artículos completos.
+    Cada elemento debe ser un diccionario con al menos la clave "texto".
+    Retorna un generador que va leyendo los artículos de a uno, sin cargar
+    todo el archivo en memoria.
     """
     if not os.path.isfile(path_json):
         raise FileNotFoundError(f"No existe el archivo JSON: {path_json}")
-    with open(path_json, "r", encoding="utf-8") as f:
-        articulos = json.load(f)
-    return articulos
+    return iterar_articulos(path_json)
 
 
 def cargar_articulos_desde_txt(dir_txt):
@@ -74,36 +88,11 @@ def cargar_articulos_desde_txt(dir_txt):
 
 def chunkear_por_parrafos(articulos):
     """
-    Toma una lista de artículos (cada uno con al menos 'id' y 'texto'),
-    los divide en párrafos y devuelve una lista de chunks con:
-      - "doc_id": id original del artículo
-      - "chunk_id": identificador único del chunk (por ej. "art_001_p1")
-      - "texto": el texto de ese párrafo
-    Ignora párrafos demasiado cortos (< 50 caracteres).
+    Toma una lista de artículos (cada uno con al menos 'id' y 'texto')
+    y devuelve la lista de chunks con "doc_id", "chunk_id" y "texto".
+    Usa el mismo chunker que build_faiss, con los límites de este archivo.
     """
-    documentos = []
-    for art in articulos:
-        # Cada artículo: esperamos que tenga "id" y "texto"
-        doc_id = art.get("id", None)
-        if doc_id is None:
-            # Si el JSON venía con otro campo, podés adaptar aquí
-            # Por simplicidad, si falta "id" usamos un temporal
-            doc_id = f"art_{articulos.index(art):03d}"
-        texto_completo = art.get("texto", "")
-        # Dividimos por doble salto de línea: típico en noticias
-        parrafos = texto_completo.split("\n\n")
-        for i, parrafo in enumerate(parrafos, start=1):
-            parrafo = parrafo.strip()
-            if len(parrafo) < 50:
-                # Salteamos párrafos muy cortos (por ejemplo, títulos o frases sueltas)
-                continue
-            chunk_id = f"{doc_id}_p{i}"
-            documentos.append({
-                "doc_id": doc_id,
-                "chunk_id": chunk_id,
-                "texto": parrafo
-            })
-    return documentos
+    return list(iterar_chunks(articulos, MIN_CHARS, MAX_CHARS, OVERLAP_CHARS))
 
 
 
@@ -111,33 +100,76 @@ def chunkear_por_parrafos(articulos):
 # 4. Generación de embeddings y FAISS
 # -----------------------------------
 
-def crear_indice_faiss_con_contexto(documents, modelo_name="all-mpnet-base-v2", contexto=1):
+def pooling_con_vecinos(embeddings, doc_ids, contexto=1, peso_vecinos=None):
+    """
+    Arma el embedding "con contexto" de cada chunk como promedio ponderado de
+    su propio embedding y los de sus vecinos (hasta 'contexto' posiciones para
+    cada lado), sin cruzar de un artículo a otro. Un vecino a distancia d pesa
+    peso_vecinos ** d. Es una pasada vectorizada de NumPy: no encodea nada.
+    El resultado conserva la norma del embedding original de cada chunk.
+    """
+    import numpy as np
+
+    if peso_vecinos is None:
+        peso_vecinos = PESO_VECINOS
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    _, codigos = np.unique(np.asarray([str(d) for d in doc_ids]), return_inverse=True)
+
+    acumulado = embeddings.copy()
+    pesos = np.ones(n, dtype=np.float32)
+    for d in range(1, min(contexto, n - 1) + 1):
+        w = peso_vecinos ** d
+        mismo_doc = codigos[d:] == codigos[:-d]  # pares (i, i + d) del mismo artículo
+        # el chunk i suma a su vecino i + d ...
+        acumulado[:-d][mismo_doc] += w * embeddings[d:][mismo_doc]
+        pesos[:-d][mismo_doc] += w
+        # ... y el chunk i + d suma a su vecino i
+        acumulado[d:][mismo_doc] += w * embeddings[:-d][mismo_doc]
+        pesos[d:][mismo_doc] += w
+
+    pooled = acumulado / pesos[:, None]
+    normas_originales = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normas_pooled = np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled * (normas_originales / normas_pooled)
+
+
+def crear_indice_faiss_con_contexto(documents, modelo_name="all-mpnet-base-v2", contexto=1,
+                                    modo=MODO_CONTEXTO, peso_vecinos=PESO_VECINOS):
     """
     Crea embeddings para cada chunk, incluyendo contexto (chunks vecinos).
+    Dos modos:
+      - "pooling": encodea cada chunk una sola vez y después promedia con
+        pesos los embeddings de los vecinos del mismo artículo.
+      - "texto": concatena el texto de los vecinos y encodea eso (el método
+        original; cada chunk se encodea ~3 veces y cruza entre artículos).
     """
-    from sentence_transformers import SentenceTransformer
     import numpy as np
-    import faiss
 
     print("🔄 Cargando modelo de embeddings...")
-    modelo = SentenceTransformer(modelo_name)
-
-    print("🔢 Generando embeddings con contexto...")
-    textos_con_contexto = []
-    for i in range(len(documents)):
-        partes = []
-        for j in range(i - contexto, i + contexto + 1):
-            if j < 0 or j >= len(documents):
-                continue
-            partes.append(documents[j]['texto'])
-        texto_completo = " ".join(partes)
-        textos_con_contexto.append(texto_completo)
+    # Motor multi-proceso: batches por largo de tokens repartidos entre los cores
+    modelo = obtener_motor(modelo_name)
+
+    if modo == "pooling":
+        print("🔢 Generando embeddings (una vez por chunk) y sumando el contexto por pooling...")
+        textos = [doc["texto"] for doc in documents]
+        embeddings = encode_con_cache(modelo, textos, modelo_name, show_progress_bar=True, batch_size=32)
+        embeddings = pooling_con_vecinos(embeddings, [doc["doc_id"] for doc in documents], contexto, peso_vecinos)
+    else:
+        print("🔢 Generando embeddings con contexto...")
+        textos_con_contexto = []
+        for i in range(len(documents)):
+            partes = []
+            for j in range(i - contexto, i + contexto + 1):
+                if j < 0 or j >= len(documents):
+                    continue
+                partes.append(documents[j]['texto'])
+            texto_completo = " ".join(partes)
+            textos_con_contexto.append(texto_completo)
 
-    embeddings = modelo.encode(textos_con_contexto, show_progress_bar=True, batch_size=32)
+        embeddings = encode_con_cache(modelo, textos_con_contexto, modelo_name, show_progress_bar=True, batch_size=32)
 
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    index = indice_con_vectores(embeddings)
 
     return index, embeddings
 
@@ -145,21 +177,23 @@ def crear_indice_faiss_con_contexto(documents, modelo_name="all-mpnet-base-v2",
 # -----------------------------------
 # 5. Guardar índice y mapping
 # -----------------------------------
-import pickle  # para serializar la lista de documentos
-
 def guardar_indice_y_mapping(index, documents, index_path, mapping_path):
     """
-    Guarda el índice FAISS en index_path y la lista 'documents' en mapping_path (con pickle).
+    Guarda el índice FAISS en index_path y la lista 'documents' en mapping_path,
+    una carpeta con el almacén columnar de chunks (ver almacen_chunks.py) que
+    después se abre con mmap. El id de cada chunk es su posición en la lista.
+    En la misma carpeta queda el índice BM25 de los chunks (para la búsqueda híbrida).
     'documents' es la lista de dicts con 'chunk_id', 'doc_id' y 'texto'.
     """
     # 5.1. Guardar índice FAISS
     print(f"💾 Guardando índice FAISS en '{index_path}'...")
     faiss.write_index(index, index_path)
 
-    # 5.2. Guardar mapping (documentos) en pickle
+    # 5.2. Guardar mapping (documentos) en el almacén columnar
     print(f"💾 Guardando mapping (lista de chunks) en '{mapping_path}'...")
-    with open(mapping_path, "wb") as f:
-        pickle.dump(documents, f)
+    escribir_almacen(mapping_path, enumerate(documents))
+    print("💾 Armando el índice léxico (BM25) de los chunks...")
+    publicar_lexico(mapping_path, mapping_path, enumerate(documents))
 
     print("✅ Índice y mapping guardados con éxito.")
 
@@ -175,27 +209,36 @@ def build_faiss_index(use_json=True, ):
 
     # 6.1. Cargar artículos
     if USE_JSON:
-        print("🔍 Cargando artículos desde JSON...")
-        articulos = cargar_articulos_desde_json(INPUT_JSON)
+        path_articulos = INPUT_JSONL if os.path.isfile(INPUT_JSONL) else INPUT_JSON
+        print(f"🔍 Cargando artículos desde '{path_articulos}'...")
         # Esperamos que cada 'articulo' sea {"id": "...", "texto": "...", ...}
         # Si el JSON tiene otros campos (ej. "titulo", "link"), no los usamos aquí.
+        cargar_articulos = lambda: cargar_articulos_desde_json(path_articulos)
     else:
         print("🔍 Cargando artículos desde carpeta de .txt...")
-        articulos = cargar_articulos_desde_txt(ARTICULOS_TXT_DIR)
         # Aquí cada 'articulo' es {"id": "<nombre_sin_ext>", "texto": "<contenido>"}
+        cargar_articulos = lambda: cargar_articulos_desde_txt(ARTICULOS_TXT_DIR)
 
-    print(f"   • Cantidad de artículos cargados: {len(articulos)}")
+    # 6.1.1. Sacar casi-duplicados (la misma nota de agencia en varios medios,
+    # o la misma nota en varias secciones). Se recorre el archivo dos veces:
+    # la primera sólo calcula firmas MinHash, la segunda filtra.
+    print("🧬 Buscando artículos casi duplicados (MinHash + LSH)...")
+    alias_de = detectar_duplicados(cargar_articulos())
+    guardar_alias(alias_de, ALIAS_JSON)
+    print(f"   • {len(alias_de)} artículos duplicados asociados a su nota canónica (ver '{ALIAS_JSON}')")
+    articulos = filtrar_duplicados(cargar_articulos(), alias_de)
 
     # 6.2. Dividir en chunks (párrafos)
     print("✂️ Dividiendo artículos en chunks (párrafos)...")
     documents = chunkear_por_parrafos(articulos)
-    print(f"   • Total de chunks generados: {len(documents)}")
+    print(f"   • Total de chunks generados: {len(documents)} "
+          f"(de {len({doc['doc_id'] for doc in documents})} artículos)")
 
     # 6.3. Generar embeddings y crear índice FAISS
     index, embeddings = crear_indice_faiss_con_contexto(documents)
 
     # 6.4. Guardar índice y mapping
-    guardar_indice_y_mapping(index, documents, FAISS_INDEX_FILE, MAPPING_PICKLE_FILE)
+    guardar_indice_y_mapping(index, documents, FAISS_INDEX_FILE, MAPPING_DIR)
 
     print("\n🎉 ¡Proceso completado! Tenés tu índice FAISS listo para usar. 🎉\n")
 
@@ -0,0 +1,336 @@
+# almacen_chunks.py
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Almacén columnar de chunks, para no tener que deserializar un pickle con
+# todos los textos antes de poder contestar una consulta. Es una carpeta con:
+#   - meta.json:            cantidad de filas y tipo de cada columna
+#   - ids.npy:              id del vector de cada fila (int64)
+#   - posicion_por_id.npy:  tabla directa id -> fila (-1 si no está), para buscar en O(1)
+#   - <col>.npy:            columnas numéricas (int64 / float64), una por archivo
+#   - <col>.offsets.npy + <col>.blob: columnas de texto: los textos en UTF-8 uno
+#                           atrás del otro y dónde empieza cada uno
+#   - <col>.codigos.npy:    columnas categóricas (COLUMNAS_CATEGORICAS): un int32
+#                           por fila (-1 = sin valor); los valores van en meta.json
+#   - <col>.nulos.npy:      qué filas tienen None (bits empaquetados), si alguna tiene
+# Las columnas que mezclan tipos (183 y "art_001"), o con listas, dicts o
+# booleanos, se guardan como texto JSON ("json") y se decodifican al leer, así
+# cada valor vuelve tal cual entró. Enteros y floats en la misma columna
+# quedan como float64 (siguen sirviendo para filtrar por rango).
+# Todo se abre con mmap: abrir el almacén no lee nada y cada consulta toca
+# sólo las filas que devuelve.
+ARCHIVO_META = "meta.json"
+
+# Columnas con pocos valores distintos que se usan para filtrar búsquedas:
+# se guardan como códigos enteros, así un filtro es una comparación vectorizada
+COLUMNAS_CATEGORICAS = {"medio", "seccion"}
+
+
+def _tipo_valor(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, (bool, np.bool_)):
+        return "json"
+    if isinstance(valor, (int, np.integer)):
+        return "int64"
+    if isinstance(valor, (float, np.floating)):
+        return "float64"
+    if isinstance(valor, str):
+        return "texto"
+    return "json"
+
+
+def _combinar_tipos(actual, nuevo):
+    """Tipo de la columna después de agregar un valor de tipo 'nuevo'."""
+    if actual is None or nuevo is None or actual == nuevo:
+        return actual or nuevo
+    if {actual, nuevo} == {"int64", "float64"}:
+        return "float64"
+    return "json"
+
+
+def _a_json(valor):
+    # default: los escalares de numpy (np.int64, np.float32...) pasan a los de Python
+    return json.dumps(valor, ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+
+class _Columna:
+    """
+    Columna que se va escribiendo fila por fila. Mientras todos los valores
+    sean números (o None) se guardan en memoria (son chicos); en cuanto
+    aparece un texto pasa a ser columna de texto y se escribe directo al
+    .blob. Si los tipos se mezclan pasa a "json" (lo ya escrito se reescribe).
+    Los None se anotan aparte (ver <col>.nulos.npy).
+    """
+    def __init__(self, directorio, clave, filas_previas):
+        self.directorio = directorio
+        self.clave = clave
+        self.tipo = "categoria" if clave in COLUMNAS_CATEGORICAS else None
+        self.categorias = {}
+        self.numeros = []
+        self.nulos = bytearray()
+        self.blob = None
+        self.offsets = [0]
+        for _ in range(filas_previas):
+            self.agregar(None)
+
+    def _path(self, sufijo):
+        return os.path.join(self.directorio, f"{self.clave}{sufijo}")
+
+    def _escribir(self, valor):
+        if valor is None:
+            datos = b""
+        elif self.tipo == "json":
+            datos = _a_json(valor).encode("utf-8")
+        else:
+            datos = valor.encode("utf-8")
+        self.blob.write(datos)
+        self.offsets.append(self.offsets[-1] + len(datos))
+
+    def _cambiar_a(self, tipo):
+        if tipo in ("int64", "float64"):
+            self.tipo = tipo  # los números siguen en memoria
+            return
+        if self.tipo == "texto":
+            # texto -> json: se releen los textos ya escritos y se reescriben como JSON
+            self.blob.close()
+            with open(self._path(".blob"), "rb") as f:
+                datos = f.read()
+            anteriores = [
+                None if nulo else datos[inicio:fin].decode("utf-8")
+                for nulo, inicio, fin in zip(self.nulos, self.offsets[:-1], self.offsets[1:])
+            ]
+        else:
+            anteriores = self.numeros
+        self.blob = open(self._path(".blob"), "wb")
+        self.numeros, self.offsets, self.tipo = [], [0], tipo
+        for valor in anteriores:
+            self._escribir(valor)
+
+    def agregar(self, valor):
+        if self.tipo == "categoria":
+            if valor is None:
+                self.numeros.append(-1)
+            else:
+                self.numeros.append(self.categorias.setdefault(str(valor), len(self.categorias)))
+            return
+        tipo = _combinar_tipos(self.tipo, _tipo_valor(valor))
+        if tipo != self.tipo:
+            self._cambiar_a(tipo)
+        self.nulos.append(valor is None)
+        if self.tipo in ("texto", "json"):
+            self._escribir(valor)
+        else:
+            self.numeros.append(valor)
+
+    def cerrar(self):
+        if self.tipo == "categoria":
+            np.save(self._path(".codigos.npy"), np.asarray(self.numeros, dtype=np.int32))
+            return self.tipo
+        if any(self.nulos):
+            np.save(self._path(".nulos.npy"),
+                    np.packbits(np.frombuffer(bytes(self.nulos), dtype=np.uint8), bitorder="little"))
+        if self.tipo in ("texto", "json"):
+            self.blob.close()
+            np.save(self._path(".offsets.npy"), np.asarray(self.offsets, dtype=np.uint64))
+            return self.tipo
+        self.tipo = self.tipo or "float64"  # (columna toda en None)
+        relleno = 0 if self.tipo == "int64" else np.nan
+        valores = [relleno if v is None else v for v in self.numeros]
+        np.save(self._path(".npy"), np.asarray(valores, dtype=self.tipo))
+        return self.tipo
+
+
+def escribir_almacen(directorio, chunks):
+    """
+    Escribe el almacén en 'directorio' a partir de 'chunks', un iterable de
+    (id_del_vector, chunk) con ids enteros >= 0. Todas las claves de los chunks
+    pasan a ser columnas. Se escribe en una carpeta temporal que se renombra
+    al final. Retorna la cantidad de filas.
+    """
+    tmp = f"{directorio}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    ids, columnas = [], {}
+    for vector_id, chunk in chunks:
+        for clave in chunk:
+            if clave not in columnas:
+                columnas[clave] = _Columna(tmp, clave, len(ids))
+        ids.append(int(vector_id))
+        for clave, columna in columnas.items():
+            columna.agregar(chunk.get(clave))
+
+    ids = np.asarray(ids, dtype=np.int64)
+    np.save(os.path.join(tmp, "ids.npy"), ids)
+    posicion_por_id = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+    posicion_por_id[ids] = np.arange(len(ids), dtype=np.int64)
+    np.save(os.path.join(tmp, "posicion_por_id.npy"), posicion_por_id)
+
+    tipos = {clave: columna.cerrar() for clave, columna in columnas.items()}
+    categorias = {clave: list(columna.categorias) for clave, columna in columnas.items() if columna.tipo == "categoria"}
+
+    with open(os.path.join(tmp, ARCHIVO_META), "w", encoding="utf-8") as f:
+        json.dump({"filas": len(ids), "columnas": tipos, "categorias": categorias}, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(tmp, directorio)
+    return len(ids)
+
+
+class AlmacenChunks:
+    """
+    Lector del almacén (todo con mmap). Se usa como un dict de sólo lectura
+    {id del vector: chunk}: almacen[id], almacen.get(id), id in almacen,
+    len(almacen). Para leer una sola columna sin armar dicts: texto(id) o columna(nombre).
+    Los valores vuelven con el tipo con que se escribieron (None incluido).
+    ids_filtrados(filtros) devuelve los ids que cumplen filtros por metadatos.
+    """
+    def __init__(self, directorio):
+        self.directorio = directorio
+        with open(os.path.join(directorio, ARCHIVO_META), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.filas = meta["filas"]
+        self.tipos = meta["columnas"]
+        self.categorias = meta.get("categorias", {})
+        self._ids = self._abrir("ids.npy")
+        self._posicion_por_id = self._abrir("posicion_por_id.npy")
+        self._numericas = {}
+        self._textos = {}
+        self._codigos = {}
+        self._nulos = {}
+        for clave, tipo in self.tipos.items():
+            # (los almacenes escritos antes no tienen .nulos.npy)
+            if os.path.isfile(os.path.join(directorio, f"{clave}.nulos.npy")):
+                self._nulos[clave] = self._abrir(f"{clave}.nulos.npy")
+            if tipo == "categoria":
+                self._codigos[clave] = self._abrir(f"{clave}.codigos.npy")
+            elif tipo in ("texto", "json"):
+                offsets = self._abrir(f"{clave}.offsets.npy")
+                path_blob = os.path.join(directorio, f"{clave}.blob")
+                # np.memmap no acepta archivos vacíos
+                blob = np.memmap(path_blob, dtype=np.uint8, mode="r") if os.path.getsize(path_blob) else None
+                self._textos[clave] = (offsets, blob)
+            else:
+                self._numericas[clave] = self._abrir(f"{clave}.npy")
+
+    def _abrir(self, nombre):
+        return np.load(os.path.join(self.directorio, nombre), mmap_mode="r")
+
+    def fila(self, vector_id):
+        """Fila del id (o -1 si no está)."""
+        vector_id = int(vector_id)
+        if vector_id < 0 or vector_id >= len(self._posicion_por_id):
+            return -1
+        return int(self._posicion_por_id[vector_id])
+
+    def _es_nulo(self, clave, fila):
+        nulos = self._nulos.get(clave)
+        return nulos is not None and bool((int(nulos[fila >> 3]) >> (fila & 7)) & 1)
+
+    def _mascara_no_nulos(self, clave):
+        nulos = self._nulos.get(clave)
+        if nulos is None:
+            return np.ones(self.filas, dtype=bool)
+        return ~np.unpackbits(np.asarray(nulos), count=self.filas, bitorder="little").astype(bool)
+
+    def _valor(self, clave, fila):
+        if clave in self._codigos:
+            codigo = int(self._codigos[clave][fila])
+            return self.categorias[clave][codigo] if codigo >= 0 else None
+        if self._es_nulo(clave, fila):
+            return None
+        if clave in self._numericas:
+            valor = self._numericas[clave][fila].item()
+            return None if valor != valor else valor  # NaN -> None (almacenes viejos)
+        offsets, blob = self._textos[clave]
+        inicio, fin = int(offsets[fila]), int(offsets[fila + 1])
+        texto = bytes(blob[inicio:fin]).decode("utf-8") if fin > inicio else ""
+        return json.loads(texto) if self.tipos[clave] == "json" else texto
+
+    def texto(self, vector_id, clave="texto"):
+        fila = self.fila(vector_id)
+        if fila < 0:
+            raise KeyError(vector_id)
+        return self._valor(clave, fila)
+
+    def columna(self, clave):
+        """
+        Columna numérica entera (array mapeado en memoria, en orden de filas).
+        Para las categóricas devuelve los códigos (ver self.categorias[clave]).
+        En las int64 las filas con None valen 0 (ver <col>.nulos.npy).
+        """
+        if clave in self._codigos:
+            return self._codigos[clave]
+        return self._numericas[clave]
+
+    def _mascara(self, clave, condicion):
+        if clave not in self.tipos:
+            return np.zeros(self.filas, dtype=bool)  # almacén escrito antes de tener esa columna
+        if clave in self._codigos:
+            valores = [condicion] if isinstance(condicion, str) else condicion
+            codigos = [self.categorias[clave].index(v) for v in valores if v in self.categorias[clave]]
+            return np.isin(self._codigos[clave], codigos)
+        if clave in self._numericas:
+            minimo, maximo = condicion
+            columna = self._numericas[clave]
+            mascara = self._mascara_no_nulos(clave)
+            if columna.dtype.kind == "f":
+                mascara &= ~np.isnan(columna)
+            if minimo is not None:
+                mascara &= columna >= minimo
+            if maximo is not None:
+                mascara &= columna <= maximo
+            return mascara
+        raise ValueError(f"No se puede filtrar por la columna de {self.tipos[clave]} '{clave}'")
+
+    def ids_filtrados(self, filtros):
+        """
+        Ids (int64, ordenados por fila) de los chunks que cumplen todos los
+        'filtros': {columna: valor o lista de valores} para las categóricas y
+        {columna: (mínimo, máximo)} para las numéricas (None = sin límite).
+        """
+        mascara = np.ones(self.filas, dtype=bool)
+        for clave, condicion in filtros.items():
+            if condicion is not None:
+                mascara &= self._mascara(clave, condicion)
+        return np.asarray(self._ids[mascara], dtype=np.int64)
+
+    def ids(self):
+        return self._ids
+
+    def __getitem__(self, vector_id):
+        fila = self.fila(vector_id)
+        if fila < 0:
+            raise KeyError(vector_id)
+        return {clave: self._valor(clave, fila) for clave in self.tipos}
+
+    def get(self, vector_id, default=None):
+        try:
+            return self[vector_id]
+        except KeyError:
+            return default
+
+    def contiene_ids(self, ids):
+        """Máscara (vectorizada) de cuáles de 'ids' están en el almacén."""
+        ids = np.asarray(ids, dtype=np.int64)
+        dentro = (ids >= 0) & (ids < len(self._posicion_por_id))
+        mascara = np.zeros(len(ids), dtype=bool)
+        mascara[dentro] = self._posicion_por_id[ids[dentro]] >= 0
+        return mascara
+
+    def __contains__(self, vector_id):
+        return self.fila(vector_id) >= 0
+
+    def __len__(self):
+        return self.filas
+
+    def __iter__(self):
+        return iter(self._ids.tolist())
+
+    def items(self):
+        for fila, vector_id in enumerate(self._ids.tolist()):
+            yield vector_id, {clave: self._valor(clave, fila) for clave in self.tipos}
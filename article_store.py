@@ -0,0 +1,163 @@
+# article_store.py
+
+import hashlib
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Base SQLite donde quedan todos los artículos que ya bajamos.
+# La clave es la URL canonicalizada; el id es estable entre corridas.
+ARTICLE_STORE_DB = "articulos.db"
+
+# Parámetros de query que no cambian el artículo (tracking de los medios / redes)
+PARAMS_TRACKING = {"fbclid", "gclid", "ref", "ref_src", "mc_cid", "mc_eid", "outputtype"}
+
+# Partes del path de un feed que no dicen nada de la sección
+PARTES_GENERICAS_FEED = {"rss", "feed", "feeds", "secciones", "seccion", "notas", "arc", "outboundfeeds", "xml"}
+
+
+def canonicalizar_url(url):
+    """
+    Normaliza una URL para que el mismo artículo siempre tenga la misma clave:
+      - esquema y host en minúscula (sin "www.")
+      - sin fragmento (#...)
+      - sin parámetros de tracking (utm_*, fbclid, ...) y con el resto ordenado
+      - sin "/" final en el path
+    """
+    partes = urlsplit(url.strip())
+    host = partes.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    params = [
+        (k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in PARAMS_TRACKING
+    ]
+    path = partes.path.rstrip("/") or "/"
+    return urlunsplit((partes.scheme.lower(), host, path, urlencode(sorted(params)), ""))
+
+
+def medio_de_url(url):
+    """Dominio del medio ("clarin.com", "pagina12.com.ar", ...) o None."""
+    if not url:
+        return None
+    host = urlsplit(url.strip()).netloc.lower()
+    return (host[4:] if host.startswith("www.") else host) or None
+
+
+def seccion_de_feed(url):
+    """
+    Sección sacada de la URL del feed: ".../rss/secciones/economia/notas" ->
+    "economia", ".../feed/politica" -> "politica". None si el feed no dice (feed general).
+    """
+    if not url:
+        return None
+    partes = [p for p in urlsplit(url.strip()).path.lower().split("/") if p and p not in PARTES_GENERICAS_FEED]
+    return partes[-1] if partes else None
+
+
+def hash_contenido(texto):
+    """Hash del texto del artículo (ignorando diferencias de espacios)."""
+    normalizado = re.sub(r"\s+", " ", texto or "").strip()
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+class ArticleStore:
+    """
+    Guarda los artículos bajados en SQLite, indexados por URL canonicalizada.
+    Permite saber si un link ya lo tenemos (y con qué ETag / Last-Modified /
+    hash de contenido) para no volver a bajarlo, y le da a cada artículo un id
+    que no cambia entre corridas.
+    """
+    def __init__(self, path=ARTICLE_STORE_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS articulos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url_canonica TEXT UNIQUE NOT NULL,
+                link TEXT,
+                titulo TEXT,
+                fecha TEXT,
+                feed TEXT,
+                archivo_txt TEXT,
+                texto TEXT,
+                hash_contenido TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                creado TEXT,
+                actualizado TEXT
+            )
+        """)
+        # Bases creadas antes de guardar el feed de cada artículo
+        columnas = {fila["name"] for fila in self.conn.execute("PRAGMA table_info(articulos)")}
+        if "feed" not in columnas:
+            self.conn.execute("ALTER TABLE articulos ADD COLUMN feed TEXT")
+        self.conn.commit()
+
+    def buscar(self, url):
+        """Devuelve el artículo guardado para 'url' (como dict) o None."""
+        with self.lock:
+            fila = self.conn.execute(
+                "SELECT * FROM articulos WHERE url_canonica = ?", (canonicalizar_url(url),)
+            ).fetchone()
+        return dict(fila) if fila is not None else None
+
+    def guardar(self, ent, texto, etag=None, last_modified=None):
+        """
+        Inserta o actualiza el artículo de la entrada 'ent'.
+        Retorna (articulo, cambio): 'cambio' es False si el texto es igual al
+        que ya teníamos (en ese caso sólo se refrescan los metadatos).
+        """
+        url_canonica = canonicalizar_url(ent.get("link"))
+        nuevo_hash = hash_contenido(texto)
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            previo = self.conn.execute(
+                "SELECT id, hash_contenido FROM articulos WHERE url_canonica = ?", (url_canonica,)
+            ).fetchone()
+            if previo is None:
+                cursor = self.conn.execute(
+                    """INSERT INTO articulos (url_canonica, link, titulo, fecha, feed, texto, hash_contenido,
+                                              etag, last_modified, creado, actualizado)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (url_canonica, ent.get("link"), ent.get("titulo", ""), ent.get("fecha", ""), ent.get("feed"),
+                     texto, nuevo_hash, etag, last_modified, ahora, ahora),
+                )
+                art_id, cambio = cursor.lastrowid, True
+            else:
+                art_id, cambio = previo["id"], previo["hash_contenido"] != nuevo_hash
+                self.conn.execute(
+                    """UPDATE articulos SET link = ?, titulo = ?, fecha = ?, feed = COALESCE(?, feed), texto = ?,
+                                            hash_contenido = ?, etag = ?, last_modified = ?,
+                                            actualizado = CASE WHEN ? THEN ? ELSE actualizado END
+                       WHERE id = ?""",
+                    (ent.get("link"), ent.get("titulo", ""), ent.get("fecha", ""), ent.get("feed"), texto,
+                     nuevo_hash, etag, last_modified, cambio, ahora, art_id),
+                )
+            self.conn.commit()
+        return self.obtener(art_id), cambio
+
+    def set_archivo_txt(self, art_id, archivo_txt):
+        with self.lock:
+            self.conn.execute("UPDATE articulos SET archivo_txt = ? WHERE id = ?", (archivo_txt, art_id))
+            self.conn.commit()
+
+    def obtener(self, art_id):
+        with self.lock:
+            fila = self.conn.execute("SELECT * FROM articulos WHERE id = ?", (art_id,)).fetchone()
+        return dict(fila) if fila is not None else None
+
+    def recientes(self, limite):
+        """Devuelve los últimos 'limite' artículos guardados (sin el texto)."""
+        with self.lock:
+            filas = self.conn.execute(
+                "SELECT id, url_canonica, link, titulo, fecha FROM articulos ORDER BY id DESC LIMIT ?", (limite,)
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def cerrar(self):
+        self.conn.close()
@@ -0,0 +1,161 @@
+# articulos_io.py
+
+import json
+import os
+
+# Tamaño de lectura cuando recorremos un JSON grande de a pedazos
+TAMANO_BLOQUE = 1 << 16
+
+
+class EscritorJSONL:
+    """
+    Escribe un artículo (dict) por línea y hace flush después de cada uno,
+    así si el proceso se corta no se pierde lo que ya se bajó.
+    Usar como context manager:
+
+        with EscritorJSONL("articulos_completos.jsonl") as escritor:
+            escritor.escribir(articulo)
+    """
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.f = None
+        self.escritos = 0
+
+    def __enter__(self):
+        if self.append and os.path.isfile(self.path):
+            _recortar_linea_incompleta(self.path)
+        self.f = open(self.path, "a" if self.append else "w", encoding="utf-8")
+        return self
+
+    def escribir(self, articulo):
+        self.f.write(json.dumps(articulo, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.escritos += 1
+
+    def __exit__(self, *exc):
+        self.f.close()
+        return False
+
+
+def _recortar_linea_incompleta(path):
+    """Si el .jsonl quedó cortado a mitad de una línea, descarta ese pedazo."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        if tamano == 0:
+            return
+        f.seek(tamano - 1)
+        if f.read(1) == b"\n":
+            return
+        # Buscamos el último salto de línea hacia atrás
+        pos = tamano - 1
+        while pos > 0:
+            inicio = max(0, pos - TAMANO_BLOQUE)
+            f.seek(inicio)
+            bloque = f.read(pos - inicio)
+            corte = bloque.rfind(b"\n")
+            if corte != -1:
+                f.truncate(inicio + corte + 1)
+                return
+            pos = inicio
+        f.truncate(0)
+
+
+def _iterar_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                # Última línea a medio escribir de una corrida que se cortó
+                print(f"⚠️ Ignoro una línea incompleta en '{path}'")
+
+
+def _iterar_array_json(path, tamano_bloque=TAMANO_BLOQUE):
+    """Recorre un JSON del tipo [ {...}, {...} ] sin cargarlo entero en memoria."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+
+        def _llenar():
+            nonlocal buffer, pos, eof
+            bloque = f.read(tamano_bloque)
+            eof = not bloque
+            buffer, pos = buffer[pos:] + bloque, 0
+
+        empezo = False
+        while True:
+            # Salteamos espacios, comas y el "[" inicial
+            while pos < len(buffer) and (buffer[pos] in " \t\r\n," or (buffer[pos] == "[" and not empezo)):
+                empezo = empezo or buffer[pos] == "["
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                _llenar()
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                obj, fin = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                _llenar()
+                continue
+            if fin == len(buffer) and not eof:
+                # Puede haber quedado cortado justo al final del bloque
+                _llenar()
+                continue
+            pos = fin
+            yield obj
+
+
+def iterar_articulos(path):
+    """
+    Devuelve un generador con los artículos de 'path', de a uno, sin cargar
+    todo el archivo en memoria. Acepta tanto .jsonl (uno por línea) como el
+    .json clásico con la lista completa.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No existe el archivo: {path}")
+    if path.endswith(".jsonl"):
+        return _iterar_jsonl(path)
+    return _iterar_array_json(path)
+
+
+def jsonl_a_json(path_jsonl, path_json):
+    """
+    Arma el JSON clásico (lista de artículos) a partir del .jsonl,
+    escribiendo de a un artículo para no tener todo en memoria.
+    """
+    tmp_path = f"{path_json}.tmp"
+    cantidad = 0
+    with open(tmp_path, "w", encoding="utf-8") as f_json:
+        f_json.write("[")
+        for articulo in _iterar_jsonl(path_jsonl):
+            f_json.write(",\n  " if cantidad else "\n  ")
+            f_json.write(json.dumps(articulo, ensure_ascii=False))
+            cantidad += 1
+        f_json.write("\n]\n" if cantidad else "]\n")
+    os.replace(tmp_path, path_json)
+    return cantidad
+
+
+def cargar_checkpoint(path):
+    """Lee el checkpoint de la corrida (o None si no hay)."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
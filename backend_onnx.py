@@ -0,0 +1,143 @@
+# backend_onnx.py
+
+import argparse
+import os
+import random
+import re
+import shutil
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Backend de inferencia para los modelos de embeddings:
+#   "torch": SentenceTransformer normal, en fp32
+#   "onnx":  el modelo exportado a ONNX con cuantización dinámica int8 (se exporta
+#            una sola vez y queda cacheado en ONNX_CACHE_DIR)
+BACKEND_EMBEDDINGS = "torch"
+ONNX_CACHE_DIR = "modelos_onnx"
+
+# Configuración de cuantización de optimum: "avx512_vnni", "avx512", "avx2" o "arm64"
+CONFIG_CUANTIZACION = "avx512_vnni"
+
+# Chequeo de paridad: coseno mínimo promedio entre fp32 e int8 para aceptar el int8
+UMBRAL_PARIDAD = 0.98
+MUESTRA_PARIDAD = 500
+
+
+def _carpeta_onnx(modelo_name, config=CONFIG_CUANTIZACION):
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", modelo_name).strip("_")
+    return os.path.join(ONNX_CACHE_DIR, f"{slug}_{config}")
+
+
+def _archivo_cuantizado(config=CONFIG_CUANTIZACION):
+    # Ruta (relativa a la carpeta del modelo) que genera export_dynamic_quantized_onnx_model
+    return f"onnx/model_qint8_{config}.onnx"
+
+
+def exportar_onnx_int8(modelo_name, config=CONFIG_CUANTIZACION):
+    """
+    Exporta 'modelo_name' a ONNX y lo cuantiza a int8 (cuantización dinámica).
+    Si ya está exportado no hace nada. Retorna la carpeta del modelo exportado.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    carpeta = _carpeta_onnx(modelo_name, config)
+    if os.path.isfile(os.path.join(carpeta, _archivo_cuantizado(config))):
+        return carpeta
+
+    print(f"📦 Exportando '{modelo_name}' a ONNX int8 ({config}), esto se hace una sola vez...")
+    # Exportamos en una carpeta temporal y la renombramos al final, así un
+    # corte a mitad de camino no deja un modelo roto en el cache
+    tmp = f"{carpeta}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    modelo = SentenceTransformer(modelo_name, backend="onnx", device="cpu")
+    modelo.save(tmp)
+    export_dynamic_quantized_onnx_model(modelo, config, tmp)
+    shutil.rmtree(carpeta, ignore_errors=True)
+    os.replace(tmp, carpeta)
+    print(f"   • Guardado en '{carpeta}'")
+    return carpeta
+
+
+def cargar_modelo(modelo_name, backend=None, device="cpu", hilos=None):
+    """
+    Carga el modelo de embeddings con el backend pedido (por defecto
+    BACKEND_EMBEDDINGS). Con "onnx" devuelve un SentenceTransformer que corre
+    el modelo int8 con onnxruntime; la interfaz (encode, tokenizer, ...) es la misma.
+    'hilos' limita los threads de onnxruntime (para cuando hay varios procesos).
+    """
+    backend = backend or BACKEND_EMBEDDINGS
+    if backend == "torch":
+        return SentenceTransformer(modelo_name, device=device)
+    if backend == "onnx":
+        carpeta = exportar_onnx_int8(modelo_name)
+        model_kwargs = {"file_name": _archivo_cuantizado()}
+        if hilos:
+            import onnxruntime
+            opciones = onnxruntime.SessionOptions()
+            opciones.intra_op_num_threads = hilos
+            model_kwargs["session_options"] = opciones
+        return SentenceTransformer(carpeta, backend="onnx", device="cpu", model_kwargs=model_kwargs)
+    raise ValueError(f"Backend de embeddings desconocido: '{backend}' (usar 'torch' u 'onnx')")
+
+
+def verificar_paridad(modelo_name, textos, umbral=UMBRAL_PARIDAD, top_k=10):
+    """
+    Compara el modelo fp32 (torch) con el int8 (onnx) sobre 'textos':
+      - coseno entre el embedding fp32 y el int8 de cada texto
+      - solapamiento de los top_k vecinos de cada texto dentro de la muestra
+    Retorna un dict con las métricas y "ok" (coseno medio >= umbral).
+    """
+    fp32 = cargar_modelo(modelo_name, "torch")
+    int8 = cargar_modelo(modelo_name, "onnx")
+    a = fp32.encode(textos, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+    b = int8.encode(textos, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+    cosenos = np.sum(a * b, axis=1)
+
+    k = min(top_k, len(textos) - 1)
+    solapamiento = None
+    if k > 0:
+        sims_a, sims_b = a @ a.T, b @ b.T
+        np.fill_diagonal(sims_a, -np.inf)
+        np.fill_diagonal(sims_b, -np.inf)
+        vecinos_a = np.argpartition(-sims_a, k, axis=1)[:, :k]
+        vecinos_b = np.argpartition(-sims_b, k, axis=1)[:, :k]
+        solapamiento = float(np.mean([len(set(x) & set(y)) / k for x, y in zip(vecinos_a, vecinos_b)]))
+
+    return {
+        "textos": len(textos),
+        "coseno_medio": round(float(cosenos.mean()), 4),
+        "coseno_min": round(float(cosenos.min()), 4),
+        "coseno_p1": round(float(np.percentile(cosenos, 1)), 4),
+        f"solapamiento_top{k}": round(solapamiento, 4) if solapamiento is not None else None,
+        "ok": bool(cosenos.mean() >= umbral),
+    }
+
+
+def muestra_de_chunks(path, n=MUESTRA_PARIDAD, semilla=0):
+    """Toma n chunks al azar de los artículos en 'path' (mismo chunking que build_faiss)."""
+    from articulos_io import iterar_articulos
+    from build_faiss import iterar_chunks
+
+    textos = [chunk["texto"] for chunk in iterar_chunks(iterar_articulos(path))]
+    random.Random(semilla).shuffle(textos)
+    return textos[:n]
+
+
+if __name__ == "__main__":
+    from build_faiss import EMBEDDING_MODEL_NAME, INPUT_JSONL
+
+    parser = argparse.ArgumentParser(description="Exporta el modelo a ONNX int8 y compara contra fp32")
+    parser.add_argument("--modelo", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--corpus", default=INPUT_JSONL)
+    parser.add_argument("--muestra", type=int, default=MUESTRA_PARIDAD)
+    args = parser.parse_args()
+
+    exportar_onnx_int8(args.modelo)
+    textos = muestra_de_chunks(args.corpus, args.muestra)
+    print(f"🔬 Comparando fp32 vs int8 sobre {len(textos)} chunks de '{args.corpus}'...")
+    resultado = verificar_paridad(args.modelo, textos)
+    for clave, valor in resultado.items():
+        print(f"   • {clave}: {valor}")
+    print("✅ El modelo int8 está a la par del fp32." if resultado["ok"]
+          else f"⚠️ Coseno medio por debajo de {UMBRAL_PARIDAD}: conviene seguir con BACKEND_EMBEDDINGS = 'torch'.")
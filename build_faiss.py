@@ -5,13 +5,25 @@
 # -----------------------
 
 import os
-import json
+import re
 import faiss
-from sentence_transformers import SentenceTransformer
+
+from almacen_chunks import escribir_almacen
+from article_store import medio_de_url, seccion_de_feed
+from articulos_io import iterar_articulos
+from deduplicacion import ALIAS_JSON, detectar_duplicados, filtrar_duplicados, guardar_alias
+from embedding_cache import encode_con_cache
+from fabrica_indices import TIPO_INDICE, crear_indice
+from indice_incremental import INDICES_DIR, actualizar_indice, parsear_fecha
+from indice_lexico import publicar_lexico
+from indice_particionado import PARTICIONES_DIR, actualizar_particiones
+from registro_modelos import obtener_motor
 
 # Ruta al JSON que generaste con "fetch_full_articles.py".
 # Asegurate de que el nombre coincida exactamente con tu archivo.
 INPUT_JSON = "articulos_completos.json"
+# Si existe el .jsonl (salida en streaming de fetch_full_articles) lo preferimos
+INPUT_JSONL = "articulos_completos.jsonl"
 
 # Carpeta donde tenés los .txt, en caso quieras usar esos en lugar del JSON.
 # Si preferís leer los .txt en vez del JSON, seteá USE_JSON = False.
@@ -20,7 +32,8 @@ USE_JSON = True  # Cambiá a False si querés leer desde los .txt en lugar del J
 
 # Nombre de salida para el índice FAISS y el mapping
 FAISS_INDEX_FILE = "noticias_politica.index"
-MAPPING_PICKLE_FILE = "mapping_id2chunk.pkl"
+# El mapping es una carpeta con el almacén columnar de chunks (antes un pickle)
+MAPPING_DIR = "mapping_chunks"
 
 
 # Chunking parameters
@@ -28,6 +41,23 @@ MIN_CHARS = 300           # minimum characters to keep a chunk
 MAX_CHARS = 1000         # maximum characters per chunk before splitting
 OVERLAP_CHARS = 200      # overlap characters between subchunks
 
+# Modo de chunking: "caracteres" (MIN/MAX/OVERLAP_CHARS) o "tokens" (cuenta tokens
+# con el tokenizer del modelo y arma chunks de hasta TOKENS_POR_CHUNK tokens)
+MODO_CHUNKING = "caracteres"
+TOKENS_POR_CHUNK = None   # None = max_seq_length del modelo menos los tokens especiales
+LOTE_TOKENIZADOR = 32     # artículos que se tokenizan juntos en una sola llamada
+
+# Modelo de embeddings
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Modo de armado del índice:
+#   "particionado": un índice incremental por día de publicación en PARTICIONES_DIR
+#                   (ver indice_particionado.py); las consultas sólo abren los días pedidos
+#   "incremental": actualiza el índice publicado en INDICES_DIR (sólo vectoriza
+#                  lo nuevo o cambiado, borra lo vencido) y publica una versión nueva
+#   "completo":    rearma todo desde cero en FAISS_INDEX_FILE + MAPPING_DIR
+MODO_INDICE = "particionado"
+
 
 # ---------------------------
 # 2. Funciones de carga de datos
@@ -35,15 +65,14 @@ OVERLAP_CHARS = 200      # overlap characters between subchunks
 
 def cargar_articulos_desde_json(path_json):
     """
-    Lee el JSON que contiene la lista de artículos completos.
-    Cada elemento de la lista debe ser un diccionario con al menos la clave "texto".
-    Retorna esa lista de diccionarios.
+    Lee el JSON (o JSONL) que contiene los artículos completos.
+    Cada elemento debe ser un diccionario con al menos la clave "texto".
+    Retorna un generador que va leyendo los artículos de a uno, sin cargar
+    todo el archivo en memoria.
     """
     if not os.path.isfile(path_json):
         raise FileNotFoundError(f"No existe el archivo JSON: {path_json}")
-    with open(path_json, "r", encoding="utf-8") as f:
-        articulos = json.load(f)
-    return articulos
+    return iterar_articulos(path_json)
 
 
 def cargar_articulos_desde_txt(dir_txt):
@@ -72,38 +101,234 @@ def cargar_articulos_desde_txt(dir_txt):
 # 3. Función para chunkear (por párrafos)
 # -----------------------------------
 
-def chunkear_por_parrafos(articulos):
+# Piso absoluto: un fragmento suelto más corto que esto no vale la pena (títulos, frases sueltas)
+PISO_CHARS = 50
+
+
+def _partir_texto_largo(texto, max_chars=MAX_CHARS, overlap_chars=OVERLAP_CHARS):
     """
-    Toma una lista de artículos (cada uno con al menos 'id' y 'texto'),
-    los divide en párrafos y devuelve una lista de chunks con:
+    Parte un texto más largo que max_chars en ventanas de hasta max_chars,
+    cada una solapada overlap_chars con la anterior. Intenta cortar al final de
+    una oración (o al menos entre palabras) para no partir palabras al medio.
+    """
+    inicio, n = 0, len(texto)
+    while inicio < n:
+        fin = min(n, inicio + max_chars)
+        if fin < n:
+            minimo = inicio + max_chars // 2
+            corte = texto.rfind(". ", minimo, fin)
+            if corte != -1:
+                fin = corte + 1
+            else:
+                espacio = texto.rfind(" ", minimo, fin)
+                if espacio != -1:
+                    fin = espacio
+        yield texto[inicio:fin].strip()
+        if fin >= n:
+            break
+        siguiente = max(fin - overlap_chars, inicio + 1)
+        # Arrancamos la próxima ventana en un comienzo de palabra
+        espacio = texto.find(" ", siguiente, fin)
+        inicio = espacio + 1 if espacio != -1 else siguiente
+
+
+def _chunks_de_articulo(texto, min_chars, max_chars, overlap_chars):
+    """
+    Genera los textos de los chunks de un artículo:
+      - junta párrafos cortos seguidos hasta llegar a max_chars
+      - parte los párrafos más largos que max_chars con solapamiento
+      - un resto más corto que min_chars se pega al chunk anterior si entra
+    """
+    parrafos = [p.strip() for p in texto.split("\n\n") if p.strip()]
+    pendiente = None  # último chunk generado, lo retenemos por si hay que pegarle un resto
+    buffer = ""
+    for parrafo in parrafos:
+        if buffer and len(buffer) + 2 + len(parrafo) <= max_chars:
+            buffer = f"{buffer}\n\n{parrafo}"
+            continue
+        if buffer and len(buffer) < min_chars:
+            # El buffer es muy corto para ir solo: lo sumamos al párrafo siguiente
+            parrafo = f"{buffer}\n\n{parrafo}"
+        elif buffer:
+            if pendiente is not None:
+                yield pendiente
+            pendiente = buffer
+        buffer = ""
+        if len(parrafo) <= max_chars:
+            buffer = parrafo
+            continue
+        for pedazo in _partir_texto_largo(parrafo, max_chars, overlap_chars):
+            if pendiente is not None:
+                yield pendiente
+            pendiente = pedazo
+
+    if buffer:
+        if len(buffer) >= min_chars:
+            if pendiente is not None:
+                yield pendiente
+            pendiente = buffer
+        elif pendiente is not None and len(pendiente) + 2 + len(buffer) <= max_chars:
+            pendiente = f"{pendiente}\n\n{buffer}"
+        elif len(buffer) >= PISO_CHARS:
+            if pendiente is not None:
+                yield pendiente
+            pendiente = buffer
+    if pendiente is not None:
+        yield pendiente
+
+
+def metadatos_articulo(art):
+    """
+    Metadatos que se copian a cada chunk para poder filtrar las búsquedas:
+    "medio" (dominio del link), "seccion" (sacada de la URL del feed) y
+    "fecha" (timestamp de publicación, o None).
+    """
+    return {
+        "medio": medio_de_url(art.get("link")),
+        "seccion": seccion_de_feed(art.get("feed")),
+        "fecha": parsear_fecha(art.get("fecha")),
+    }
+
+
+def iterar_chunks(articulos, min_chars=MIN_CHARS, max_chars=MAX_CHARS, overlap_chars=OVERLAP_CHARS):
+    """
+    Generador: recorre los artículos (cada uno con al menos 'id' y 'texto')
+    y va devolviendo chunks de entre min_chars y max_chars caracteres:
       - "doc_id": id original del artículo
       - "chunk_id": identificador único del chunk (por ej. "art_001_p1")
-      - "texto": el texto de ese párrafo
-    Ignora párrafos demasiado cortos (< 50 caracteres).
+      - "texto": el texto del chunk (uno o varios párrafos, o parte de uno)
+      - "medio", "seccion", "fecha": los del artículo (ver metadatos_articulo)
     """
-    documentos = []
-    for art in articulos:
+    for posicion, art in enumerate(articulos):
         # Cada artículo: esperamos que tenga "id" y "texto"
         doc_id = art.get("id", None)
         if doc_id is None:
             # Si el JSON venía con otro campo, podés adaptar aquí
             # Por simplicidad, si falta "id" usamos un temporal
-            doc_id = f"art_{articulos.index(art):03d}"
-        texto_completo = art.get("texto", "")
-        # Dividimos por doble salto de línea: típico en noticias
-        parrafos = texto_completo.split("\n\n")
-        for i, parrafo in enumerate(parrafos, start=1):
-            parrafo = parrafo.strip()
-            if len(parrafo) < 50:
-                # Salteamos párrafos muy cortos (por ejemplo, títulos o frases sueltas)
-                continue
-            chunk_id = f"{doc_id}_p{i}"
-            documentos.append({
+            doc_id = f"art_{posicion:03d}"
+        textos = _chunks_de_articulo(art.get("texto", ""), min_chars, max_chars, overlap_chars)
+        metadatos = metadatos_articulo(art)
+        for i, texto in enumerate(textos, start=1):
+            yield {
+                "doc_id": doc_id,
+                "chunk_id": f"{doc_id}_p{i}",
+                "texto": texto,
+                **metadatos,
+            }
+
+
+def chunkear_por_parrafos(articulos):
+    """
+    Toma una lista de artículos (cada uno con al menos 'id' y 'texto'),
+    y devuelve la lista completa de chunks armados por iterar_chunks
+    (párrafos cortos unidos y párrafos largos partidos, según
+    MIN_CHARS / MAX_CHARS / OVERLAP_CHARS).
+    """
+    return list(iterar_chunks(articulos))
+
+
+def dividir_oraciones(texto):
+    """Parte el texto en oraciones (respetando también los cortes de párrafo)."""
+    oraciones = []
+    for parrafo in texto.split("\n\n"):
+        for oracion in re.split(r"(?<=[.!?…])\s+", parrafo.strip()):
+            if oracion:
+                oraciones.append(oracion)
+    return oraciones
+
+
+def _empaquetar_oraciones(oraciones, offsets, max_tokens):
+    """
+    Junta oraciones seguidas mientras entren en max_tokens. Una oración que
+    sola ya supera el presupuesto se corta en pedazos de max_tokens tokens
+    (usando los offsets del tokenizer, así no se pierde texto).
+    """
+    actual, tokens_actual = [], 0
+    for oracion, offsets_oracion in zip(oraciones, offsets):
+        n = len(offsets_oracion)
+        if n > max_tokens:
+            if actual:
+                yield " ".join(actual)
+                actual, tokens_actual = [], 0
+            for i in range(0, n, max_tokens):
+                inicio = offsets_oracion[i][0]
+                fin = offsets_oracion[min(i + max_tokens, n) - 1][1]
+                yield oracion[inicio:fin]
+            continue
+        if actual and tokens_actual + n > max_tokens:
+            yield " ".join(actual)
+            actual, tokens_actual = [], 0
+        actual.append(oracion)
+        tokens_actual += n
+    if actual:
+        yield " ".join(actual)
+
+
+def _chunks_por_tokens_de_lote(lote, tokenizer, max_tokens):
+    oraciones_por_articulo = [dividir_oraciones(art.get("texto", "")) for _, art in lote]
+    todas = [oracion for oraciones in oraciones_por_articulo for oracion in oraciones]
+    # Una sola llamada al tokenizer (rápido, en Rust) para todas las oraciones del lote
+    offsets = tokenizer(todas, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"] if todas else []
+    k = 0
+    for (posicion, art), oraciones in zip(lote, oraciones_por_articulo):
+        offsets_articulo = offsets[k:k + len(oraciones)]
+        k += len(oraciones)
+        doc_id = art.get("id", None)
+        if doc_id is None:
+            doc_id = f"art_{posicion:03d}"
+        textos = (t for t in _empaquetar_oraciones(oraciones, offsets_articulo, max_tokens) if len(t) >= PISO_CHARS)
+        metadatos = metadatos_articulo(art)
+        for i, texto in enumerate(textos, start=1):
+            yield {
                 "doc_id": doc_id,
-                "chunk_id": chunk_id,
-                "texto": parrafo
-            })
-    return documentos
+                "chunk_id": f"{doc_id}_p{i}",
+                "texto": texto,
+                **metadatos,
+            }
+
+
+def iterar_chunks_por_tokens(articulos, tokenizer, max_tokens, lote_articulos=LOTE_TOKENIZADOR):
+    """
+    Generador equivalente a iterar_chunks, pero midiendo en tokens del modelo:
+    parte cada artículo en oraciones, las tokeniza de a lotes de artículos y
+    empaqueta oraciones hasta max_tokens por chunk. Así ningún chunk se trunca
+    y casi no se desperdicia la ventana del modelo.
+    """
+    lote = []
+    for posicion, art in enumerate(articulos):
+        lote.append((posicion, art))
+        if len(lote) >= lote_articulos:
+            yield from _chunks_por_tokens_de_lote(lote, tokenizer, max_tokens)
+            lote = []
+    if lote:
+        yield from _chunks_por_tokens_de_lote(lote, tokenizer, max_tokens)
+
+
+def estadisticas_tokens(documents, tokenizer, max_seq_length, batch_size=32):
+    """
+    Mide, para una lista de chunks, cuántos tokens se pierden por truncado
+    (lo que supera max_seq_length) y cuánto padding se agrega al encodear en
+    batches de batch_size en el orden de 'documents'.
+    """
+    if not documents:
+        return {"chunks": 0, "tokens_totales": 0, "pct_tokens_truncados": 0.0, "pct_padding": 0.0}
+    input_ids = tokenizer([doc["texto"] for doc in documents], add_special_tokens=True)["input_ids"]
+    largos = [len(ids) for ids in input_ids]
+    total = sum(largos)
+    truncados = sum(max(0, largo - max_seq_length) for largo in largos)
+    usados = [min(largo, max_seq_length) for largo in largos]
+    padding, procesados = 0, 0
+    for i in range(0, len(usados), batch_size):
+        lote = usados[i:i + batch_size]
+        padding += max(lote) * len(lote) - sum(lote)
+        procesados += max(lote) * len(lote)
+    return {
+        "chunks": len(documents),
+        "tokens_totales": total,
+        "tokens_promedio": round(total / len(documents), 1),
+        "pct_tokens_truncados": round(100 * truncados / total, 2),
+        "pct_padding": round(100 * padding / procesados, 2),
+    }
 
 
 
@@ -111,30 +336,35 @@ def chunkear_por_parrafos(articulos):
 # 4. Generación de embeddings y FAISS
 # -----------------------------------
 
-def crear_indice_faiss(documents, modelo_name="all-MiniLM-L6-v2"):
+def crear_indice_faiss(documents, modelo_name=EMBEDDING_MODEL_NAME, modelo=None):
     """
     Dada la lista de chunks (cada uno con "chunk_id" y "texto"),
-    genera embeddings con SentenceTransformer y construye un índice FAISS.
+    genera embeddings con el motor multi-proceso (embedding_engine) y
+    construye un índice FAISS.
     Retorna el índice FAISS y la lista de embeddings en el mismo orden que 'documents'.
+    Si ya tenés el modelo (o el motor) cargado podés pasarlo en 'modelo'.
     """
     # 4.1. Cargar el modelo de embeddings
-    print("🔄 Cargando modelo de embeddings...")
-    modelo = SentenceTransformer(modelo_name)
+    if modelo is None:
+        print("🔄 Cargando modelo de embeddings...")
+        modelo = obtener_motor(modelo_name)
 
     # 4.2. Preparar lista de textos para el modelo
     texts = [doc["texto"] for doc in documents]
     print(f"🔢 Generando embeddings para {len(texts)} chunks...")
     
     # 4.3. Crear los embeddings (esto puede tardar un rato si hay muchos documentos)
-    embeddings = modelo.encode(texts, show_progress_bar=True, batch_size=32)
+    # Pasamos por el cache de embeddings: sólo se encodean los chunks que no vimos antes
+    embeddings = encode_con_cache(modelo, texts, modelo_name, show_progress_bar=True, batch_size=32)
     # embeddings será un array NumPy de forma (N, D), donde N = cantidad de chunks y D = dimensión del embedding
 
     # 4.4. Crear índice FAISS
-    # Elegimos L2 (distancia Euclidiana). Para similitud coseno podés usar IndexFlatIP + normalizar los embeddings.
+    # Distancia L2. El tipo (Flat, IVF, HNSW, SQ8, PQ) lo elige fabrica_indices
+    # según la cantidad de vectores y la memoria disponible (TIPO_INDICE = "auto").
     dimension = embeddings.shape[1]
     print(f"📏 Dimensión de los embeddings: {dimension}")
-    index = faiss.IndexFlatL2(dimension)
-    print("➕ Agregando embeddings al índice FAISS...")
+    index, tipo = crear_indice(embeddings, TIPO_INDICE)
+    print(f"➕ Agregando embeddings al índice FAISS ({tipo})...")
     index.add(embeddings)  # ahora el índice contiene N vectores
 
     return index, embeddings
@@ -143,21 +373,23 @@ def crear_indice_faiss(documents, modelo_name="all-MiniLM-L6-v2"):
 # -----------------------------------
 # 5. Guardar índice y mapping
 # -----------------------------------
-import pickle  # para serializar la lista de documentos
-
 def guardar_indice_y_mapping(index, documents, index_path, mapping_path):
     """
-    Guarda el índice FAISS en index_path y la lista 'documents' en mapping_path (con pickle).
+    Guarda el índice FAISS en index_path y la lista 'documents' en mapping_path,
+    una carpeta con el almacén columnar de chunks (ver almacen_chunks.py) que
+    después se abre con mmap. El id de cada chunk es su posición en la lista.
+    En la misma carpeta queda el índice BM25 de los chunks (para la búsqueda híbrida).
     'documents' es la lista de dicts con 'chunk_id', 'doc_id' y 'texto'.
     """
     # 5.1. Guardar índice FAISS
     print(f"💾 Guardando índice FAISS en '{index_path}'...")
     faiss.write_index(index, index_path)
 
-    # 5.2. Guardar mapping (documentos) en pickle
+    # 5.2. Guardar mapping (documentos) en el almacén columnar
     print(f"💾 Guardando mapping (lista de chunks) en '{mapping_path}'...")
-    with open(mapping_path, "wb") as f:
-        pickle.dump(documents, f)
+    escribir_almacen(mapping_path, enumerate(documents))
+    print("💾 Armando el índice léxico (BM25) de los chunks...")
+    publicar_lexico(mapping_path, mapping_path, enumerate(documents))
 
     print("✅ Índice y mapping guardados con éxito.")
 
@@ -165,6 +397,21 @@ def guardar_indice_y_mapping(index, documents, index_path, mapping_path):
 
 
 
+def chunkear_articulos(articulos, modelo):
+    """Chunkea los artículos según MODO_CHUNKING ("caracteres" o "tokens")."""
+    if MODO_CHUNKING == "tokens":
+        max_tokens = TOKENS_POR_CHUNK or modelo.max_seq_length - 2  # [CLS] y [SEP]
+        print(f"✂️ Dividiendo artículos en chunks de hasta {max_tokens} tokens...")
+        return list(iterar_chunks_por_tokens(articulos, modelo.tokenizer, max_tokens))
+    print("✂️ Dividiendo artículos en chunks (párrafos)...")
+    return chunkear_por_parrafos(articulos)
+
+
+def imprimir_estadisticas_tokens(documents, modelo):
+    """Imprime cuántos tokens se truncan y cuánto padding se agrega al encodear 'documents'."""
+    imprimir_estadisticas_tokens(documents, modelo)
+
+
 def build_faiss_index(use_json=True, ):
     """
     Función principal para construir el índice FAISS a partir de artículos de noticias.
@@ -173,27 +420,73 @@ def build_faiss_index(use_json=True, ):
 
     # 6.1. Cargar artículos
     if USE_JSON:
-        print("🔍 Cargando artículos desde JSON...")
-        articulos = cargar_articulos_desde_json(INPUT_JSON)
+        path_articulos = INPUT_JSONL if os.path.isfile(INPUT_JSONL) else INPUT_JSON
+        print(f"🔍 Cargando artículos desde '{path_articulos}'...")
         # Esperamos que cada 'articulo' sea {"id": "...", "texto": "...", ...}
         # Si el JSON tiene otros campos (ej. "titulo", "link"), no los usamos aquí.
+        cargar_articulos = lambda: cargar_articulos_desde_json(path_articulos)
     else:
         print("🔍 Cargando artículos desde carpeta de .txt...")
-        articulos = cargar_articulos_desde_txt(ARTICULOS_TXT_DIR)
         # Aquí cada 'articulo' es {"id": "<nombre_sin_ext>", "texto": "<contenido>"}
-
-    print(f"   • Cantidad de artículos cargados: {len(articulos)}")
-
-    # 6.2. Dividir en chunks (párrafos)
-    print("✂️ Dividiendo artículos en chunks (párrafos)...")
-    documents = chunkear_por_parrafos(articulos)
-    print(f"   • Total de chunks generados: {len(documents)}")
+        cargar_articulos = lambda: cargar_articulos_desde_txt(ARTICULOS_TXT_DIR)
+
+    # 6.1.1. Sacar casi-duplicados (la misma nota de agencia en varios medios,
+    # o la misma nota en varias secciones). Se recorre el archivo dos veces:
+    # la primera sólo calcula firmas MinHash, la segunda filtra.
+    print("🧬 Buscando artículos casi duplicados (MinHash + LSH)...")
+    alias_de = detectar_duplicados(cargar_articulos())
+    guardar_alias(alias_de, ALIAS_JSON)
+    print(f"   • {len(alias_de)} artículos duplicados asociados a su nota canónica (ver '{ALIAS_JSON}')")
+    articulos = filtrar_duplicados(cargar_articulos(), alias_de)
+
+    # 6.2. Dividir en chunks (por caracteres o por tokens del modelo)
+    print("🔄 Cargando modelo de embeddings...")
+    modelo = obtener_motor(EMBEDDING_MODEL_NAME)
+
+    # En los modos incremental y particionado sólo se chunkea lo nuevo o cambiado:
+    # juntamos esos chunks para medir tokens truncados y padding al final
+    chunks_agregados = []
+
+    def chunkear_y_juntar(arts):
+        chunks = chunkear_articulos(arts, modelo)
+        chunks_agregados.extend(chunks)
+        return chunks
+
+    if MODO_INDICE == "particionado":
+        print(f"🗓️ Actualizando el índice particionado por fecha en '{PARTICIONES_DIR}'...")
+        stats = actualizar_particiones(articulos, modelo, chunkear_y_juntar, EMBEDDING_MODEL_NAME)
+        print(f"   • Artículos nuevos: {stats['nuevos']}, actualizados: {stats['actualizados']}, "
+              f"sin cambios: {stats['sin_cambios']}, vencidos: {stats['vencidos']}")
+        print(f"   • Chunks agregados: {stats['chunks_agregados']}, borrados: {stats['chunks_borrados']}, "
+              f"total: {stats['total']} en {stats['particiones']} particiones "
+              f"(actualizadas: {stats['particiones_actualizadas']}, compactadas: "
+              f"{stats.get('particiones_compactadas', 0)}, borradas: {stats['particiones_borradas']})")
+        imprimir_estadisticas_tokens(chunks_agregados, modelo)
+        print("\n🎉 ¡Proceso completado! Tenés tu índice FAISS listo para usar. 🎉\n")
+        return
+
+    if MODO_INDICE == "incremental":
+        # Sólo se chunkean y vectorizan los artículos nuevos o que cambiaron
+        print(f"♻️ Actualizando el índice incremental en '{INDICES_DIR}'...")
+        stats = actualizar_indice(articulos, modelo, chunkear_y_juntar, EMBEDDING_MODEL_NAME)
+        print(f"   • Artículos nuevos: {stats['nuevos']}, actualizados: {stats['actualizados']}, "
+              f"sin cambios: {stats['sin_cambios']}, vencidos: {stats['vencidos']}")
+        print(f"   • Chunks agregados: {stats['chunks_agregados']}, borrados: {stats['chunks_borrados']}, "
+              f"total en el índice: {stats['total']} (versión {stats['version']})")
+        imprimir_estadisticas_tokens(chunks_agregados, modelo)
+        print("\n🎉 ¡Proceso completado! Tenés tu índice FAISS listo para usar. 🎉\n")
+        return
+
+    documents = chunkear_articulos(articulos, modelo)
+    print(f"   • Total de chunks generados: {len(documents)} "
+          f"(de {len({doc['doc_id'] for doc in documents})} artículos)")
+    imprimir_estadisticas_tokens(documents, modelo)
 
     # 6.3. Generar embeddings y crear índice FAISS
-    index, embeddings = crear_indice_faiss(documents)
+    index, embeddings = crear_indice_faiss(documents, modelo=modelo)
 
     # 6.4. Guardar índice y mapping
-    guardar_indice_y_mapping(index, documents, FAISS_INDEX_FILE, MAPPING_PICKLE_FILE)
+    guardar_indice_y_mapping(index, documents, FAISS_INDEX_FILE, MAPPING_DIR)
 
     print("\n🎉 ¡Proceso completado! Tenés tu índice FAISS listo para usar. 🎉\n")
 
@@ -0,0 +1,118 @@
+# cache_consultas.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import encode_con_cache, normalizar_texto
+
+# Cache en memoria de las consultas, en dos niveles:
+#   - texto normalizado de la pregunta -> embedding (no vuelve a pasar por el
+#     modelo ni por el cache en disco de embedding_cache.py)
+#   - (hash del embedding, top_k, filtros, versión del índice) -> resultados
+# La versión del índice va en la clave: cuando build_faiss publica uno nuevo
+# las claves cambian solas, lo viejo no se vuelve a servir y el LRU lo saca.
+TAMANO_CACHE_EMBEDDINGS_CONSULTA = 10_000
+TAMANO_CACHE_RESULTADOS = 2_000
+
+
+class _LRU:
+    """Diccionario LRU con lock y contadores de aciertos / fallos."""
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def get(self, clave):
+        with self.lock:
+            valor = self.datos.get(clave)
+            if valor is None:
+                self.fallos += 1
+            else:
+                self.datos.move_to_end(clave)
+                self.aciertos += 1
+            return valor
+
+    def poner(self, clave, valor):
+        with self.lock:
+            self.datos[clave] = valor
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.tamano:
+                self.datos.popitem(last=False)
+
+    def vaciar(self):
+        with self.lock:
+            self.datos.clear()
+
+    def estadisticas(self):
+        with self.lock:
+            total = self.aciertos + self.fallos
+            return {
+                "entradas": len(self.datos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / total, 3) if total else None,
+            }
+
+
+def _clave_filtros(filtros):
+    """Las listas (varios medios / secciones) pasan a tupla, para poder usarlas de clave."""
+    return tuple(tuple(valor) if isinstance(valor, list) else valor for valor in filtros)
+
+
+class CacheConsultas:
+    """Los dos niveles del cache. Conviene pedirlo con obtener_cache_consultas()."""
+    def __init__(self, tamano_embeddings=TAMANO_CACHE_EMBEDDINGS_CONSULTA, tamano_resultados=TAMANO_CACHE_RESULTADOS):
+        self.embeddings = _LRU(tamano_embeddings)
+        self.resultados = _LRU(tamano_resultados)
+
+    def vectorizar(self, modelo, preguntas, modelo_name):
+        """
+        Embeddings de las 'preguntas' (una fila por pregunta). Las que no están
+        en el cache se vectorizan todas juntas en un solo encode.
+        """
+        backend = getattr(modelo, "backend", "torch")
+        claves = [(modelo_name, backend, normalizar_texto(p)) for p in preguntas]
+        vectores = [self.embeddings.get(clave) for clave in claves]
+        faltan = [i for i, v in enumerate(vectores) if v is None]
+        if faltan:
+            nuevos = encode_con_cache(modelo, [preguntas[i] for i in faltan], modelo_name)
+            for i, vector in zip(faltan, nuevos):
+                vectores[i] = np.array(vector, dtype=np.float32)
+                self.embeddings.poner(claves[i], vectores[i])
+        return np.ascontiguousarray(np.vstack(vectores), dtype=np.float32)
+
+    def clave_resultados(self, embedding, top_k, filtros, version):
+        """Clave del nivel de resultados: 'filtros' es una tupla con todo lo que cambia la búsqueda."""
+        digesto = hashlib.blake2b(np.ascontiguousarray(embedding, dtype=np.float32).tobytes(), digest_size=16)
+        return digesto.hexdigest(), top_k, _clave_filtros(filtros), version
+
+    def buscar_resultados(self, clave):
+        return self.resultados.get(clave)
+
+    def guardar_resultados(self, clave, resultados):
+        self.resultados.poner(clave, resultados)
+
+    def vaciar(self):
+        self.embeddings.vaciar()
+        self.resultados.vaciar()
+
+    def estadisticas(self):
+        return {"embeddings": self.embeddings.estadisticas(), "resultados": self.resultados.estadisticas()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_consultas():
+    """Un CacheConsultas por proceso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheConsultas()
+        return _cache
@@ -0,0 +1,132 @@
+# deduplicacion.py
+
+import hashlib
+import json
+import re
+from collections import defaultdict
+
+import numpy as np
+
+# Archivo donde queda registrado qué artículo es copia de cuál
+ALIAS_JSON = "alias_duplicados.json"
+
+# Parámetros de MinHash + LSH
+SHINGLE_PALABRAS = 5     # cada shingle son 5 palabras seguidas
+NUM_PERM = 128           # largo de la firma MinHash
+BANDAS = 16              # LSH: 16 bandas de 8 filas -> candidatos desde ~0.7 de similitud
+UMBRAL_JACCARD = 0.8     # similitud estimada mínima para considerar que es la misma nota
+
+_PRIMO_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _permutaciones(num_perm, semilla=1):
+    generador = np.random.RandomState(semilla)
+    a = generador.randint(1, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+    b = generador.randint(0, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingles(texto, k=SHINGLE_PALABRAS):
+    """Devuelve el set de shingles de k palabras del texto (en minúscula)."""
+    palabras = re.findall(r"\w+", texto.lower())
+    if len(palabras) < k:
+        return set()
+    return {" ".join(palabras[i:i + k]) for i in range(len(palabras) - k + 1)}
+
+
+def firma_minhash(texto, a, b, k=SHINGLE_PALABRAS):
+    """Calcula la firma MinHash del texto (array de uint64) o None si es muy corto."""
+    conjunto = shingles(texto, k)
+    if not conjunto:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in conjunto),
+        dtype=np.uint64, count=len(conjunto),
+    )
+    permutados = ((np.outer(a, hashes) + b[:, None]) % _PRIMO_MERSENNE) & _MAX_HASH
+    return permutados.min(axis=1)
+
+
+def _clave_canonico(art_id):
+    # ids numéricos (ArticleStore): gana el más viejo; ids de texto: orden alfabético
+    if isinstance(art_id, int):
+        return (0, art_id, "")
+    return (1, 0, str(art_id))
+
+
+def detectar_duplicados(articulos, num_perm=NUM_PERM, bandas=BANDAS, umbral=UMBRAL_JACCARD):
+    """
+    Recorre los artículos (puede ser un generador) y detecta casi-duplicados
+    con MinHash + LSH. Sólo se guardan las firmas, no los textos.
+    Retorna un dict {id_duplicado: id_canonico}; el canónico de cada grupo es
+    el artículo con el id más chico (el que tenemos hace más tiempo).
+    """
+    a, b = _permutaciones(num_perm)
+    filas = num_perm // bandas
+    firmas = {}
+    cubetas = defaultdict(list)
+    padre = {}
+
+    def _raiz(x):
+        while padre[x] != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    for posicion, art in enumerate(articulos):
+        art_id = art.get("id", f"art_{posicion:03d}")
+        firma = firma_minhash(art.get("texto", ""), a, b)
+        if firma is None:
+            continue
+        firmas[art_id] = firma
+        padre[art_id] = art_id
+        candidatos = set()
+        for banda in range(bandas):
+            clave = (banda, firma[banda * filas:(banda + 1) * filas].tobytes())
+            candidatos.update(cubetas[clave])
+            cubetas[clave].append(art_id)
+        for otro in candidatos:
+            # Confirmamos con la similitud estimada sobre la firma completa
+            if float(np.mean(firmas[otro] == firma)) >= umbral:
+                padre[_raiz(art_id)] = _raiz(otro)
+
+    grupos = defaultdict(list)
+    for art_id in padre:
+        grupos[_raiz(art_id)].append(art_id)
+
+    alias_de = {}
+    for miembros in grupos.values():
+        if len(miembros) < 2:
+            continue
+        canonico = min(miembros, key=_clave_canonico)
+        for art_id in miembros:
+            if art_id != canonico:
+                alias_de[art_id] = canonico
+    return alias_de
+
+
+def filtrar_duplicados(articulos, alias_de):
+    """
+    Generador que deja pasar sólo los artículos canónicos. A cada canónico le
+    agrega la clave "alias" con los ids de sus copias.
+    """
+    alias_por_canonico = defaultdict(list)
+    for duplicado, canonico in alias_de.items():
+        alias_por_canonico[canonico].append(duplicado)
+    for posicion, art in enumerate(articulos):
+        art_id = art.get("id", f"art_{posicion:03d}")
+        if art_id in alias_de:
+            continue
+        if art_id in alias_por_canonico:
+            art = dict(art, alias=alias_por_canonico[art_id])
+        yield art
+
+
+def guardar_alias(alias_de, path=ALIAS_JSON):
+    """Guarda el registro {canonico: [duplicados]} en JSON."""
+    alias_por_canonico = defaultdict(list)
+    for duplicado, canonico in alias_de.items():
+        alias_por_canonico[str(canonico)].append(duplicado)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(alias_por_canonico, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,272 @@
+# embedding_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+# Carpeta del cache: una subcarpeta por modelo, cada una con
+#   - vectores.f32: matriz (capacidad, dim) float32 abierta con np.memmap
+#   - indice.db:   SQLite con hash del texto -> fila de la matriz (+ último uso)
+EMBEDDING_CACHE_DIR = "cache_embeddings"
+
+# Máximo de vectores por modelo. Cuando se llena se pisan los menos usados (LRU).
+MAX_VECTORES_CACHE = 500_000
+
+# Cuánto crece el archivo de vectores cada vez que se queda chico
+FILAS_MINIMAS = 1024
+
+# Máximo de parámetros "?" por consulta a SQLite
+_LOTE_SQL = 500
+
+
+def normalizar_texto(texto):
+    """Unicode NFC + espacios colapsados, para que el mismo texto dé el mismo hash."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", texto or "")).strip()
+
+
+def hash_texto(texto):
+    return hashlib.blake2b(normalizar_texto(texto).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def nombre_modelo(modelo):
+    """Intenta sacar un nombre estable del SentenceTransformer (para cuando no lo pasan)."""
+    tokenizer = getattr(modelo, "tokenizer", None)
+    nombre = getattr(tokenizer, "name_or_path", None)
+    if not nombre:
+        nombre = getattr(getattr(modelo, "model_card_data", None), "base_model", None)
+    return nombre or type(modelo).__name__
+
+
+class EmbeddingCache:
+    """
+    Cache en disco de embeddings, direccionado por contenido: la clave es
+    (modelo, hash del texto normalizado). Los vectores viven en un archivo
+    mapeado en memoria y el índice en SQLite, así que abrirlo no carga nada
+    y cada consulta sólo toca las filas que necesita.
+    """
+    def __init__(self, modelo_name, dim, directorio=EMBEDDING_CACHE_DIR, max_vectores=MAX_VECTORES_CACHE):
+        self.modelo_name = modelo_name
+        self.dim = dim
+        self.max_vectores = max_vectores
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", modelo_name).strip("_")[-120:]
+        self.directorio = os.path.join(directorio, slug)
+        os.makedirs(self.directorio, exist_ok=True)
+        self.path_vectores = os.path.join(self.directorio, "vectores.f32")
+
+        # Autocommit: las transacciones se abren a mano (BEGIN ...), porque varios
+        # procesos pueden compartir la carpeta (build_faiss, servidor_consultas, ...)
+        self.conn = sqlite3.connect(os.path.join(self.directorio, "indice.db"), timeout=60,
+                                    isolation_level=None, check_same_thread=False)
+        with self._transaccion("IMMEDIATE"):
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entradas (hash TEXT PRIMARY KEY, fila INTEGER NOT NULL, ultimo_uso REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON entradas (ultimo_uso)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS filas_libres (fila INTEGER PRIMARY KEY)")
+            dim_guardada = self._meta("dim")
+            if dim_guardada is not None and int(dim_guardada) != dim:
+                raise ValueError(
+                    f"El cache de '{modelo_name}' tiene dimensión {dim_guardada} y el modelo {dim}. "
+                    f"Borrá la carpeta '{self.directorio}'."
+                )
+            self._set_meta("dim", dim)
+
+        self.capacidad = 0
+        self.vectores = None
+        self._mapear()
+
+    # --- helpers internos ---
+
+    def _meta(self, clave):
+        fila = self.conn.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def _set_meta(self, clave, valor):
+        self.conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+
+    @contextmanager
+    def _transaccion(self, modo=""):
+        """
+        BEGIN [modo] ... COMMIT (ROLLBACK si algo falla). Con EXCLUSIVE ningún
+        otro proceso lee el índice mientras se pisan filas de la matriz.
+        """
+        self.conn.execute(f"BEGIN {modo}")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _mapear(self, filas=0):
+        """
+        Vuelve a mapear la matriz con el tamaño que tiene en disco (otro proceso
+        la puede haber agrandado). Si hacen falta más de 'filas' la agranda, pero
+        nunca la achica. Para agrandarla hay que estar dentro de una transacción
+        de escritura, así dos procesos no la estiran a la vez.
+        """
+        en_disco = os.path.getsize(self.path_vectores) // (4 * self.dim) if os.path.isfile(self.path_vectores) else 0
+        if filas > en_disco:
+            nueva = min(self.max_vectores, max(filas, 2 * en_disco, FILAS_MINIMAS))
+            if self.vectores is not None:
+                self.vectores.flush()
+            with open(self.path_vectores, "ab") as f:
+                if f.tell() < nueva * self.dim * 4:
+                    f.truncate(nueva * self.dim * 4)
+            en_disco = nueva
+        if en_disco != self.capacidad:
+            if self.vectores is not None:
+                self.vectores.flush()
+                del self.vectores
+            self.capacidad = en_disco
+            self.vectores = np.memmap(self.path_vectores, dtype=np.float32, mode="r+",
+                                      shape=(en_disco, self.dim)) if en_disco else None
+
+    def _reservar_filas(self, cantidad):
+        """
+        Devuelve 'cantidad' filas libres, desalojando las menos usadas si hace
+        falta. Va dentro de la transacción de guardar(): el contador
+        'siguiente_fila' se lee de SQLite cada vez, nunca de memoria.
+        """
+        filas = [f for (f,) in self.conn.execute("SELECT fila FROM filas_libres LIMIT ?", (cantidad,))]
+        if filas:
+            self.conn.executemany("DELETE FROM filas_libres WHERE fila = ?", [(f,) for f in filas])
+        siguiente_fila = int(self._meta("siguiente_fila") or 0)
+        nuevas = min(cantidad - len(filas), self.max_vectores - siguiente_fila)
+        if nuevas > 0:
+            filas.extend(range(siguiente_fila, siguiente_fila + nuevas))
+            siguiente_fila += nuevas
+            self._set_meta("siguiente_fila", siguiente_fila)
+        faltan = cantidad - len(filas)
+        if faltan > 0:
+            # Cache lleno: desalojamos las entradas usadas hace más tiempo
+            viejas = self.conn.execute(
+                "SELECT hash, fila FROM entradas ORDER BY ultimo_uso ASC LIMIT ?", (faltan,)
+            ).fetchall()
+            self.conn.executemany("DELETE FROM entradas WHERE hash = ?", [(h,) for h, _ in viejas])
+            filas.extend(f for _, f in viejas)
+        self._mapear(siguiente_fila)
+        return filas
+
+    def _buscar_filas(self, hashes):
+        encontradas = {}
+        unicos = list(dict.fromkeys(hashes))
+        for i in range(0, len(unicos), _LOTE_SQL):
+            lote = unicos[i:i + _LOTE_SQL]
+            marcas = ",".join("?" * len(lote))
+            for h, fila in self.conn.execute(f"SELECT hash, fila FROM entradas WHERE hash IN ({marcas})", lote):
+                encontradas[h] = fila
+        return encontradas
+
+    # --- API ---
+
+    def encode(self, modelo, textos, **kwargs):
+        """
+        Igual que modelo.encode(textos, **kwargs), pero sólo encodea los textos
+        que no están en el cache. Devuelve un array (len(textos), dim) float32
+        en el mismo orden que 'textos'.
+        """
+        normalizar = kwargs.pop("normalize_embeddings", False)
+        textos = list(textos)
+        hashes = [hash_texto(t) for t in textos]
+        resultado = np.empty((len(textos), self.dim), dtype=np.float32)
+
+        with self.lock:
+            # Lectura del índice y de las filas en la misma transacción: mientras
+            # dure, ningún otro proceso puede desalojar y pisar esas filas
+            with self._transaccion():
+                encontradas = self._buscar_filas(hashes)
+                posiciones_hit = [i for i, h in enumerate(hashes) if h in encontradas]
+                if posiciones_hit:
+                    filas = np.fromiter((encontradas[hashes[i]] for i in posiciones_hit), dtype=np.int64)
+                    if filas.max() >= self.capacidad:
+                        self._mapear()
+                    resultado[posiciones_hit] = self.vectores[filas]
+            if posiciones_hit:
+                ahora = time.time()
+                with self._transaccion("IMMEDIATE"):
+                    self.conn.executemany("UPDATE entradas SET ultimo_uso = ? WHERE hash = ?",
+                                          [(ahora, h) for h in encontradas])
+
+        # Textos que faltan (sin repetir): los encodeamos fuera del lock
+        faltantes = {}
+        for i, h in enumerate(hashes):
+            if h not in encontradas:
+                faltantes.setdefault(h, []).append(i)
+        self.hits += len(posiciones_hit)
+        self.misses += len(faltantes)
+        if faltantes:
+            primeras = [posiciones[0] for posiciones in faltantes.values()]
+            nuevos = np.asarray(modelo.encode([textos[i] for i in primeras], **kwargs), dtype=np.float32)
+            for posiciones, vector in zip(faltantes.values(), nuevos):
+                resultado[posiciones] = vector
+            self.guardar(list(faltantes), nuevos)
+
+        if normalizar:
+            normas = np.linalg.norm(resultado, axis=1, keepdims=True)
+            resultado /= np.maximum(normas, 1e-12)
+        return resultado
+
+    def guardar(self, hashes, vectores):
+        """Agrega (o pisa) los vectores de 'hashes' en el cache."""
+        if not len(hashes):
+            return
+        with self.lock, self._transaccion("EXCLUSIVE"):
+            existentes = self._buscar_filas(hashes)
+            nuevos = [h for h in hashes if h not in existentes]
+            filas_nuevas = self._reservar_filas(len(nuevos))
+            # Si el cache es más chico que el lote, guardamos sólo lo que entra
+            fila_por_hash = dict(existentes)
+            fila_por_hash.update(zip(nuevos, filas_nuevas))
+            posiciones = [i for i, h in enumerate(hashes) if h in fila_por_hash]
+            filas = np.fromiter((fila_por_hash[hashes[i]] for i in posiciones), dtype=np.int64)
+            self.vectores[filas] = np.asarray(vectores, dtype=np.float32)[posiciones]
+            self.vectores.flush()
+            ahora = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entradas (hash, fila, ultimo_uso) VALUES (?, ?, ?)",
+                [(hashes[i], fila_por_hash[hashes[i]], ahora) for i in posiciones],
+            )
+
+    def cerrar(self):
+        if self.vectores is not None:
+            self.vectores.flush()
+        self.conn.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def obtener_cache(modelo_name, dim):
+    """Un EmbeddingCache por modelo y por proceso."""
+    with _caches_lock:
+        if modelo_name not in _caches:
+            _caches[modelo_name] = EmbeddingCache(modelo_name, dim)
+        return _caches[modelo_name]
+
+
+def encode_con_cache(modelo, textos, modelo_name=None, **kwargs):
+    """
+    Reemplazo de modelo.encode(textos, **kwargs) que pasa por el cache de
+    embeddings. Todas las etapas que vectorizan texto deberían usar esto.
+    """
+    modelo_name = modelo_name or nombre_modelo(modelo)
+    # Los vectores int8 (ONNX) no son idénticos a los fp32: cada backend tiene su cache
+    backend = getattr(modelo, "backend", "torch")
+    if backend != "torch":
+        modelo_name = f"{modelo_name}@{backend}"
+    cache = obtener_cache(modelo_name, modelo.get_sentence_embedding_dimension())
+    return cache.encode(modelo, textos, **kwargs)
@@ -0,0 +1,155 @@
+# embedding_engine.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from backend_onnx import BACKEND_EMBEDDINGS, cargar_modelo
+
+# Procesos que encodean en paralelo (cada uno con su copia del modelo)
+PROCESOS_EMBEDDING = max(1, (os.cpu_count() or 1) // 2)
+# Presupuesto de tokens por batch, contando el padding (largo máximo del batch * cantidad)
+TOKENS_POR_BATCH = 8192
+# Tope de textos por batch aunque sean muy cortos
+MAX_TEXTOS_POR_BATCH = 256
+# Con menos textos que esto no vale la pena repartir entre procesos
+MIN_TEXTOS_PARALELO = 64
+
+
+# --- Lado worker: cada proceso del pool carga el modelo una sola vez ---
+
+_modelo_worker = None
+
+
+def _inicializar_worker(modelo_name, backend, hilos):
+    global _modelo_worker
+    import torch
+    torch.set_num_threads(hilos)
+    _modelo_worker = cargar_modelo(modelo_name, backend, hilos=hilos)
+
+
+def _encode_batch(posiciones, textos, normalize_embeddings):
+    vectores = _modelo_worker.encode(textos, batch_size=len(textos), convert_to_numpy=True,
+                                     normalize_embeddings=normalize_embeddings, show_progress_bar=False)
+    return posiciones, vectores
+
+
+# --- Lado proceso principal ---
+
+class MotorEmbeddings:
+    """
+    Motor de embeddings para CPU:
+      1. Tokeniza los textos para saber cuánto mide cada uno.
+      2. Los ordena por largo y arma batches de largo parecido, con un tamaño
+         que depende de TOKENS_POR_BATCH (muchos textos cortos o pocos largos),
+         así casi no se gasta en padding.
+      3. Reparte los batches entre un pool de procesos.
+    Devuelve los vectores en el orden original. Tiene la misma interfaz que
+    SentenceTransformer.encode, así que se puede pasar a encode_con_cache.
+    'backend' es "torch" (fp32) u "onnx" (int8), ver backend_onnx.py.
+    Si se pasa un 'modelo' ya cargado hay que pasar también su 'modelo_name'
+    (nombre o carpeta), que es lo que cargan los procesos; sin él no se
+    adivina: se encodea todo en este proceso.
+    """
+    def __init__(self, modelo_name=None, modelo=None, procesos=PROCESOS_EMBEDDING, tokens_por_batch=TOKENS_POR_BATCH,
+                 backend=None):
+        self.backend = backend or getattr(modelo, "backend", None) or BACKEND_EMBEDDINGS
+        # El modelo local sirve para tokenizar, para la dimensión y para lotes chicos
+        self.modelo = modelo if modelo is not None else cargar_modelo(modelo_name, self.backend)
+        self.modelo_name = modelo_name
+        if modelo_name is None:
+            print("⚠️ MotorEmbeddings sin modelo_name: los procesos no sabrían qué modelo cargar, encodeo en este proceso.")
+            procesos = 1
+        self.procesos = max(1, procesos)
+        self.tokens_por_batch = tokens_por_batch
+        self.pool = None
+        self.lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        return self.modelo.tokenizer
+
+    @property
+    def max_seq_length(self):
+        return self.modelo.max_seq_length
+
+    def get_sentence_embedding_dimension(self):
+        return self.modelo.get_sentence_embedding_dimension()
+
+    def _obtener_pool(self):
+        with self.lock:
+            if self.pool is None:
+                hilos = max(1, (os.cpu_count() or 1) // self.procesos)
+                # "spawn" para no heredar el estado de torch / OpenMP del proceso padre
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_worker,
+                    initargs=(self.modelo_name, self.backend, hilos),
+                )
+            return self.pool
+
+    def armar_batches(self, textos):
+        """
+        Devuelve una lista de batches (cada uno una lista de posiciones en
+        'textos'), ordenados del más largo al más corto.
+        """
+        largos = [
+            len(ids) for ids in self.tokenizer(
+                list(textos), add_special_tokens=True, truncation=True, max_length=self.max_seq_length
+            )["input_ids"]
+        ]
+        orden = sorted(range(len(textos)), key=lambda i: -largos[i])
+        batches, actual, largo_max = [], [], 0
+        for i in orden:
+            if not actual:
+                largo_max = largos[i]  # el primero es el más largo del batch
+            elif (len(actual) + 1) * largo_max > self.tokens_por_batch or len(actual) >= MAX_TEXTOS_POR_BATCH:
+                batches.append(actual)
+                actual, largo_max = [], largos[i]
+            actual.append(i)
+        if actual:
+            batches.append(actual)
+        return batches
+
+    def encode(self, textos, batch_size=None, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        """
+        Encodea 'textos' y devuelve un array (len(textos), dim) float32 en el
+        mismo orden. 'batch_size' se ignora: el tamaño de cada batch sale del
+        presupuesto de tokens.
+        """
+        textos = list(textos)
+        dim = self.get_sentence_embedding_dimension()
+        resultado = np.empty((len(textos), dim), dtype=np.float32)
+        if not textos:
+            return resultado
+        batches = self.armar_batches(textos)
+
+        if self.procesos == 1 or len(textos) < MIN_TEXTOS_PARALELO:
+            for posiciones in tqdm(batches, disable=not show_progress_bar, desc="Embeddings"):
+                resultado[posiciones] = self.modelo.encode(
+                    [textos[i] for i in posiciones], batch_size=len(posiciones), convert_to_numpy=True,
+                    normalize_embeddings=normalize_embeddings, show_progress_bar=False,
+                )
+            return resultado
+
+        pool = self._obtener_pool()
+        futuros = [
+            pool.submit(_encode_batch, posiciones, [textos[i] for i in posiciones], normalize_embeddings)
+            for posiciones in batches
+        ]
+        for futuro in tqdm(as_completed(futuros), total=len(futuros), disable=not show_progress_bar, desc="Embeddings"):
+            posiciones, vectores = futuro.result()
+            resultado[posiciones] = vectores
+        return resultado
+
+    def cerrar(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
@@ -0,0 +1,356 @@
+# fabrica_indices.py
+
+import argparse
+import math
+import time
+
+import faiss
+import numpy as np
+
+# Tipo de índice: "auto" elige según la cantidad de vectores y MEMORIA_INDICE_MB.
+# Si no: "flat", "ivf" (IVF-Flat), "hnsw", "sq8" (IVF + SQ8) o "ivfpq" (IVF + PQ)
+TIPO_INDICE = "auto"
+
+# Memoria máxima que puede ocupar el índice (para el modo "auto")
+MEMORIA_INDICE_MB = 2048
+
+# Hasta esta cantidad de vectores la búsqueda exacta (Flat) es suficientemente rápida
+MAX_VECTORES_FLAT = 50_000
+# Por encima de esto HNSW tarda demasiado en construirse: pasamos a IVF
+MAX_VECTORES_HNSW = 2_000_000
+
+# Parámetros de HNSW
+HNSW_M = 32
+HNSW_EF_CONSTRUCCION = 200
+HNSW_EF_BUSQUEDA = 64
+
+# Parámetros de IVF
+NPROBE = 16
+MAX_VECTORES_ENTRENAMIENTO = 100_000
+MIN_PUNTOS_POR_LISTA = 39   # FAISS pide ~39 vectores de entrenamiento por lista
+
+# Qué tipos permiten borrar vectores (remove_ids); HNSW no
+TIPOS_CON_BORRADO = {"flat", "ivf", "sq8", "ivfpq"}
+
+# Búsqueda con filtro: si quedan hasta esta cantidad de vectores habilitados se
+# comparan todos directamente (exacto y más rápido que recorrer el índice salteando)
+MAX_VECTORES_FILTRO_EXACTO = 4096
+
+
+def _nlist(n):
+    """Cantidad de listas IVF: ~4 * sqrt(n), sin pasarse de lo que se puede entrenar."""
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_PUNTOS_POR_LISTA))
+
+
+def _subcuantizadores_pq(dim):
+    """Subcuantizadores PQ: el divisor más grande de dim que deje subvectores de >= 8 dimensiones."""
+    for m in range(dim // 8, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def bytes_estimados(tipo, n, dim):
+    """Tamaño aproximado del índice en memoria."""
+    if tipo == "flat":
+        return n * dim * 4
+    if tipo == "hnsw":
+        return n * (dim * 4 + HNSW_M * 2 * 4)
+    if tipo == "ivf":
+        return n * (dim * 4 + 8) + _nlist(n) * dim * 4
+    if tipo == "sq8":
+        return n * (dim + 8) + _nlist(n) * dim * 4
+    if tipo == "ivfpq":
+        return n * (_subcuantizadores_pq(dim) + 8) + _nlist(n) * dim * 4
+    raise ValueError(f"Tipo de índice desconocido: '{tipo}'")
+
+
+def elegir_tipo(n, dim, memoria_mb=MEMORIA_INDICE_MB):
+    """
+    Elige el tipo de índice para n vectores de dimensión dim:
+      - pocos vectores: Flat (exacto)
+      - si entra en memoria: HNSW (o IVF-Flat si son demasiados para construir HNSW)
+      - si no entra: IVF + SQ8, y si tampoco, IVF + PQ
+    """
+    presupuesto = memoria_mb * 2**20
+    if n <= MAX_VECTORES_FLAT and bytes_estimados("flat", n, dim) <= presupuesto:
+        return "flat"
+    if n <= MAX_VECTORES_HNSW and bytes_estimados("hnsw", n, dim) <= presupuesto:
+        return "hnsw"
+    for tipo in ("ivf", "sq8"):
+        if bytes_estimados(tipo, n, dim) <= presupuesto:
+            return tipo
+    return "ivfpq"
+
+
+def resolver_tipo(tipo, n, dim, memoria_mb=MEMORIA_INDICE_MB):
+    """
+    Tipo que se usa de verdad para n vectores: resuelve "auto" y baja a un
+    tipo más simple si no hay vectores suficientes para entrenar.
+    """
+    if tipo == "auto":
+        tipo = elegir_tipo(n, dim, memoria_mb)
+    if tipo == "ivfpq" and n < 256:
+        tipo = "sq8"  # PQ de 8 bits necesita al menos 256 vectores para sus centroides
+    if tipo in ("ivf", "sq8") and n < MIN_PUNTOS_POR_LISTA:
+        tipo = "flat"
+    return tipo
+
+
+def descripcion_factory(tipo, n, dim):
+    """String para faiss.index_factory."""
+    if tipo == "flat":
+        return "Flat"
+    if tipo == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if tipo == "ivf":
+        return f"IVF{_nlist(n)},Flat"
+    if tipo == "sq8":
+        return f"IVF{_nlist(n)},SQ8"
+    if tipo == "ivfpq":
+        return f"IVF{_nlist(n)},PQ{_subcuantizadores_pq(dim)}x8"
+    raise ValueError(f"Tipo de índice desconocido: '{tipo}'")
+
+
+def configurar_busqueda(index, nprobe=NPROBE, ef_busqueda=HNSW_EF_BUSQUEDA):
+    """Ajusta nprobe / efSearch (funciona aunque el índice esté envuelto en un IDMap)."""
+    if hasattr(index, "id_map"):
+        index = faiss.downcast_index(index.index)
+    parametros = faiss.ParameterSpace()
+    for nombre, valor in (("nprobe", nprobe), ("efSearch", ef_busqueda)):
+        try:
+            parametros.set_index_parameter(index, nombre, valor)
+        except RuntimeError:
+            pass  # el índice no tiene ese parámetro (por ej. Flat)
+
+
+def crear_indice(embeddings, tipo=TIPO_INDICE, memoria_mb=MEMORIA_INDICE_MB, con_ids=False):
+    """
+    Crea un índice vacío del tipo pedido ("auto" lo elige según len(embeddings))
+    y lo entrena con 'embeddings' si hace falta. No agrega los vectores.
+    Con con_ids=True queda listo para add_with_ids / remove_ids con ids propios:
+    Flat y HNSW se envuelven en un IndexIDMap2; los IVF ya guardan ids y sólo
+    se les agrega un direct map (para poder borrar y reconstruir por id).
+    Retorna (index, tipo).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+    tipo = resolver_tipo(tipo, n, dim, memoria_mb)
+    index = faiss.index_factory(dim, descripcion_factory(tipo, n, dim))
+    if tipo == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCCION
+    if not index.is_trained:
+        muestra = embeddings
+        if n > MAX_VECTORES_ENTRENAMIENTO:
+            filas = np.random.RandomState(0).choice(n, MAX_VECTORES_ENTRENAMIENTO, replace=False)
+            muestra = embeddings[np.sort(filas)]
+        index.train(muestra)
+    configurar_busqueda(index)
+    if con_ids:
+        if tipo in ("flat", "hnsw"):
+            index = faiss.IndexIDMap2(index)
+        else:
+            faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index, tipo
+
+
+def vectores_del_indice(index):
+    """
+    Devuelve (ids, vectores) de todo lo que tiene un índice creado con
+    con_ids=True. Con PQ / SQ8 los vectores son la versión comprimida.
+    """
+    if hasattr(index, "id_map"):
+        ids = faiss.vector_to_array(index.id_map)
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+    ivf = faiss.extract_index_ivf(index)
+    partes = [
+        faiss.rev_swig_ptr(ivf.invlists.get_ids(lista), ivf.invlists.list_size(lista)).copy()
+        for lista in range(ivf.nlist) if ivf.invlists.list_size(lista)
+    ]
+    ids = np.concatenate(partes) if partes else np.zeros(0, dtype=np.int64)
+    return ids, index.reconstruct_batch(ids)
+
+
+def _parametros_con_selector(index, selector):
+    """SearchParameters del tipo que corresponde, conservando nprobe / efSearch."""
+    interno = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(interno, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=interno.hnsw.efSearch)
+    try:
+        ivf = faiss.extract_index_ivf(interno)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+    return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+
+
+def buscar_filtrado(index, consultas, k, ids_permitidos):
+    """
+    index.search restringido a 'ids_permitidos' (ids de un índice creado con
+    con_ids=True). El filtro se aplica dentro de FAISS con un IDSelectorBitmap,
+    así no hay que pedir de más y filtrar después. Si quedan pocos vectores
+    (MAX_VECTORES_FILTRO_EXACTO) se reconstruyen y se comparan todos.
+    Retorna (distancias, ids) como index.search.
+    """
+    consultas = np.ascontiguousarray(consultas, dtype=np.float32)
+    ids_permitidos = np.asarray(ids_permitidos, dtype=np.int64)
+    if len(ids_permitidos) == 0:
+        return (np.full((len(consultas), k), np.inf, dtype=np.float32),
+                np.full((len(consultas), k), -1, dtype=np.int64))
+
+    vectores = None
+    if len(ids_permitidos) <= MAX_VECTORES_FILTRO_EXACTO:
+        try:
+            vectores = index.reconstruct_batch(ids_permitidos)
+        except RuntimeError:
+            pass  # IVF sin direct map (build completo): se filtra dentro del índice
+    if vectores is not None:
+        metrica = index.metric_type
+        distancias, filas = faiss.knn(consultas, vectores, min(k, len(ids_permitidos)), metric=metrica)
+        ids = np.where(filas >= 0, ids_permitidos[np.maximum(filas, 0)], -1)
+        if distancias.shape[1] < k:
+            relleno = np.inf if metrica != faiss.METRIC_INNER_PRODUCT else -np.inf
+            faltan = k - distancias.shape[1]
+            distancias = np.hstack([distancias, np.full((len(consultas), faltan), relleno, dtype=np.float32)])
+            ids = np.hstack([ids, np.full((len(consultas), faltan), -1, dtype=np.int64)])
+        return distancias, ids
+
+    # Un bit por id (orden de bits "little": el id i es el bit i % 8 del byte i // 8)
+    marcados = np.zeros(int(ids_permitidos.max()) + 1, dtype=bool)
+    marcados[ids_permitidos] = True
+    bitmap = np.packbits(marcados, bitorder="little")
+    # IDSelectorBitmap recibe el tamaño del bitmap en bytes, no en bits
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    parametros = _parametros_con_selector(index, selector)
+    distancias, ids = index.search(consultas, k, params=parametros)
+
+    # Control: ningún id fuera del filtro puede llegar al resultado
+    fuera = (ids >= 0) & ~marcados[np.clip(ids, 0, len(marcados) - 1)]
+    fuera |= ids >= len(marcados)
+    if fuera.any():
+        print(f"⚠️ buscar_filtrado: FAISS devolvió {int(fuera.sum())} ids fuera del filtro, se descartan")
+        ids = np.where(fuera, -1, ids)
+        distancias = np.where(fuera, np.inf if index.metric_type != faiss.METRIC_INNER_PRODUCT else -np.inf,
+                              distancias).astype(np.float32)
+    return distancias, ids
+
+
+def leer_indice_mmap(path):
+    """
+    Abre un índice de sólo lectura mapeado en memoria, sin leerlo entero:
+    los Flat / HNSW mapean sus vectores (IO_FLAG_MMAP_IFC) y los IVF sus listas
+    (IO_FLAG_MMAP). Si la versión de FAISS no soporta ninguno, lo lee normal.
+    """
+    intentos = [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY, 0]
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        intentos.insert(0, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    for i, flags in enumerate(intentos):
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            if i == len(intentos) - 1:
+                raise
+
+
+def indice_con_vectores(embeddings, tipo=TIPO_INDICE, memoria_mb=MEMORIA_INDICE_MB):
+    """Atajo: crea el índice adecuado, lo entrena y le agrega 'embeddings'."""
+    index, tipo = crear_indice(embeddings, tipo, memoria_mb)
+    index.add(np.asarray(embeddings, dtype=np.float32))
+    return index
+
+
+# -----------------------------------
+# Benchmark: recall@k vs Flat, latencia y tamaño
+# -----------------------------------
+
+def _cargar_embeddings_publicados():
+    from indice_incremental import INDICES_DIR, cargar_version
+    from indice_particionado import embeddings_y_chunks_particionado
+    from build_faiss import FAISS_INDEX_FILE
+
+    embeddings, _ = embeddings_y_chunks_particionado()
+    if embeddings is not None:
+        return embeddings
+    publicado = cargar_version(INDICES_DIR)
+    if publicado is not None:
+        _, embeddings = vectores_del_indice(publicado[0])
+        return embeddings
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def escalar_corpus(embeddings, n, ruido=0.05, semilla=0):
+    """
+    Genera n vectores a partir del corpus real (copias con ruido gaussiano)
+    para medir cómo se comportaría el índice con un corpus más grande.
+    """
+    generador = np.random.RandomState(semilla)
+    base = embeddings[generador.randint(0, len(embeddings), size=n)]
+    escala = ruido * float(np.linalg.norm(embeddings, axis=1).mean()) / math.sqrt(embeddings.shape[1])
+    return (base + generador.normal(0, escala, size=base.shape)).astype(np.float32)
+
+
+def benchmark(embeddings, tipos, k=10, consultas=200, nprobe=NPROBE, ef_busqueda=HNSW_EF_BUSQUEDA, semilla=0):
+    """
+    Para cada tipo de índice mide:
+      - recall@k contra la búsqueda exacta (Flat)
+      - latencia por consulta (de a una), p50 y p99 en ms
+      - tamaño del índice serializado y tiempo de construcción
+    Las consultas son vectores del corpus elegidos al azar (con un poco de ruido).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    generador = np.random.RandomState(semilla)
+    filas = generador.choice(len(embeddings), min(consultas, len(embeddings)), replace=False)
+    queries = escalar_corpus(embeddings[filas], len(filas), ruido=0.02, semilla=semilla + 1)
+
+    exacto = faiss.IndexFlatL2(embeddings.shape[1])
+    exacto.add(embeddings)
+    _, vecinos_exactos = exacto.search(queries, k)
+
+    resultados = []
+    for tipo in tipos:
+        inicio = time.perf_counter()
+        index, tipo_real = crear_indice(embeddings, tipo)
+        index.add(embeddings)
+        segundos_construccion = time.perf_counter() - inicio
+        configurar_busqueda(index, nprobe, ef_busqueda)
+
+        latencias, aciertos = [], 0
+        for q, exactos in zip(queries, vecinos_exactos):
+            inicio = time.perf_counter()
+            _, vecinos = index.search(q[None, :], k)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            aciertos += len(set(vecinos[0].tolist()) & set(exactos.tolist()))
+
+        resultados.append({
+            "tipo": tipo_real,
+            "factory": descripcion_factory(tipo_real, len(embeddings), embeddings.shape[1]),
+            f"recall@{k}": round(aciertos / (k * len(queries)), 4),
+            "p50_ms": round(float(np.percentile(latencias, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencias, 99)), 3),
+            "tamano_mb": round(len(faiss.serialize_index(index)) / 2**20, 2),
+            "construccion_s": round(segundos_construccion, 2),
+        })
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de tipos de índice FAISS (recall@k, latencia, tamaño)")
+    parser.add_argument("--tipos", default="flat,ivf,hnsw,sq8,ivfpq")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=NPROBE)
+    parser.add_argument("--ef", type=int, default=HNSW_EF_BUSQUEDA)
+    parser.add_argument("--escalar", type=int, default=0,
+                        help="simular un corpus de N vectores a partir del real (0 = usar el real)")
+    args = parser.parse_args()
+
+    embeddings = _cargar_embeddings_publicados()
+    if args.escalar:
+        embeddings = escalar_corpus(embeddings, args.escalar)
+    n, dim = embeddings.shape
+    print(f"📏 {n} vectores de dimensión {dim}; 'auto' elegiría: {elegir_tipo(n, dim)}")
+
+    for fila in benchmark(embeddings, args.tipos.split(","), args.k, args.consultas, args.nprobe, args.ef):
+        print(f"   • {fila['tipo']:6s} {fila['factory']:18s} recall@{args.k}: {fila[f'recall@{args.k}']:.4f}  "
+              f"p50: {fila['p50_ms']:.3f} ms  p99: {fila['p99_ms']:.3f} ms  "
+              f"tamaño: {fila['tamano_mb']:.2f} MB  construcción: {fila['construccion_s']:.2f} s")
@@ -1,8 +1,20 @@
+import hashlib
 import json
 import os
+import queue
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+from charset_normalizer import from_bytes
+from requests.adapters import HTTPAdapter
 from newspaper import Article
 
+from article_store import ARTICLE_STORE_DB, ArticleStore, canonicalizar_url
+from articulos_io import EscritorJSONL, cargar_checkpoint, guardar_checkpoint, iterar_articulos, jsonl_a_json
+
 # 1. Nombre del JSON que generaste antes con todos los links
 #    Cambiá el nombre si tu archivo se llama distinto, ej: "rss_politica_todos_ar_2025-06-04.json"
 INPUT_JSON = "links.json"
@@ -10,6 +22,93 @@ INPUT_JSON = "links.json"
 # 2. Carpeta donde vas a guardar cada artículo completo como .txt (para tenerlos separados)
 OUTPUT_DIR = "articulos_txt"
 
+# Salida: cada artículo se agrega al .jsonl apenas termina (y se hace flush).
+# Al final se arma también el JSON clásico para los pasos que todavía lo leen.
+OUTPUT_JSONL = "articulos_completos.jsonl"
+OUTPUT_JSON = "articulos_completos.json"
+# Checkpoint para retomar una corrida que se cortó a la mitad
+CHECKPOINT_FILE = "articulos_completos.checkpoint.json"
+
+# 3. Parámetros de la descarga en paralelo
+MAX_WORKERS = 16                # artículos que se bajan a la vez (en total)
+MAX_POR_HOST = 2                # conexiones simultáneas como máximo contra un mismo medio
+REQUESTS_POR_SEGUNDO_HOST = 1.0 # ritmo sostenido permitido por medio (token bucket)
+RAFAGA_POR_HOST = 2             # cuántos pedidos seguidos se permiten antes de frenar
+TIMEOUT_SEGUNDOS = 20
+USER_AGENT = "Mozilla/5.0 (compatible; AgentiaClipping/0.1)"
+
+# 4. Parámetros del parseo (CPU) en un pool de procesos
+PROCESOS_PARSEO = os.cpu_count() or 1  # procesos que corren newspaper3k.parse() en paralelo
+TAMANO_COLA_HTML = 64                  # HTMLs bajados esperando parseo (acota la memoria)
+
+
+class TokenBucket:
+    """
+    Token bucket simple: se recargan 'tasa' tokens por segundo hasta 'capacidad'.
+    Cada pedido consume un token; si no hay, el thread espera lo justo.
+    """
+    def __init__(self, tasa, capacidad):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa
+            time.sleep(espera)
+
+
+class LimitadorPorDominio:
+    """
+    Guarda, para cada medio (dominio), un token bucket, un semáforo con la
+    concurrencia máxima y una requests.Session con keep-alive para reusar las
+    conexiones entre artículos del mismo medio.
+    """
+    def __init__(self, max_por_host=MAX_POR_HOST, tasa=REQUESTS_POR_SEGUNDO_HOST, rafaga=RAFAGA_POR_HOST):
+        self.max_por_host = max_por_host
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.lock = threading.Lock()
+        self.dominios = {}
+
+    def _dominio(self, dominio):
+        with self.lock:
+            if dominio not in self.dominios:
+                sesion = requests.Session()
+                sesion.headers["User-Agent"] = USER_AGENT
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_por_host, max_retries=2)
+                sesion.mount("http://", adapter)
+                sesion.mount("https://", adapter)
+                self.dominios[dominio] = {
+                    "bucket": TokenBucket(self.tasa, self.rafaga),
+                    "semaforo": threading.BoundedSemaphore(self.max_por_host),
+                    "sesion": sesion,
+                }
+            return self.dominios[dominio]
+
+    def get(self, url, timeout=TIMEOUT_SEGUNDOS, headers=None):
+        """Hace el GET respetando el ritmo y la concurrencia del dominio de 'url'."""
+        estado = self._dominio(urlparse(url).netloc.lower())
+        with estado["semaforo"]:
+            estado["bucket"].acquire()
+            respuesta = estado["sesion"].get(url, timeout=timeout, headers=headers)
+        respuesta.raise_for_status()
+        return respuesta
+
+    def cerrar(self):
+        for estado in self.dominios.values():
+            estado["sesion"].close()
+
+
 def ensure_output_dir(dir_path):
     """Crea la carpeta OUTPUT_DIR si no existe."""
     if not os.path.isdir(dir_path):
@@ -21,65 +120,217 @@ def load_links(input_file):
         entradas = json.load(f)
     return entradas
 
-def download_full_articles(entradas, output_dir):
+def descargar_html(url, limitador, previo=None):
+    """
+    Etapa 1 (I/O): baja el HTML crudo con la sesión del dominio (pool de
+    conexiones + rate limit). Devuelve los bytes y el charset declarado
+    por el servidor, sin decodificar: eso lo hace la etapa de parseo.
+    Si ya teníamos el artículo ('previo') hace un GET condicional; en ese
+    caso el status puede ser 304 y no hay contenido.
+    """
+    headers = {}
+    if previo is not None:
+        if previo.get("etag"):
+            headers["If-None-Match"] = previo["etag"]
+        if previo.get("last_modified"):
+            headers["If-Modified-Since"] = previo["last_modified"]
+    respuesta = limitador.get(url, headers=headers or None)
+    return {
+        "status": respuesta.status_code,
+        "contenido": respuesta.content if respuesta.status_code != 304 else None,
+        "encoding": respuesta.encoding,
+        "etag": respuesta.headers.get("ETag"),
+        "last_modified": respuesta.headers.get("Last-Modified"),
+    }
+
+
+def parsear_html(url, contenido, encoding):
+    """
+    Etapa 2 (CPU): decodifica el HTML y corre newspaper3k.parse().
+    Se ejecuta dentro de un proceso del pool, por eso es una función de módulo.
+    """
+    # Igual que newspaper3k: si el servidor no declara charset, lo adivinamos
+    if encoding in (None, "ISO-8859-1"):
+        mejor = from_bytes(contenido).best()
+        encoding = mejor.encoding if mejor is not None else "utf-8"
+    html = contenido.decode(encoding, errors="replace")
+
+    art = Article(url, language="es")
+    art.download(input_html=html)
+    art.parse()
+    return art.text  # Contenido completo del artículo
+
+
+def guardar_articulo(articulo, output_dir, escribir_txt=True):
+    """
+    Guarda el .txt del artículo (nombrado con su id estable) y devuelve el
+    dict con metadata + texto que va al JSON final.
+    """
+    filename_txt = f"articulo_{articulo['id']:03d}.txt"
+    ruta_txt = os.path.join(output_dir, filename_txt)
+    if escribir_txt or not os.path.isfile(ruta_txt):
+        with open(ruta_txt, "w", encoding="utf-8") as f_txt:
+            f_txt.write(articulo["texto"])
+
+    return {
+        "id": articulo["id"],
+        "titulo": articulo.get("titulo", ""),
+        "link": articulo.get("link"),
+        "fecha": articulo.get("fecha", ""),
+        "feed": articulo.get("feed"),
+        "archivo_txt": ruta_txt,
+        "texto": articulo["texto"]
+    }
+
+def download_full_articles(entradas, output_dir, max_workers=MAX_WORKERS, max_por_host=MAX_POR_HOST,
+                           requests_por_segundo_host=REQUESTS_POR_SEGUNDO_HOST, procesos_parseo=PROCESOS_PARSEO,
+                           tamano_cola=TAMANO_COLA_HTML, store_path=ARTICLE_STORE_DB,
+                           output_jsonl=OUTPUT_JSONL, checkpoint_path=CHECKPOINT_FILE):
     """
     Recorre cada entrada (que tiene 'link', 'titulo', 'fecha') y
     con newspaper3k baja el texto completo, guardándolo en un .txt
-    cuyo nombre es 'articulo_XXX.txt' (para no pisar nombres raros).
+    cuyo nombre es 'articulo_XXX.txt', donde XXX es el id estable del
+    artículo en el ArticleStore.
+
+    Antes de bajar nada se consulta el ArticleStore: los links que ya tenemos
+    con la misma fecha en el RSS no se vuelven a bajar, y para el resto se hace
+    un GET condicional (ETag / Last-Modified). Si el texto parseado no cambió,
+    el .txt no se reescribe.
+
+    Funciona en dos etapas conectadas por una cola acotada:
+      1. Un pool de threads baja el HTML crudo (cada medio tiene su propio
+         token bucket y un tope de conexiones para no reventarlo).
+      2. Un pool de procesos parsea ese HTML en todos los cores.
+    Si la red va más rápido que el parseo, la cola se llena y los threads de
+    descarga esperan, así que la memoria se mantiene acotada.
+
+    Cada artículo se escribe en 'output_jsonl' apenas termina. Si una corrida
+    anterior con los mismos links se cortó, se retoma desde el checkpoint y no
+    se vuelven a procesar los artículos que ya estaban en el .jsonl.
     """
-    total = len(entradas)
     ensure_output_dir(output_dir)
-    resultados = []  # Para guardar metadata + texto si querés JSON final
-    
-    for idx, ent in enumerate(entradas, start=1):
-        url = ent.get("link")
-        titulo = ent.get("titulo", "")
-        fecha = ent.get("fecha", "")
-        
-        print(f"🔄 [{idx}/{total}] Bajando nota: {titulo[:50]}...")
-        
+
+    # Una entrada del RSS sin link no se puede bajar (ni canonicalizar): se saltea
+    sin_link = [ent for ent in entradas if not (ent.get("link") or "").strip()]
+    if sin_link:
+        print(f"⚠️ {len(sin_link)} entradas del RSS sin link, las salteo "
+              f"(ej.: '{sin_link[0].get('titulo', '')}')")
+        entradas = [ent for ent in entradas if (ent.get("link") or "").strip()]
+    store = ArticleStore(store_path)
+
+    # 0. ¿Hay una corrida a medias con estos mismos links?
+    firma = hashlib.sha1("\n".join(canonicalizar_url(e.get("link")) for e in entradas).encode("utf-8")).hexdigest()
+    checkpoint = cargar_checkpoint(checkpoint_path)
+    retomar = (checkpoint is not None and checkpoint.get("firma") == firma
+               and not checkpoint.get("completo") and os.path.isfile(output_jsonl))
+    vistos = set()  # urls canónicas ya escritas (o que no hay que volver a mirar)
+    if retomar:
+        vistos = {canonicalizar_url(a["link"]) for a in iterar_articulos(output_jsonl)}
+        print(f"⏯️ Retomo la corrida anterior: {len(vistos)} artículos ya estaban en '{output_jsonl}'.")
+    guardar_checkpoint(checkpoint_path, {"firma": firma, "completo": False, "output_jsonl": output_jsonl})
+    ya_escritos = len(vistos)
+
+    with EscritorJSONL(output_jsonl, append=retomar) as escritor:
+        # 1. Sacamos links repetidos y los que ya tenemos sin cambios en el RSS
+        a_bajar = []
+        for ent in entradas:
+            clave = canonicalizar_url(ent.get("link"))
+            if clave in vistos:
+                continue
+            vistos.add(clave)
+            previo = store.buscar(ent.get("link"))
+            if previo is not None and previo["fecha"] == ent.get("fecha", ""):
+                previo["feed"] = ent.get("feed") or previo.get("feed")
+                escritor.escribir(guardar_articulo(previo, output_dir, escribir_txt=False))
+            else:
+                a_bajar.append((clave, ent, previo))
+
+        total = len(a_bajar)
+        print(f"♻️ {escritor.escritos} artículos ya estaban en '{store_path}'; bajo {total} nuevos o modificados.")
+        _descargar_y_parsear(a_bajar, output_dir, store, escritor, max_workers, max_por_host,
+                             requests_por_segundo_host, procesos_parseo, tamano_cola)
+        total_escritos = ya_escritos + escritor.escritos
+
+    store.cerrar()
+
+    # 5. Armamos también el JSON clásico (lista completa) leyendo el .jsonl de a un artículo
+    jsonl_a_json(output_jsonl, OUTPUT_JSON)
+    guardar_checkpoint(checkpoint_path, {"firma": firma, "completo": True, "output_jsonl": output_jsonl})
+
+    print(f"\n✅ Listo: bajé {total_escritos} artículos completos.")
+    print(f"   • Archivos .txt en carpeta: {output_dir}")
+    print(f"   • JSONL con todo en: {output_jsonl} (y {OUTPUT_JSON})")
+
+
+def _descargar_y_parsear(a_bajar, output_dir, store, escritor, max_workers, max_por_host,
+                         requests_por_segundo_host, procesos_parseo, tamano_cola):
+    """Etapas 1 y 2 del pipeline: descarga con threads y parseo con procesos."""
+    total = len(a_bajar)
+    limitador = LimitadorPorDominio(max_por_host=max_por_host, tasa=requests_por_segundo_host)
+    cola_html = queue.Queue(maxsize=max(1, tamano_cola))
+
+    def _bajar(clave, ent, previo):
+        # Cada descarga deja exactamente un elemento en la cola (HTML o error)
         try:
-            art = Article(url, language="es")
-            art.download()
-            art.parse()
-            texto = art.text  # Contenido completo del artículo
-            
-            # 3. Guardar en archivo .txt
-            filename_txt = f"articulo_{idx:03d}.txt"
-            ruta_txt = os.path.join(output_dir, filename_txt)
-            with open(ruta_txt, "w", encoding="utf-8") as f_txt:
-                f_txt.write(texto)
-            
-            # 4. (Opcional) Guardar metadata y texto en lista para un JSON final
-            resultados.append({
-                "id": idx,
-                "titulo": titulo,
-                "link": url,
-                "fecha": fecha,
-                "archivo_txt": ruta_txt,
-                "texto": texto
-            })
-            
-            # Mensaje de éxito
-            print(f"   ✔️ Guardado en: {ruta_txt}")
-        
+            descarga = descargar_html(ent.get("link"), limitador, previo)
+            cola_html.put((clave, ent, previo, descarga, None))
         except Exception as e:
-            print(f"   ❌ ERROR bajando {url}: {e}")
-        
-        # Pequeña pausa para no reventar el servidor de cada medio
-        time.sleep(1)
-    
-    # 5. (Opcional) Guardar todos los textos y metadata en un solo JSON
-    output_json = f"articulos_completos.json"
-    with open(output_json, "w", encoding="utf-8") as f_json:
-        json.dump(resultados, f_json, indent=2, ensure_ascii=False)
-    
-    print(f"\n✅ Listo: bajé {len(resultados)} artículos completos.")
-    print(f"   • Archivos .txt en carpeta: {output_dir}")
-    print(f"   • JSON con todo en: {output_json}")
+            cola_html.put((clave, ent, previo, None, e))
+
+    hechos = 0
+
+    def _registrar(clave, ent, articulo=None, cambio=True, error=None):
+        nonlocal hechos
+        hechos += 1
+        if error is not None:
+            print(f"   ❌ [{hechos}/{total}] ERROR bajando {ent.get('link')}: {error}")
+            return
+        resultado = guardar_articulo(articulo, output_dir, escribir_txt=cambio)
+        store.set_archivo_txt(articulo["id"], resultado["archivo_txt"])
+        escritor.escribir(resultado)
+        estado = "actualizado" if cambio else "sin cambios"
+        print(f"   ✔️ [{hechos}/{total}] ({estado}) {ent.get('titulo', '')[:50]}... -> {resultado['archivo_txt']}")
+
+    def _cosechar(terminados):
+        for futuro in terminados:
+            clave, ent, descarga = pendientes.pop(futuro)
+            try:
+                articulo, cambio = store.guardar(ent, futuro.result(), descarga["etag"], descarga["last_modified"])
+                _registrar(clave, ent, articulo, cambio)
+            except Exception as e:
+                _registrar(clave, ent, error=e)
+
+    procesos_parseo = max(1, procesos_parseo)
+    pendientes = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as red, \
+            ProcessPoolExecutor(max_workers=procesos_parseo) as cpu:
+        for clave, ent, previo in a_bajar:
+            red.submit(_bajar, clave, ent, previo)
+
+        for _ in range(total):
+            clave, ent, previo, descarga, error = cola_html.get()
+            if error is not None:
+                _registrar(clave, ent, error=error)
+                continue
+            if descarga["status"] == 304:
+                # El medio dice que no cambió: refrescamos fecha/título y usamos el texto guardado
+                articulo, _ = store.guardar(ent, previo["texto"], previo["etag"], previo["last_modified"])
+                _registrar(clave, ent, articulo, cambio=False)
+                continue
+            # No mandamos más HTML al pool que los que puede digerir
+            if len(pendientes) >= 2 * procesos_parseo:
+                terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                _cosechar(terminados)
+            futuro = cpu.submit(parsear_html, ent.get("link"), descarga["contenido"], descarga["encoding"])
+            pendientes[futuro] = (clave, ent, descarga)
+
+        _cosechar(list(pendientes))
+
+    limitador.cerrar()
+
 
 if __name__ == "__main__":
     # Cargamos las entradas (título, link, fecha, maybe snippet)
     entradas = load_links(INPUT_JSON)
     # Descargamos cada artículo completo
-    download_full_articles(entradas, OUTPUT_DIR)
\ No newline at end of file
+    download_full_articles(entradas, OUTPUT_DIR)
@@ -1,6 +1,9 @@
 # fetch_rss_sites.py
 import feedparser
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Lista de RSS “Política” de medios argentinos
@@ -13,25 +16,120 @@ RSS_FEEDS = [
     "https://www.pagina12.com.ar/rss/secciones/el-pais/notas",
 ]
 
-def fetch_all_feeds(feeds)->list:
+# Cache en disco con el ETag / Last-Modified y las entradas de cada feed.
+# En la próxima corrida se mandan de vuelta y si el medio responde 304
+# usamos las entradas guardadas en vez de bajar el feed completo.
+FEED_CACHE_FILE = "feed_cache.json"
+
+# Cantidad de feeds que se bajan en paralelo (1 = uno atrás del otro)
+MAX_WORKERS_FEEDS = 16
+
+
+def cargar_cache_feeds(cache_path):
+    """Lee el cache de feeds desde disco (o devuelve uno vacío si no existe o está roto)."""
+    if not cache_path or not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ No pude leer el cache de feeds '{cache_path}': {e}")
+        return {}
+
+
+def guardar_cache_feeds(cache, cache_path):
+    """Guarda el cache de feeds de forma atómica (archivo temporal + rename)."""
+    if not cache_path:
+        return
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def _entrada_desde_feed(entry, url_feed):
+    return {
+        "feed": url_feed,  # de acá salen el medio y la sección para filtrar búsquedas
+        "titulo": entry.title,
+        "link": entry.link,
+        "fecha": entry.get("published", entry.get("updated", "")),
+        # description podría venir como entry.summary o entry.description
+        "snippet": entry.get("summary", entry.get("description", ""))
+    }
+
+
+def fetch_feed(url, cache_entry=None):
+    """
+    Baja un único feed con GET condicional.
+    Si tenemos ETag / Last-Modified de una corrida anterior los mandamos; si el
+    servidor responde 304 devolvemos las entradas del cache.
+    Retorna (entradas, nuevo_cache_entry, desde_cache).
+    """
+    cache_entry = cache_entry or {}
+    feed = feedparser.parse(
+        url,
+        etag=cache_entry.get("etag"),
+        modified=cache_entry.get("modified"),
+    )
+
+    # feedparser no levanta excepciones por DNS / timeout / conexión: devuelve
+    # un resultado sin 'status', con bozo y sin entradas
+    if "status" not in feed:
+        raise RuntimeError(f"no se pudo conectar ({feed.get('bozo_exception', 'sin respuesta')})")
+    if feed.get("status") == 304 and "entries" in cache_entry:
+        # (las entradas cacheadas antes de guardar el feed no lo tienen)
+        return [dict(entrada, feed=url) for entrada in cache_entry["entries"]], cache_entry, True
+    if feed.status >= 400:
+        raise RuntimeError(f"el servidor respondió HTTP {feed.status}")
+    if feed.bozo and not feed.entries:
+        raise RuntimeError(f"el feed vino vacío o roto ({feed.get('bozo_exception')})")
+
+    entradas = [_entrada_desde_feed(entry, url) for entry in feed.entries]
+    nuevo_cache_entry = {
+        "etag": feed.get("etag"),
+        "modified": feed.get("modified"),
+        "entries": entradas,
+    }
+    return entradas, nuevo_cache_entry, False
+
+
+def fetch_all_feeds(feeds, max_workers=MAX_WORKERS_FEEDS, cache_path=FEED_CACHE_FILE)->list:
     """
     Recorre cada RSS y devuelve una lista de entradas con:
       - titulo
       - link (URL original del artículo)
       - fecha (string)
       - description (snippet breve), si existe
+    Los feeds se bajan en paralelo con un pool de threads, así que el tiempo
+    total depende del feed más lento y no de la cantidad de feeds.
+    Las entradas se devuelven en el mismo orden que 'feeds'.
     """
-    all_entries:list = []
-    for url in feeds:
-        feed = feedparser.parse(url)
-        for entry in feed.entries:
-            all_entries.append({
-                "titulo": entry.title,
-                "link": entry.link,
-                "fecha": entry.get("published", entry.get("updated", "")),
-                # description podría venir como entry.summary o entry.description
-                "snippet": entry.get("summary", entry.get("description", ""))  
-            })
+    cache = cargar_cache_feeds(cache_path)
+    lock = threading.Lock()
+    desde_cache = 0
+
+    def _procesar(url):
+        nonlocal desde_cache
+        try:
+            entradas, cache_entry, hit = fetch_feed(url, cache.get(url))
+        except Exception as e:
+            print(f"   ❌ ERROR bajando el feed {url}: {e}")
+            # Si falla la red usamos lo último que tengamos guardado
+            entradas = cache.get(url, {}).get("entries", [])
+            return [dict(entrada, feed=url) for entrada in entradas]
+        with lock:
+            cache[url] = cache_entry
+            if hit:
+                desde_cache += 1
+        return entradas
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        resultados = list(pool.map(_procesar, feeds))
+
+    all_entries:list = [entrada for entradas in resultados for entrada in entradas]
+
+    guardar_cache_feeds(cache, cache_path)
+    print(f"♻️ {desde_cache}/{len(feeds)} feeds sin cambios (304), servidos desde el cache.")
     print(f"🔍 Encontré {len(all_entries)} entradas en total.\n")
     return all_entries
 
@@ -47,4 +145,4 @@ if __name__ == "__main__":
     fecha_hoy = datetime.now().strftime("%Y-%m-%d")
     with open("links.json", "w", encoding="utf-8") as f:
         json.dump(noticias, f, indent=2, ensure_ascii=False)
-    print(f"✅ Guardé todo en links.json")
\ No newline at end of file
+    print(f"✅ Guardé todo en links.json")
@@ -1,5 +1,6 @@
 # cluster_hdbscan.py
 
+import os
 import faiss
 import csv
 import pickle
@@ -9,6 +10,10 @@ import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import normalize
 
+from almacen_chunks import AlmacenChunks
+from indice_incremental import INDICES_DIR, cargar_version, embeddings_y_chunks
+from indice_particionado import embeddings_y_chunks_particionado
+
 
 
 def cargar_embeddings_y_chunks(faiss_index_file, mapping_pickle_file):
@@ -16,11 +21,26 @@ def cargar_embeddings_y_chunks(faiss_index_file, mapping_pickle_file):
     Carga los embeddings desde el índice FAISS y los metadatos de los chunks.
     """
     print("📥 Cargando índice FAISS y mapping...")
+    # Si hay un índice particionado por fecha juntamos todas sus particiones
+    embeddings, documentos = embeddings_y_chunks_particionado()
+    if embeddings is not None:
+        return embeddings, documentos
+    # Si hay un índice incremental publicado usamos ese (ids estables, mapping por id)
+    publicado = cargar_version(INDICES_DIR)
+    if publicado is not None:
+        index, mapping = publicado[0], publicado[1]
+        embeddings, documentos, _ = embeddings_y_chunks(index, mapping)
+        return embeddings, documentos
+
     index = faiss.read_index(faiss_index_file)
     embeddings = index.reconstruct_n(0, index.ntotal)
 
-    with open(mapping_pickle_file, "rb") as f:
-        documentos = pickle.load(f)
+    if os.path.isdir(mapping_pickle_file):
+        # Almacén columnar del build completo: el id de cada chunk es su posición
+        documentos = [chunk for _, chunk in AlmacenChunks(mapping_pickle_file).items()]
+    else:
+        with open(mapping_pickle_file, "rb") as f:
+            documentos = pickle.load(f)
 
     return embeddings, documentos
 
@@ -115,7 +135,7 @@ def visualizar_pca(embeddings, labels):
 
 def clusterizar_noticias_con_hdbscan(
     faiss_index_file="noticias_politica.index",
-    mapping_pickle_file="mapping_id2chunk.pkl",
+    mapping_pickle_file="mapping_chunks",
     output_file="documentos_clusterizados_hdbscan.pkl",
     min_cluster_size=5,
     visualizar=True
@@ -0,0 +1,337 @@
+# indice_incremental.py
+
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+import faiss
+import numpy as np
+
+from almacen_chunks import AlmacenChunks, escribir_almacen
+from article_store import canonicalizar_url, hash_contenido
+from embedding_cache import encode_con_cache
+from fabrica_indices import (TIPO_INDICE, TIPOS_CON_BORRADO, configurar_busqueda, crear_indice, leer_indice_mmap,
+                             resolver_tipo, vectores_del_indice)
+from indice_lexico import borrar_segmentos_sin_uso, publicar_lexico, segmentos_de_version
+
+# Índice FAISS incremental. Cada corrida publica una versión nueva en
+# INDICES_DIR/vNNNNNN/ con:
+#   - indice.faiss: índice con ids propios (tipo según fabrica_indices) -> cada
+#                   vector tiene un id estable (int64)
+#   - chunks/:      almacén columnar {id del vector: chunk} (almacen_chunks.py)
+#   - estado.json:  por artículo, hash del texto, fecha e ids de sus chunks
+#   - lexico.json:  segmentos del índice BM25 (en INDICES_DIR/lexico/, ver indice_lexico.py)
+# y recién al final cambia el puntero INDICES_DIR/ACTUAL.json, así quien
+# lee el índice nunca ve una versión a medio escribir.
+INDICES_DIR = "indices"
+PUNTERO_ACTUAL = "ACTUAL.json"
+ARCHIVO_INDICE = "indice.faiss"
+CARPETA_CHUNKS = "chunks"
+ARCHIVO_MAPPING = "mapping.pkl"   # formato viejo (antes del almacén columnar)
+ARCHIVO_ESTADO = "estado.json"
+
+# Los artículos más viejos que esto (por fecha de publicación) salen del índice
+RETENCION_DIAS = 28
+# Versiones publicadas que se conservan en disco (para volver atrás)
+VERSIONES_A_GUARDAR = 3
+
+
+def parsear_fecha(fecha):
+    """Fecha del RSS (RFC 2822) o ISO -> timestamp, o None si no se entiende."""
+    if not fecha:
+        return None
+    try:
+        return parsedate_to_datetime(fecha).timestamp()
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return datetime.fromisoformat(fecha).timestamp()
+    except ValueError:
+        return None
+
+
+def clave_articulo(art):
+    """
+    Id estable del artículo: el del ArticleStore si lo tiene; si no, la URL
+    canonicalizada o, en último caso, el hash del texto.
+    """
+    if art.get("id") is not None:
+        return art["id"]
+    if art.get("link"):
+        return canonicalizar_url(art["link"])
+    return "sha:" + hash_contenido(art.get("texto", ""))[:16]
+
+
+# --- Lectura / publicación de versiones ---
+
+def _escribir_json_atomico(path, datos):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def version_actual(directorio=INDICES_DIR):
+    """Devuelve el puntero publicado ({"version": n, "carpeta": ...}) o None."""
+    path = os.path.join(directorio, PUNTERO_ACTUAL)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def cargar_version(directorio=INDICES_DIR, mmap=False):
+    """
+    Carga la versión publicada: (index, mapping, estado, puntero). 'mapping'
+    es el AlmacenChunks de la versión (se usa como un dict {id: chunk}).
+    Con mmap=True el índice se abre mapeado en memoria y de sólo lectura
+    (para los procesos que sólo consultan).
+    Si todavía no hay ninguna publicada devuelve None.
+    """
+    puntero = version_actual(directorio)
+    if puntero is None:
+        return None
+    carpeta = os.path.join(directorio, puntero["carpeta"])
+    path_indice = os.path.join(carpeta, ARCHIVO_INDICE)
+    index = leer_indice_mmap(path_indice) if mmap else faiss.read_index(path_indice)
+    configurar_busqueda(index)
+    if os.path.isdir(os.path.join(carpeta, CARPETA_CHUNKS)):
+        mapping = AlmacenChunks(os.path.join(carpeta, CARPETA_CHUNKS))
+    else:
+        with open(os.path.join(carpeta, ARCHIVO_MAPPING), "rb") as f:
+            mapping = pickle.load(f)
+    with open(os.path.join(carpeta, ARCHIVO_ESTADO), encoding="utf-8") as f:
+        estado = json.load(f)
+    return index, mapping, estado, puntero
+
+
+def publicar_version(index, mapping, estado, directorio=INDICES_DIR, versiones_a_guardar=VERSIONES_A_GUARDAR):
+    """
+    Escribe una versión nueva en una carpeta temporal, la renombra y después
+    mueve el puntero ACTUAL.json. Borra las versiones viejas que sobran.
+    El índice léxico sólo suma un segmento con los chunks nuevos si 'mapping'
+    son los cambios sobre la versión anterior (_MappingConCambios).
+    Retorna el número de versión publicado.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    previa = version_actual(directorio)
+    version = (previa["version"] if previa else 0) + 1
+    nombre = f"v{version:06d}"
+    carpeta = os.path.join(directorio, nombre)
+    tmp = f"{carpeta}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    faiss.write_index(index, os.path.join(tmp, ARCHIVO_INDICE))
+    escribir_almacen(os.path.join(tmp, CARPETA_CHUNKS), mapping.items())
+    segmentos_previos = segmentos_de_version(os.path.join(directorio, previa["carpeta"])) if previa else None
+    if isinstance(mapping, _MappingConCambios) and segmentos_previos is not None:
+        chunks_lexico = mapping.nuevos.items()
+    else:
+        chunks_lexico, segmentos_previos = mapping.items(), None
+    publicar_lexico(directorio, tmp, chunks_lexico, segmentos_previos,
+                    ids_vivos=AlmacenChunks(os.path.join(tmp, CARPETA_CHUNKS)).ids())
+    _escribir_json_atomico(os.path.join(tmp, ARCHIVO_ESTADO), estado)
+    shutil.rmtree(carpeta, ignore_errors=True)
+    os.replace(tmp, carpeta)
+
+    _escribir_json_atomico(os.path.join(directorio, PUNTERO_ACTUAL), {
+        "version": version,
+        "carpeta": nombre,
+        "vectores": int(index.ntotal),
+        "publicado": datetime.now().isoformat(timespec="seconds"),
+    })
+
+    versiones = sorted(d for d in os.listdir(directorio) if re.fullmatch(r"v\d{6}", d))
+    for viejo in versiones[:-versiones_a_guardar]:
+        shutil.rmtree(os.path.join(directorio, viejo), ignore_errors=True)
+    borrar_segmentos_sin_uso(directorio, [os.path.join(directorio, v) for v in versiones[-versiones_a_guardar:]])
+    return version
+
+
+def embeddings_y_chunks(index, mapping):
+    """
+    Para un índice publicado: devuelve (embeddings, chunks, ids) alineados
+    fila a fila (sirve para clustering y otros procesos que recorren todo).
+    """
+    ids, embeddings = vectores_del_indice(index)
+    return embeddings, [mapping[int(i)] for i in ids], ids
+
+
+# --- Actualización incremental ---
+
+class _MappingConCambios:
+    """
+    Vista {id: chunk} de la versión anterior (mapeada en memoria, no se carga)
+    más los cambios de esta corrida. items() recorre en orden de id, que es
+    como se escribe el almacén de la versión nueva.
+    """
+    def __init__(self, anterior=None):
+        self.anterior = anterior if anterior is not None else {}
+        self.borrados = set()
+        self.nuevos = {}
+
+    def borrar(self, vector_id):
+        if vector_id in self.nuevos:
+            del self.nuevos[vector_id]
+        elif vector_id in self.anterior:
+            self.borrados.add(vector_id)
+
+    def __setitem__(self, vector_id, chunk):
+        self.nuevos[vector_id] = chunk
+
+    def __len__(self):
+        return len(self.anterior) - len(self.borrados) + len(self.nuevos)
+
+    def items(self):
+        # El almacén ya está ordenado por id; el dict del formato viejo no
+        anteriores = sorted(self.anterior.items()) if isinstance(self.anterior, dict) else self.anterior.items()
+        for vector_id, chunk in anteriores:
+            if vector_id not in self.borrados:
+                yield vector_id, chunk
+        yield from self.nuevos.items()  # ids nuevos: siempre mayores que los anteriores
+
+
+def _indice_desde_cero(mapping, modelo, modelo_name):
+    """
+    Arma un índice nuevo (tipo elegido por fabrica_indices) con todos los
+    chunks de 'mapping'. Los vectores salen del cache de embeddings, así que
+    no se vuelve a encodear nada. Retorna (index, tipo).
+    """
+    ids, textos = [], []
+    for vector_id, chunk in mapping.items():
+        ids.append(vector_id)
+        textos.append(chunk["texto"])
+    ids = np.asarray(ids, dtype=np.int64)
+    embeddings = encode_con_cache(modelo, textos, modelo_name, batch_size=32)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    index, tipo = crear_indice(embeddings, TIPO_INDICE, con_ids=True)
+    index.add_with_ids(embeddings, ids)
+    return index, tipo
+
+
+def actualizar_indice(articulos, modelo, chunkear, modelo_name, directorio=INDICES_DIR,
+                      retencion_dias=RETENCION_DIAS, ahora=None):
+    """
+    Actualiza el índice publicado con los 'articulos' del día y publica una
+    versión nueva:
+      - artículos nuevos: se chunkean, se vectorizan y se agregan
+      - artículos cuyo texto cambió: se borran sus chunks viejos y se agregan los nuevos
+      - artículos sin cambios: no se tocan (conservan sus ids)
+      - artículos con fecha más vieja que 'retencion_dias': se borran
+    'chunkear(articulos)' devuelve la lista de chunks ({"doc_id", "chunk_id", "texto"}).
+    Retorna un dict con lo que cambió.
+    """
+    ahora = ahora or time.time()
+    limite = ahora - retencion_dias * 86400
+    dim = modelo.get_sentence_embedding_dimension()
+    # Los vectores int8 (ONNX) no son los mismos que los fp32: no se pueden mezclar en un índice
+    backend = getattr(modelo, "backend", "torch")
+
+    cargado = cargar_version(directorio)
+    if cargado is None:
+        print("🆕 No hay índice publicado: se arma desde cero.")
+        index, mapping = None, _MappingConCambios()
+        estado = {"modelo": modelo_name, "backend": backend, "dim": dim, "siguiente_id": 0, "articulos": {}}
+    else:
+        index, anterior, estado, puntero = cargado
+        mapping = _MappingConCambios(anterior)
+        print(f"📂 Índice publicado: versión {puntero['version']} ({index.ntotal} vectores)")
+        # (los estados de antes de guardar el backend son de torch)
+        armado_con = (estado.get("modelo"), estado.get("backend", "torch"), estado.get("dim"))
+        if armado_con != (modelo_name, backend, dim):
+            raise ValueError(
+                f"El índice de '{directorio}' se armó con '{armado_con[0]}' (backend {armado_con[1]}) y ahora "
+                f"se usa '{modelo_name}' (backend {backend}). Borrá la carpeta para reconstruirlo."
+            )
+
+    info_articulos = estado["articulos"]
+    a_borrar, a_agregar = [], []
+    stats = {"nuevos": 0, "actualizados": 0, "sin_cambios": 0, "vencidos": 0}
+
+    for art in articulos:
+        clave = str(clave_articulo(art))
+        fecha = parsear_fecha(art.get("fecha"))
+        if fecha is not None and fecha < limite:
+            continue  # ya vencido: si estaba en el índice lo borra el barrido de abajo
+        nuevo_hash = hash_contenido(art.get("texto", ""))
+        previo = info_articulos.get(clave)
+        if previo is not None and previo["hash"] == nuevo_hash:
+            stats["sin_cambios"] += 1
+            continue
+        if previo is not None:
+            a_borrar.extend(previo["ids"])
+            stats["actualizados"] += 1
+        else:
+            stats["nuevos"] += 1
+        # La fecha de referencia para vencer: la del artículo, o cuándo lo indexamos
+        fecha_ref = fecha or (previo["fecha"] if previo is not None else ahora)
+        info_articulos[clave] = {"hash": nuevo_hash, "fecha": fecha_ref, "ids": []}
+        a_agregar.append(dict(art, id=clave_articulo(art)))
+
+    # Barrido de vencidos (estén o no en la tanda de hoy)
+    for clave, info in list(info_articulos.items()):
+        if info["fecha"] < limite:
+            a_borrar.extend(info["ids"])
+            del info_articulos[clave]
+            stats["vencidos"] += 1
+
+    # 1) Borrar chunks de artículos actualizados o vencidos (HNSW no sabe
+    # borrar: en ese caso se rearma al final)
+    reconstruir = False
+    if a_borrar:
+        for vector_id in a_borrar:
+            mapping.borrar(vector_id)
+        if estado.get("tipo_indice", "flat") in TIPOS_CON_BORRADO:
+            index.remove_ids(np.asarray(a_borrar, dtype=np.int64))
+        else:
+            reconstruir = True
+
+    # 2) Agregar chunks nuevos, con ids correlativos que no se reusan
+    chunks = chunkear(a_agregar) if a_agregar else []
+    if chunks:
+        print(f"🔢 Vectorizando {len(chunks)} chunks nuevos...")
+        embeddings = encode_con_cache(modelo, [c["texto"] for c in chunks], modelo_name,
+                                      show_progress_bar=True, batch_size=32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        primero = estado["siguiente_id"]
+        ids = np.arange(primero, primero + len(chunks), dtype=np.int64)
+        if index is None:
+            index, estado["tipo_indice"] = crear_indice(embeddings, TIPO_INDICE, con_ids=True)
+            estado["entrenado_con"] = len(chunks)
+        index.add_with_ids(embeddings, ids)
+        for vector_id, chunk in zip(ids.tolist(), chunks):
+            mapping[vector_id] = chunk
+            info_articulos[str(chunk["doc_id"])]["ids"].append(vector_id)
+        estado["siguiente_id"] = primero + len(chunks)
+
+    # 3) Si el corpus cambió de tamaño lo suficiente como para que convenga
+    # otro tipo de índice (o un IVF ya entrenado con la mitad de los datos), se rearma
+    objetivo = resolver_tipo(TIPO_INDICE, len(mapping), dim)
+    reentrenar = objetivo not in ("flat", "hnsw") and len(mapping) > 2 * estado.get("entrenado_con", 0)
+    rearmar = index is not None and (reconstruir or reentrenar or objetivo != estado.get("tipo_indice", "flat"))
+    if rearmar:
+        print(f"🏗️ Rearmando el índice como '{objetivo}' ({len(mapping)} vectores)...")
+        index, estado["tipo_indice"] = _indice_desde_cero(mapping, modelo, modelo_name)
+        estado["entrenado_con"] = len(mapping)
+
+    if index is None:
+        print("⚠️ No hay chunks para indexar.")
+        stats.update(chunks_agregados=0, chunks_borrados=0, total=0, version=None)
+        return stats
+
+    stats.update(chunks_agregados=len(chunks), chunks_borrados=len(a_borrar), total=int(index.ntotal),
+                 tipo_indice=estado["tipo_indice"])
+    if not chunks and not a_borrar and not rearmar and cargado is not None:
+        stats["version"] = cargado[3]["version"]
+        print("✅ Sin cambios: el índice publicado sigue vigente.")
+        return stats
+
+    stats["version"] = publicar_version(index, mapping, estado, directorio)
+    print(f"📦 Publicada la versión {stats['version']} del índice ({index.ntotal} vectores).")
+    return stats
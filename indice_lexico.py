@@ -0,0 +1,319 @@
+# indice_lexico.py
+
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+# Índice invertido BM25 sobre los mismos chunks que el índice FAISS, para la
+# búsqueda híbrida (léxica + densa) de query_rag. Los términos se pasan por el
+# stemmer Snowball de español de NLTK y se sacan las stopwords.
+#
+# Se arma por segmentos inmutables (como Lucene): cada publicación del índice
+# agrega un segmento sólo con los chunks nuevos, y la versión guarda en
+# ARCHIVO_MANIFIESTO qué segmentos la forman. Los chunks borrados no se sacan
+# de los segmentos: al buscar se descartan los ids que ya no están en el
+# almacén de chunks de la versión. Cuando hay más de MAX_SEGMENTOS se fusionan
+# en uno solo (y ahí sí se van los borrados).
+#
+# Cada segmento es una carpeta con:
+#   - meta.json:    cantidad de chunks, suma de largos y la lista de términos
+#   - offsets.npy:  dónde empiezan los postings de cada término
+#   - ids.npy:      id del chunk de cada posting (int64)
+#   - tf.npy:       frecuencia del término en el chunk (uint16)
+#   - largos.npy:   largo del chunk en términos, por posting (uint32)
+CARPETA_SEGMENTOS = "lexico"
+ARCHIVO_MANIFIESTO = "lexico.json"
+MAX_SEGMENTOS = 8
+
+# Parámetros de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal Rank Fusion: score = suma de 1 / (RRF_K + posición) en cada lista
+RRF_K = 60
+
+_stemmer = None
+_stopwords = None
+_lock = threading.Lock()
+
+
+def _recursos_nltk():
+    global _stemmer, _stopwords
+    with _lock:
+        if _stemmer is None:
+            import nltk
+            from nltk.corpus import stopwords
+            from nltk.stem.snowball import SnowballStemmer
+
+            try:
+                palabras = stopwords.words("spanish")
+            except LookupError:
+                print("⬇️ Bajando las stopwords de NLTK...")
+                try:
+                    nltk.download("stopwords", quiet=True)
+                    palabras = stopwords.words("spanish")
+                except (LookupError, OSError):
+                    print("⚠️ No pude bajar las stopwords de NLTK: sigo sin sacarlas")
+                    palabras = []
+            _stopwords = frozenset(palabras)
+            _stemmer = SnowballStemmer("spanish")
+    return _stemmer, _stopwords
+
+
+@lru_cache(maxsize=200_000)
+def _raiz(palabra):
+    return _stemmer.stem(palabra)
+
+
+def tokenizar(texto):
+    """Texto -> lista de raíces (minúsculas, sin stopwords ni signos)."""
+    _, stopwords = _recursos_nltk()
+    return [_raiz(p) for p in re.findall(r"[^\W_]+", (texto or "").lower()) if p not in stopwords]
+
+
+# --- Escritura ---
+
+def escribir_segmento(directorio, chunks):
+    """
+    Escribe un segmento en 'directorio' a partir de 'chunks', un iterable de
+    (id_del_vector, chunk). Retorna la cantidad de chunks que tiene.
+    """
+    postings = defaultdict(list)
+    documentos, suma_largos = 0, 0
+    for vector_id, chunk in chunks:
+        terminos = tokenizar(chunk.get("texto", ""))
+        largo = len(terminos)
+        for termino, tf in Counter(terminos).items():
+            postings[termino].append((int(vector_id), min(tf, 65535), largo))
+        documentos += 1
+        suma_largos += largo
+    _guardar_segmento(directorio, postings, documentos, suma_largos)
+    return documentos
+
+
+def _guardar_segmento(directorio, postings, documentos, suma_largos):
+    """'postings': {término: filas (id, tf, largo)} como lista de tuplas o array de n x 3."""
+    tmp = f"{directorio}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    terminos = sorted(postings)
+    bloques = [np.asarray(postings[t], dtype=np.int64).reshape(-1, 3) for t in terminos]
+    offsets = np.zeros(len(terminos) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in bloques])
+    columnas = np.concatenate(bloques) if bloques else np.zeros((0, 3), dtype=np.int64)
+    np.save(os.path.join(tmp, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp, "ids.npy"), columnas[:, 0])
+    np.save(os.path.join(tmp, "tf.npy"), columnas[:, 1].astype(np.uint16))
+    np.save(os.path.join(tmp, "largos.npy"), columnas[:, 2].astype(np.uint32))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"documentos": documentos, "suma_largos": suma_largos, "terminos": terminos}, f, ensure_ascii=False)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(tmp, directorio)
+
+
+def _siguiente_segmento(dir_segmentos):
+    existentes = [int(d[4:]) for d in os.listdir(dir_segmentos) if re.fullmatch(r"seg_\d{6}", d)]
+    return f"seg_{max(existentes, default=0) + 1:06d}"
+
+
+def fusionar_segmentos(dir_segmentos, nombres, ids_vivos):
+    """
+    Junta varios segmentos en uno nuevo, dejando afuera los ids que no están
+    en 'ids_vivos' (array de ids de la versión). Retorna el nombre del nuevo.
+    """
+    vivos = np.asarray(ids_vivos, dtype=np.int64)
+    postings = defaultdict(list)
+    for nombre in nombres:
+        segmento = Segmento(os.path.join(dir_segmentos, nombre))
+        filas = np.stack([np.asarray(segmento.ids), np.asarray(segmento.tf, dtype=np.int64),
+                          np.asarray(segmento.largos, dtype=np.int64)], axis=1)
+        quedan = np.isin(filas[:, 0], vivos)
+        for t, termino in enumerate(segmento.terminos):
+            inicio, fin = int(segmento.offsets[t]), int(segmento.offsets[t + 1])
+            bloque = filas[inicio:fin][quedan[inicio:fin]]
+            if len(bloque):
+                postings[termino].append(bloque)
+    postings = {termino: np.concatenate(bloques) for termino, bloques in postings.items()}
+
+    # Cantidad de chunks y suma de largos de los que quedaron (cada chunk una vez).
+    # Los chunks sin ningún término no tienen postings y dejan de contarse.
+    todas = np.concatenate(list(postings.values())) if postings else np.zeros((0, 3), dtype=np.int64)
+    _, primeras = np.unique(todas[:, 0], return_index=True)
+    nuevo = _siguiente_segmento(dir_segmentos)
+    _guardar_segmento(os.path.join(dir_segmentos, nuevo), postings, len(primeras), int(todas[primeras, 2].sum()))
+    return nuevo
+
+
+def publicar_lexico(directorio, carpeta_nueva, chunks_nuevos, segmentos_previos=None, ids_vivos=None):
+    """
+    Arma el índice léxico de una versión nueva del índice en 'directorio'
+    (INDICES_DIR o una partición): escribe un segmento con 'chunks_nuevos'
+    ((id, chunk)) y deja en carpeta_nueva/ARCHIVO_MANIFIESTO la lista de
+    segmentos = los de la versión anterior + el nuevo. Con segmentos_previos=None
+    el segmento nuevo tiene todo (primera vez o índice rearmado con ids nuevos).
+    """
+    dir_segmentos = os.path.join(directorio, CARPETA_SEGMENTOS)
+    os.makedirs(dir_segmentos, exist_ok=True)
+    nuevo = _siguiente_segmento(dir_segmentos)
+    segmentos = list(segmentos_previos or [])
+    if escribir_segmento(os.path.join(dir_segmentos, nuevo), chunks_nuevos) or not segmentos:
+        segmentos.append(nuevo)
+    else:
+        shutil.rmtree(os.path.join(dir_segmentos, nuevo), ignore_errors=True)
+    if len(segmentos) > MAX_SEGMENTOS and ids_vivos is not None:
+        print(f"🧱 Fusionando {len(segmentos)} segmentos del índice léxico...")
+        segmentos = [fusionar_segmentos(dir_segmentos, segmentos, ids_vivos)]
+    with open(os.path.join(carpeta_nueva, ARCHIVO_MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump({"segmentos": segmentos}, f, indent=2)
+    return segmentos
+
+
+def segmentos_de_version(carpeta):
+    """Segmentos de la versión en 'carpeta', o None si no tiene índice léxico."""
+    path = os.path.join(carpeta, ARCHIVO_MANIFIESTO)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["segmentos"]
+
+
+def borrar_segmentos_sin_uso(directorio, carpetas_vigentes):
+    """Borra los segmentos que no usa ninguna de las versiones que quedan."""
+    dir_segmentos = os.path.join(directorio, CARPETA_SEGMENTOS)
+    if not os.path.isdir(dir_segmentos):
+        return
+    en_uso = set()
+    for carpeta in carpetas_vigentes:
+        en_uso.update(segmentos_de_version(carpeta) or [])
+    for nombre in os.listdir(dir_segmentos):
+        if nombre not in en_uso:
+            shutil.rmtree(os.path.join(dir_segmentos, nombre), ignore_errors=True)
+
+
+# --- Lectura y búsqueda ---
+
+class Segmento:
+    """Un segmento abierto con mmap (el vocabulario se carga en un dict)."""
+    def __init__(self, directorio):
+        with open(os.path.join(directorio, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.documentos = meta["documentos"]
+        self.suma_largos = meta["suma_largos"]
+        self.terminos = meta["terminos"]
+        self.posicion = {termino: i for i, termino in enumerate(self.terminos)}
+        abrir = lambda nombre: np.load(os.path.join(directorio, nombre), mmap_mode="r")
+        self.offsets = abrir("offsets.npy")
+        self.ids = abrir("ids.npy")
+        self.tf = abrir("tf.npy")
+        self.largos = abrir("largos.npy")
+
+    def postings(self, termino):
+        """(ids, tf, largos) del término, o None si no aparece en el segmento."""
+        t = self.posicion.get(termino)
+        if t is None:
+            return None
+        inicio, fin = int(self.offsets[t]), int(self.offsets[t + 1])
+        return self.ids[inicio:fin], self.tf[inicio:fin], self.largos[inicio:fin]
+
+
+class IndiceLexico:
+    """Los segmentos de una versión. Se arma con abrir_lexico()."""
+    def __init__(self, segmentos):
+        self.segmentos = segmentos
+
+    @property
+    def documentos(self):
+        return sum(s.documentos for s in self.segmentos)
+
+    @property
+    def suma_largos(self):
+        return sum(s.suma_largos for s in self.segmentos)
+
+    def frecuencias(self, terminos):
+        """Cantidad de chunks en que aparece cada término (en todos los segmentos)."""
+        return np.asarray([
+            sum(len(p[0]) for p in (s.postings(t) for s in self.segmentos) if p is not None)
+            for t in terminos
+        ], dtype=np.float64)
+
+    def puntuar(self, terminos, idf, promedio_largo):
+        """(ids, scores BM25) de todos los chunks con algún término (ids repetidos sumados)."""
+        partes_ids, partes_scores = [], []
+        for termino, peso in zip(terminos, idf):
+            for segmento in self.segmentos:
+                p = segmento.postings(termino)
+                if p is None:
+                    continue
+                ids, tf, largos = p
+                tf = tf.astype(np.float32)
+                norma = BM25_K1 * (1 - BM25_B + BM25_B * largos.astype(np.float32) / promedio_largo)
+                partes_ids.append(np.asarray(ids))
+                partes_scores.append(peso * tf * (BM25_K1 + 1) / (tf + norma))
+        if not partes_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, inversa = np.unique(np.concatenate(partes_ids), return_inverse=True)
+        return ids, np.bincount(inversa, weights=np.concatenate(partes_scores)).astype(np.float32)
+
+
+def abrir_lexico(directorio, carpeta_version):
+    """IndiceLexico de la versión en 'carpeta_version', o None si no tiene."""
+    nombres = segmentos_de_version(carpeta_version)
+    if nombres is None:
+        return None
+    dir_segmentos = os.path.join(directorio, CARPETA_SEGMENTOS)
+    return IndiceLexico([Segmento(os.path.join(dir_segmentos, n)) for n in nombres])
+
+
+def buscar_bm25(fuentes, consulta, k):
+    """
+    Top-k BM25 de 'consulta' sobre varias fuentes a la vez (por ej. las
+    particiones por fecha), con estadísticas globales (cantidad de chunks,
+    largo promedio y frecuencia de cada término sumadas entre todas) para
+    que los scores sean comparables. 'fuentes' es una lista de
+    (etiqueta, IndiceLexico, mapping, ids_permitidos): sólo cuentan los ids
+    que siguen en 'mapping' (el almacén de chunks de la versión) y, si
+    ids_permitidos no es None, los que están ahí (filtros por metadatos).
+    Retorna una lista de (score, etiqueta, id) de mayor a menor.
+    """
+    terminos = list(dict.fromkeys(tokenizar(consulta)))
+    fuentes = [f for f in fuentes if f[1] is not None]
+    if not terminos or not fuentes:
+        return []
+    documentos = sum(lexico.documentos for _, lexico, _, _ in fuentes)
+    promedio_largo = max(sum(lexico.suma_largos for _, lexico, _, _ in fuentes) / max(documentos, 1), 1.0)
+    df = sum(lexico.frecuencias(terminos) for _, lexico, _, _ in fuentes)
+    idf = np.log(1 + (documentos - df + 0.5) / (df + 0.5))
+
+    candidatos = []
+    for etiqueta, lexico, mapping, ids_permitidos in fuentes:
+        ids, scores = lexico.puntuar(terminos, idf, promedio_largo)
+        quedan = mapping.contiene_ids(ids)
+        if ids_permitidos is not None:
+            quedan &= np.isin(ids, ids_permitidos)
+        ids, scores = ids[quedan], scores[quedan]
+        if len(ids) > k:
+            mejores = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[mejores], scores[mejores]
+        candidatos.extend((float(s), etiqueta, int(i)) for s, i in zip(scores, ids))
+    candidatos.sort(key=lambda c: -c[0])
+    return candidatos[:k]
+
+
+def fusionar_rrf(listas, k=None, rrf_k=RRF_K):
+    """
+    Reciprocal Rank Fusion: 'listas' son rankings (de mejor a peor) de claves
+    cualesquiera; cada clave suma 1 / (rrf_k + posición) por cada lista en la
+    que aparece. Retorna [(clave, score)] de mayor a menor (los k primeros).
+    """
+    scores = defaultdict(float)
+    for lista in listas:
+        for posicion, clave in enumerate(lista, start=1):
+            scores[clave] += 1.0 / (rrf_k + posicion)
+    fusion = sorted(scores.items(), key=lambda par: -par[1])
+    return fusion[:k] if k is not None else fusion
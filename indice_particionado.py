@@ -0,0 +1,365 @@
+# indice_particionado.py
+
+import heapq
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import faiss
+import numpy as np
+
+from fabrica_indices import TIPO_INDICE, buscar_filtrado, crear_indice, vectores_del_indice
+from indice_lexico import abrir_lexico, buscar_bm25
+from indice_incremental import (_escribir_json_atomico, actualizar_indice, cargar_version, clave_articulo,
+                                embeddings_y_chunks, parsear_fecha, publicar_version, version_actual)
+
+# Índice partido por fecha de publicación. Cada partición es un índice
+# incremental completo (ver indice_incremental.py: versiones + ACTUAL.json)
+# en PARTICIONES_DIR/<nombre>/:
+#   - dAAAA-MM-DD: los artículos de un día
+#   - sAAAA-Www:   los de una semana ISO (con GRANULARIDAD = "semana", o los
+#                  días que ya se compactaron)
+# Una consulta sólo abre las particiones que cubren el rango de fechas pedido,
+# las busca en paralelo y junta los top-k con un heap. Así el costo de una
+# consulta depende de la ventana de tiempo y no de toda la historia.
+PARTICIONES_DIR = "indices_por_fecha"
+ARCHIVO_ASIGNACION = "asignacion.json"   # clave del artículo -> partición donde quedó
+
+GRANULARIDAD = "dia"          # "dia" o "semana"
+# Las particiones diarias más viejas que esto se juntan en la de su semana
+COMPACTAR_DESPUES_DIAS = 7
+# Las particiones que terminan antes de esto se borran enteras
+RETENCION_DIAS_PARTICIONES = 365
+
+HILOS_BUSQUEDA = min(8, os.cpu_count() or 1)
+
+
+# --- Nombres y rangos ---
+
+def nombre_particion(ts, granularidad=GRANULARIDAD):
+    """Partición a la que va un artículo con fecha 'ts' (timestamp)."""
+    dia = datetime.fromtimestamp(ts).date()
+    if granularidad == "semana":
+        anio, semana, _ = dia.isocalendar()
+        return f"s{anio}-W{semana:02d}"
+    return f"d{dia.isoformat()}"
+
+
+def rango_particion(nombre):
+    """(inicio, fin) de la partición como timestamps; fin no incluido."""
+    if nombre.startswith("s"):
+        anio, semana = nombre[1:].split("-W")
+        inicio = date.fromisocalendar(int(anio), int(semana), 1)
+        fin = inicio + timedelta(days=7)
+    else:
+        inicio = date.fromisoformat(nombre[1:])
+        fin = inicio + timedelta(days=1)
+    return (datetime.combine(inicio, datetime.min.time()).timestamp(),
+            datetime.combine(fin, datetime.min.time()).timestamp())
+
+
+def _semana_de(nombre):
+    anio, semana, _ = date.fromisoformat(nombre[1:]).isocalendar()
+    return f"s{anio}-W{semana:02d}"
+
+
+def listar_particiones(directorio=PARTICIONES_DIR):
+    """Particiones publicadas (con ACTUAL.json), ordenadas por fecha."""
+    if not os.path.isdir(directorio):
+        return []
+    nombres = [
+        d for d in os.listdir(directorio)
+        if re.fullmatch(r"d\d{4}-\d{2}-\d{2}|s\d{4}-W\d{2}", d) and version_actual(os.path.join(directorio, d))
+    ]
+    return sorted(nombres, key=rango_particion)
+
+
+def particiones_en_rango(desde=None, hasta=None, directorio=PARTICIONES_DIR):
+    """Particiones que se pisan con [desde, hasta] (timestamps; None = sin límite)."""
+    elegidas = []
+    for nombre in listar_particiones(directorio):
+        inicio, fin = rango_particion(nombre)
+        if (desde is None or fin > desde) and (hasta is None or inicio <= hasta):
+            elegidas.append(nombre)
+    return elegidas
+
+
+def versiones_en_rango(desde=None, hasta=None, directorio=PARTICIONES_DIR):
+    """[(partición, versión publicada)] del rango: si cambia, cambió lo que devuelve una búsqueda."""
+    return tuple(
+        (nombre, version_actual(os.path.join(directorio, nombre))["version"])
+        for nombre in particiones_en_rango(desde, hasta, directorio)
+    )
+
+
+def _cargar_asignacion(directorio):
+    path = os.path.join(directorio, ARCHIVO_ASIGNACION)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Actualización, retención y compactación ---
+
+def actualizar_particiones(articulos, modelo, chunkear, modelo_name, directorio=PARTICIONES_DIR,
+                           granularidad=GRANULARIDAD, retencion_dias=RETENCION_DIAS_PARTICIONES,
+                           compactar_despues_dias=COMPACTAR_DESPUES_DIAS, ahora=None):
+    """
+    Reparte los 'articulos' del día entre sus particiones por fecha y actualiza
+    cada una con actualizar_indice (sólo las que recibieron algo). Un artículo
+    que ya estaba indexado sigue en su partición aunque cambie el texto; los
+    que no tienen fecha van a la del día en que se indexan. Después aplica la
+    retención (borra particiones enteras) y compacta días viejos en semanas.
+    Retorna un dict con lo que cambió.
+    """
+    ahora = ahora or time.time()
+    limite = ahora - retencion_dias * 86400
+    os.makedirs(directorio, exist_ok=True)
+    asignacion = _cargar_asignacion(directorio)
+    existentes = set(listar_particiones(directorio))
+
+    grupos = {}
+    for art in articulos:
+        clave = str(clave_articulo(art))
+        fecha = parsear_fecha(art.get("fecha"))
+        if fecha is not None and fecha < limite:
+            continue
+        nombre = asignacion.get(clave)
+        if nombre is None:
+            nombre = nombre_particion(fecha or ahora, granularidad)
+            if nombre.startswith("d") and _semana_de(nombre) in existentes:
+                nombre = _semana_de(nombre)  # ese día ya se compactó
+        asignacion[clave] = nombre
+        grupos.setdefault(nombre, []).append(art)
+
+    stats = {"nuevos": 0, "actualizados": 0, "sin_cambios": 0, "vencidos": 0,
+             "chunks_agregados": 0, "chunks_borrados": 0, "particiones_actualizadas": 0}
+    for nombre in sorted(grupos, key=rango_particion):
+        print(f"🗓️ Partición '{nombre}': {len(grupos[nombre])} artículos")
+        parciales = actualizar_indice(grupos[nombre], modelo, chunkear, modelo_name,
+                                      directorio=os.path.join(directorio, nombre),
+                                      retencion_dias=retencion_dias, ahora=ahora)
+        for clave in ("nuevos", "actualizados", "sin_cambios", "vencidos", "chunks_agregados", "chunks_borrados"):
+            stats[clave] += parciales[clave]
+        stats["particiones_actualizadas"] += 1
+
+    stats["particiones_borradas"] = aplicar_retencion(directorio, retencion_dias, ahora)
+    if granularidad == "dia":
+        stats["particiones_compactadas"] = compactar_particiones(directorio, compactar_despues_dias, ahora)
+
+    vigentes = set(listar_particiones(directorio))
+    asignacion = {clave: nombre for clave, nombre in asignacion.items() if nombre in vigentes}
+    _escribir_json_atomico(os.path.join(directorio, ARCHIVO_ASIGNACION), asignacion)
+    stats["particiones"] = len(vigentes)
+    stats["total"] = sum(version_actual(os.path.join(directorio, n))["vectores"] for n in vigentes)
+    return stats
+
+
+def aplicar_retencion(directorio=PARTICIONES_DIR, retencion_dias=RETENCION_DIAS_PARTICIONES, ahora=None):
+    """Borra las particiones que terminan antes de la ventana de retención. Retorna cuántas."""
+    limite = (ahora or time.time()) - retencion_dias * 86400
+    borradas = 0
+    for nombre in listar_particiones(directorio):
+        if rango_particion(nombre)[1] <= limite:
+            print(f"🗑️ Borrando la partición vencida '{nombre}'")
+            shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+            borradas += 1
+    return borradas
+
+
+def _juntar_particiones(directorio, nombres):
+    """
+    Arma (index, mapping, estado) con el contenido de varias particiones,
+    renumerando los ids. Si un artículo aparece en más de una (por ej. quedó
+    a medio compactar) gana la última de 'nombres'.
+    """
+    por_articulo = {}
+    estado_base = None
+    for nombre in nombres:
+        index, mapping, estado, _ = cargar_version(os.path.join(directorio, nombre))
+        estado_base = estado_base or estado
+        if (estado.get("modelo"), estado.get("backend", "torch")) != \
+                (estado_base.get("modelo"), estado_base.get("backend", "torch")):
+            raise ValueError(f"Las particiones {nombres} se armaron con modelos o backends distintos: no se pueden juntar.")
+        ids, vectores = vectores_del_indice(index)
+        fila_de = {int(vector_id): fila for fila, vector_id in enumerate(ids.tolist())}
+        for clave, info in estado["articulos"].items():
+            filas = [fila_de[i] for i in info["ids"] if i in fila_de]
+            por_articulo[clave] = (info, vectores[filas], [mapping[i] for i in info["ids"] if i in fila_de])
+
+    articulos, nuevo_mapping, bloques = {}, {}, []
+    siguiente_id = 0
+    for clave, (info, vectores, chunks) in por_articulo.items():
+        ids = list(range(siguiente_id, siguiente_id + len(chunks)))
+        articulos[clave] = dict(info, ids=ids)
+        nuevo_mapping.update(zip(ids, chunks))
+        bloques.append(vectores)
+        siguiente_id += len(chunks)
+
+    estado = {"modelo": estado_base["modelo"], "backend": estado_base.get("backend", "torch"),
+              "dim": estado_base["dim"], "siguiente_id": siguiente_id, "articulos": articulos}
+    if not siguiente_id:
+        return None, nuevo_mapping, estado
+    embeddings = np.ascontiguousarray(np.concatenate(bloques), dtype=np.float32)
+    index, estado["tipo_indice"] = crear_indice(embeddings, TIPO_INDICE, con_ids=True)
+    index.add_with_ids(embeddings, np.arange(siguiente_id, dtype=np.int64))
+    estado["entrenado_con"] = siguiente_id
+    return index, nuevo_mapping, estado
+
+
+def compactar_particiones(directorio=PARTICIONES_DIR, despues_dias=COMPACTAR_DESPUES_DIAS, ahora=None):
+    """
+    Junta las particiones diarias de cada semana que ya terminó hace más de
+    'despues_dias' en una sola partición semanal (los vectores salen de los
+    índices, no se vuelve a encodear). Retorna cuántas particiones diarias se juntaron.
+    """
+    limite = (ahora or time.time()) - despues_dias * 86400
+    existentes = listar_particiones(directorio)
+    semanas = {}
+    for nombre in existentes:
+        if nombre.startswith("d"):
+            semana = _semana_de(nombre)
+            if rango_particion(semana)[1] <= limite:
+                semanas.setdefault(semana, []).append(nombre)
+
+    compactadas = 0
+    for semana, dias in sorted(semanas.items()):
+        fuentes = ([semana] if semana in existentes else []) + dias
+        print(f"🧱 Compactando {len(dias)} particiones diarias en '{semana}'...")
+        index, mapping, estado = _juntar_particiones(directorio, fuentes)
+        if index is not None:
+            # La semanal se publica antes de borrar los días: si se corta en el
+            # medio, la próxima corrida vuelve a juntar y no se pierde nada
+            publicar_version(index, mapping, estado, os.path.join(directorio, semana))
+        else:
+            shutil.rmtree(os.path.join(directorio, semana), ignore_errors=True)
+        for dia in dias:
+            shutil.rmtree(os.path.join(directorio, dia), ignore_errors=True)
+        compactadas += len(dias)
+    return compactadas
+
+
+# --- Búsqueda ---
+
+_abiertas = {}   # nombre -> (versión, index, mapping, léxico)
+_lock = threading.Lock()
+_pool = None
+
+
+def abrir_particion(nombre, directorio=PARTICIONES_DIR):
+    """
+    Devuelve (index, mapping, lexico) de la partición, abiertos con mmap
+    ('lexico' es None si la versión no tiene índice BM25). Quedan abiertos
+    entre consultas y se vuelven a abrir si se publicó otra versión.
+    """
+    carpeta = os.path.join(directorio, nombre)
+    version = version_actual(carpeta)["version"]
+    clave = (directorio, nombre)
+    with _lock:
+        abierta = _abiertas.get(clave)
+        if abierta is None or abierta[0] != version:
+            index, mapping, _, puntero = cargar_version(carpeta, mmap=True)
+            lexico = abrir_lexico(carpeta, os.path.join(carpeta, puntero["carpeta"]))
+            abierta = _abiertas[clave] = (puntero["version"], index, mapping, lexico)
+    return abierta[1:]
+
+
+def _obtener_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # FAISS suelta el GIL mientras busca: con hilos alcanza
+            _pool = ThreadPoolExecutor(max_workers=HILOS_BUSQUEDA, thread_name_prefix="particion")
+    return _pool
+
+
+def _condiciones(nombre, mapping, desde, hasta, filtros):
+    """Filtros por metadatos para una partición (+ la fecha si el rango la cubre sólo en parte)."""
+    condiciones = dict(filtros or {})
+    inicio, fin = rango_particion(nombre)
+    parcial = (desde is not None and inicio < desde) or (hasta is not None and fin > hasta)
+    if parcial and "fecha" in mapping.tipos:  # (las particiones viejas no tienen la columna)
+        condiciones["fecha"] = (desde, hasta)
+    return condiciones
+
+
+def buscar_particionado(embeddings_consulta, k, desde=None, hasta=None, filtros=None, directorio=PARTICIONES_DIR):
+    """
+    Busca las consultas en las particiones que cubren [desde, hasta]
+    (timestamps) en paralelo y junta los k mejores de cada consulta con un heap.
+    'filtros' son filtros por metadatos de los chunks (ver
+    AlmacenChunks.ids_filtrados, por ej. {"medio": "clarin.com"}); se aplican
+    dentro de FAISS. En las particiones que el rango cubre sólo en parte
+    también se filtra por la fecha de cada chunk.
+    Retorna, por consulta, una lista de dicts ordenada de mejor a peor con
+    'particion', 'id', 'distancia' y 'chunk'.
+    """
+    consultas = np.ascontiguousarray(np.atleast_2d(embeddings_consulta), dtype=np.float32)
+    nombres = particiones_en_rango(desde, hasta, directorio)
+    if not nombres:
+        return [[] for _ in range(len(consultas))]
+
+    def buscar_en(nombre):
+        index, mapping, _ = abrir_particion(nombre, directorio)
+        condiciones = _condiciones(nombre, mapping, desde, hasta, filtros)
+        if condiciones:
+            distancias, ids = buscar_filtrado(index, consultas, k, mapping.ids_filtrados(condiciones))
+        else:
+            distancias, ids = index.search(consultas, min(k, max(index.ntotal, 1)))
+        # Con producto interno más grande es mejor: se da vuelta para que el heap siempre tome los menores
+        signo = -1.0 if index.metric_type == faiss.METRIC_INNER_PRODUCT else 1.0
+        return nombre, mapping, signo, distancias, ids
+
+    parciales = list(_obtener_pool().map(buscar_en, nombres))
+
+    resultados = []
+    for q in range(len(consultas)):
+        candidatos = (
+            (signo * float(d), signo, nombre, int(vector_id), mapping)
+            for nombre, mapping, signo, distancias, ids in parciales
+            for d, vector_id in zip(distancias[q], ids[q]) if vector_id >= 0
+        )
+        mejores = heapq.nsmallest(k, candidatos, key=lambda c: c[0])
+        resultados.append([
+            {"particion": nombre, "id": vector_id, "distancia": signo * orden, "chunk": mapping.get(vector_id)}
+            for orden, signo, nombre, vector_id, mapping in mejores
+        ])
+    return resultados
+
+
+def buscar_lexico_particionado(consulta, k, desde=None, hasta=None, filtros=None, directorio=PARTICIONES_DIR):
+    """
+    Top-k BM25 de 'consulta' en las particiones de [desde, hasta], con los
+    mismos filtros que buscar_particionado. Las estadísticas de BM25 son las
+    de todas esas particiones juntas (ver indice_lexico.buscar_bm25).
+    Retorna una lista de dicts con 'particion', 'id', 'score' y 'chunk'.
+    """
+    fuentes, mappings = [], {}
+    for nombre in particiones_en_rango(desde, hasta, directorio):
+        _, mapping, lexico = abrir_particion(nombre, directorio)
+        condiciones = _condiciones(nombre, mapping, desde, hasta, filtros)
+        fuentes.append((nombre, lexico, mapping, mapping.ids_filtrados(condiciones) if condiciones else None))
+        mappings[nombre] = mapping
+    return [
+        {"particion": nombre, "id": vector_id, "score": score, "chunk": mappings[nombre].get(vector_id)}
+        for score, nombre, vector_id in buscar_bm25(fuentes, consulta, k)
+    ]
+
+
+def embeddings_y_chunks_particionado(desde=None, hasta=None, directorio=PARTICIONES_DIR):
+    """Como embeddings_y_chunks, pero juntando todas las particiones del rango."""
+    embeddings, chunks = [], []
+    for nombre in particiones_en_rango(desde, hasta, directorio):
+        index, mapping, _ = abrir_particion(nombre, directorio)
+        emb, docs, _ = embeddings_y_chunks(index, mapping)
+        embeddings.append(emb)
+        chunks.extend(docs)
+    if not embeddings:
+        return None, []
+    return np.concatenate(embeddings), chunks
@@ -1,9 +1,12 @@
 import fetch_links
 import fetch_full_articles
+import triage_snippets
 import build_faiss
 import query_rag
+import registro_modelos
 import os
 import json
+import threading
 
 # Lista de RSS “Política” de medios argentinos
 RSS_FEEDS = [
@@ -18,6 +21,14 @@ RSS_FEEDS = [
 
 if __name__ == "__main__":
 
+    # 0. Precalentar los modelos en un hilo aparte mientras se bajan los feeds:
+    # todas las etapas comparten la misma instancia (registro_modelos)
+    precalentado = threading.Thread(
+        target=registro_modelos.precalentar,
+        kwargs={"embeddings": [triage_snippets.MODELO_TRIAGE], "motores": [build_faiss.EMBEDDING_MODEL_NAME]},
+    )
+    precalentado.start()
+
     # 1. Descargar los links de los RSS
     links = fetch_links.fetch_all_feeds(RSS_FEEDS)
     # Guardamos mínima info en JSON -> "links.json"
@@ -25,9 +36,17 @@ if __name__ == "__main__":
         json.dump(links, f, indent=2, ensure_ascii=False)
     print(f"✅ Guardé todo en links.json")
 
+    # 1.5. Triage con título + snippet: las notas fuera de tema o repetidas van al final
+    # (o no se bajan, con triage_snippets.MODO_TRIAGE = "saltear")
+    print("🔄 Filtrando entradas del RSS por título y snippet...")
+    precalentado.join()
+    links_a_bajar, descartados = triage_snippets.triage_entradas(links)
+    with open("links_descartados.json", "w", encoding="utf-8") as f:
+        json.dump(descartados, f, indent=2, ensure_ascii=False)
+
     # 2. Descargar los artículos completos
     print("🔄 Descargando artículos completos...")
-    fetch_full_articles.download_full_articles(links, "articulos_txt")    
+    fetch_full_articles.download_full_articles(links_a_bajar, "articulos_txt")    
 
     # 3. Construir el índice FAISS
     print("🔄 Construyendo índice FAISS...")
@@ -37,4 +56,6 @@ if __name__ == "__main__":
     print("🔄 Realizando consulta RAG...")
     query_rag.run_query("¿Qué es lo más relevante en la política Argentina hoy?")
 
+    registro_modelos.imprimir_reporte()
+
 
@@ -1,6 +1,7 @@
 import argparse
 import config
 import json
+import os
 import numpy as np
 import faiss
 
@@ -18,6 +19,9 @@ from visualizer import to_dataframe, interactive_scatter
 
 
 from utils import save_to_json
+from embedding_cache import encode_con_cache
+from embedding_engine import MotorEmbeddings
+from articulos_io import iterar_articulos
 
 
 # Se corre con "make news"
@@ -66,39 +70,108 @@ def run_summarization(args):
     print("✅ Chunks guardados correctamente.")
 
 
+# Cantidad de chunks que se encodean juntos y se agregan juntos al vector store
+BATCH_VECTORIZACION = 256
+
+
+def _iterar_chunks(path_chunked):
+    """Recorre (chunk_id, texto) de todos los artículos sin cargar el JSON entero."""
+    for article in iterar_articulos(path_chunked):
+        for chunk in article.get("chunks", []):
+            yield chunk["chunk_id"], chunk["texto"]
+
+
+def _iterar_lotes(iterable, tamano):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _vectorizar_lote(motor, lote, batch_size):
+    """
+    Encodea un lote entero en una sola llamada. Si falla, reintenta chunk por
+    chunk para que un chunk roto no se lleve puesto al resto del lote.
+    Retorna (ids, vectores) de los que salieron bien.
+    """
+    ids = [chunk_id for chunk_id, _ in lote]
+    textos = [texto for _, texto in lote]
+    try:
+        return ids, encode_con_cache(motor, textos, batch_size=batch_size)
+    except Exception as e:
+        print(f"⚠️ Falló el lote de {len(lote)} chunks ({e}); reintento de a uno...")
+    ids_ok, vectores_ok = [], []
+    for chunk_id, texto in lote:
+        try:
+            vectores_ok.append(encode_con_cache(motor, [texto])[0])
+            ids_ok.append(chunk_id)
+        except Exception as e:
+            print(f"❌ Error vectorizando chunk '{chunk_id}': {e}")
+    if not ids_ok:
+        return [], None
+    return ids_ok, np.stack(vectores_ok)
+
+
 # Se corre con "make summary_vectorization"
 def run_chunk_vectorization(args):
     """
     Vectoriza los chunks generados por ChunkAI y guarda los vectores y sus IDs.
+    Los chunks se leen en streaming y se procesan de a lotes: un encode y un
+    add al vector store por lote, y los vectores se escriben directo en
+    embeddings_chunks.npy (mapeado en memoria, preasignado).
     """
+    batch_size = getattr(args, "batch_size", None) or BATCH_VECTORIZACION
+    path_chunked = f"{config.OUTPUT_DIR}/articulos_completos_chunked.json"
+    path_npy = f"{config.OUTPUT_DIR}/embeddings_chunks.npy"
+
     embedder: Embedder = Embedder()
     dim: int = embedder.model.get_sentence_embedding_dimension()
     vector_store_manager: VectorStoreManager = VectorStoreManager(dim)
+    # Motor multi-proceso sobre el mismo modelo: batches por largo de tokens en todos los cores.
+    # Los procesos recargan el modelo por nombre: tiene que ser el mismo con que se armó el
+    # Embedder (si no lo expone, el motor encodea en este proceso)
+    motor = MotorEmbeddings(modelo=embedder.model, modelo_name=getattr(embedder, "model_name", None))
 
-    with open(f"{config.OUTPUT_DIR}/articulos_completos_chunked.json", "r", encoding="utf-8") as f:
-        articles = json.load(f)
+    # Primera pasada (liviana): contamos los chunks para preasignar el .npy
+    total = sum(1 for _ in _iterar_chunks(path_chunked))
+    print(f"🔢 Vectorizando {total} chunks en lotes de {batch_size}...")
+    embeddings = np.lib.format.open_memmap(path_npy, mode="w+", dtype=np.float32, shape=(total, dim))
 
-    all_vectors = []
     all_ids = []
-
-    for article in articles:
-        for chunk in article.get("chunks", []):
-            chunk_id = chunk["chunk_id"]
-            texto = chunk["texto"]
-            try:
-                vector = embedder.get_embedding(texto)
-                vector_store_manager.add(np.expand_dims(vector, axis=0), [chunk_id])
-                all_vectors.append(vector)
-                all_ids.append(chunk_id)
-            except Exception as e:
-                print(f"❌ Error vectorizando chunk '{chunk_id}': {e}")
-
-    # Guardar vectores, IDs, índice
+    fila = 0
+    for lote in _iterar_lotes(_iterar_chunks(path_chunked), batch_size):
+        ids, vectores = _vectorizar_lote(motor, lote, batch_size)
+        if not ids:
+            continue
+        vector_store_manager.add(vectores, ids)
+        embeddings[fila:fila + len(ids)] = vectores
+        fila += len(ids)
+        all_ids.extend(ids)
+    motor.cerrar()
+    embeddings.flush()
+    del embeddings
+
+    # Si hubo chunks con error sobran filas al final: compactamos el .npy
+    if fila < total:
+        completo = np.load(path_npy, mmap_mode="r")
+        tmp_npy = f"{path_npy}.tmp.npy"
+        compacto = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype=np.float32, shape=(fila, dim))
+        for i in range(0, fila, batch_size):
+            fin = min(i + batch_size, fila)
+            compacto[i:fin] = completo[i:fin]
+        compacto.flush()
+        del compacto, completo
+        os.replace(tmp_npy, path_npy)
+
+    # Guardar IDs e índice
     vector_store_manager.save(f"{config.OUTPUT_DIR}/vector_store_chunks.index")
-    np.save(f"{config.OUTPUT_DIR}/embeddings_chunks.npy", np.stack(all_vectors))
     with open(f"{config.OUTPUT_DIR}/ids_chunks.json", "w") as f:
         json.dump(all_ids, f)
-    print("✅ Vectorización de chunks completada.")
+    print(f"✅ Vectorización de chunks completada ({fila}/{total} chunks).")
 
 def run_clusterization(args):
     """
@@ -211,6 +284,8 @@ if __name__ == "__main__":
     sub_vectorization = sub.add_parser(
         "summary_vectorization", help="vectoriza los resúmenes de noticias"
     )
+    sub_vectorization.add_argument("--batch-size", type=int, default=BATCH_VECTORIZACION,
+                                   help="chunks por lote de vectorización")
     sub_vectorization.set_defaults(func=run_chunk_vectorization)
 
     # Caso Clusterization: corremos solo la clusterización de resúmenes
@@ -229,6 +304,8 @@ if __name__ == "__main__":
 
     # Caso chunk_vectorization
     sub_chunk_vec = sub.add_parser("chunk_vectorization", help="vectoriza los chunks de noticias")
+    sub_chunk_vec.add_argument("--batch-size", type=int, default=BATCH_VECTORIZACION,
+                               help="chunks por lote de vectorización")
     sub_chunk_vec.set_defaults(func=run_chunk_vectorization)
 
     # Caso chunk_clusterization
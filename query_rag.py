@@ -6,12 +6,25 @@
 
 import os
 import pickle
-import faiss
-from sentence_transformers import SentenceTransformer
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from almacen_chunks import AlmacenChunks
+from cache_consultas import obtener_cache_consultas
+from fabrica_indices import buscar_filtrado, leer_indice_mmap
+from registro_modelos import obtener_modelo, obtener_reranker
+from reranker import CANDIDATOS_RERANK, PRESUPUESTO_RERANK_MS
+from embedding_cache import encode_con_cache
+from indice_incremental import INDICES_DIR, cargar_version, parsear_fecha, version_actual
+from indice_lexico import abrir_lexico, buscar_bm25, fusionar_rrf
+from indice_particionado import (PARTICIONES_DIR, buscar_lexico_particionado, buscar_particionado, particiones_en_rango,
+                                 versiones_en_rango)
 
 # Nombres de los archivos que generamos en el paso anterior
 FAISS_INDEX_FILE = "noticias_politica.index"
-MAPPING_PICKLE_FILE = "mapping_id2chunk.pkl"
+MAPPING_DIR = "mapping_chunks"
+MAPPING_PICKLE_FILE = "mapping_id2chunk.pkl"  # formato viejo, si no hay MAPPING_DIR
 
 # Cantidad de vecinos a recuperar (podés ajustar según tus pruebas)
 TOP_K = 10
@@ -19,25 +32,43 @@ TOP_K = 10
 # Modelo de embeddings (mismo que usamos para construir el índice)
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
+# Modo de búsqueda: "densa" (sólo FAISS) o "hibrida" (FAISS + BM25 en paralelo,
+# fusionados con Reciprocal Rank Fusion; ver indice_lexico.py). Si el índice
+# no tiene índice léxico se usa la densa.
+MODO_BUSQUEDA = "hibrida"
+CANDIDATOS_HIBRIDA = 50   # candidatos que aporta cada búsqueda antes de fusionar
+
+# Segunda etapa opcional: reordenar con un cross-encoder (ver reranker.py) los
+# CANDIDATOS_RERANK primeros, sin pasarse de PRESUPUESTO_RERANK_MS por consulta
+RERANK = False
+
+# Cache en memoria de embeddings de preguntas y de resultados (ver cache_consultas.py)
+USAR_CACHE_CONSULTAS = True
+
 # -----------------------------------
 # 2. Funciones de carga: índice + mapping
 # -----------------------------------
 
 def cargar_indice(index_path):
     """
-    Lee el índice FAISS desde disco.
+    Lee el índice FAISS desde disco (con mmap si el tipo de índice lo permite).
     """
     if not os.path.isfile(index_path):
         raise FileNotFoundError(f"No existe el índice en: {index_path}")
     print(f"🔍 Cargando índice FAISS desde '{index_path}'...")
-    index = faiss.read_index(index_path)
+    index = leer_indice_mmap(index_path)
     return index
 
 def cargar_mapping(mapping_path):
     """
-    Carga la lista de documentos (mapping) desde el pickle.
+    Abre el mapping de chunks. Si 'mapping_path' es la carpeta del almacén
+    columnar se abre con mmap (no lee los textos hasta que se piden); si es
+    un archivo se carga el pickle del formato viejo.
     Cada elemento es un dict con 'doc_id', 'chunk_id' y 'texto'.
     """
+    if os.path.isdir(mapping_path):
+        print(f"🔍 Abriendo almacén de chunks en '{mapping_path}'...")
+        return AlmacenChunks(mapping_path)
     if not os.path.isfile(mapping_path):
         raise FileNotFoundError(f"No existe el mapping en: {mapping_path}")
     print(f"🔍 Cargando mapping (lista de chunks) desde '{mapping_path}'...")
@@ -49,63 +80,370 @@ def cargar_mapping(mapping_path):
 # 3. Función para hacer query en FAISS
 # -----------------------------------
 
-def buscar_chunks_faiss(index, documents, modelo, pregunta, top_k=TOP_K):
+def _resultado(doc, distancia, score=None):
+    return {
+        "chunk_id": doc["chunk_id"],
+        "doc_id": doc["doc_id"],
+        "texto": doc["texto"],
+        "medio": doc.get("medio"),
+        "seccion": doc.get("seccion"),
+        "fecha": doc.get("fecha"),
+        "distancia": float(distancia) if distancia is not None else None,
+        "score": score,
+        "score_rerank": None
+    }
+
+
+def _busqueda_densa(index, documents, embeddings, top_k, ids_permitidos=None):
+    """
+    Busca en FAISS las consultas ya vectorizadas ('embeddings', una fila por
+    consulta) en una sola llamada. Retorna, por consulta, [(id, doc, distancia)].
+    """
+    # index.search recibe (array_de_queries, k) y devuelve (distancias, índices).
+    # Con filtros, el filtro va dentro de la búsqueda (no se pide de más y se descarta)
+    if ids_permitidos is not None:
+        distancias, indices = buscar_filtrado(index, embeddings, top_k, ids_permitidos)
+    else:
+        distancias, indices = index.search(embeddings, top_k)
+
+    por_consulta = []
+    for fila_distancias, fila_indices in zip(distancias, indices):
+        resultados = []
+        for distancia, idx in zip(fila_distancias, fila_indices):
+            # Si idx = -1 puede significar que no hay más vectores; pero con IndexFlatL2
+            # normalmente no pasa si top_k < total de vectores
+            if idx < 0:
+                continue
+            if not isinstance(documents, list):
+                # Mapping por id (almacén de chunks o dict): 'idx' es el id del vector
+                doc = documents.get(int(idx))
+                if doc is None:
+                    continue
+            elif idx < len(documents):
+                doc = documents[idx]
+            else:
+                continue
+            resultados.append((int(idx), doc, float(distancia)))
+        por_consulta.append(resultados)
+    return por_consulta
+
+
+def fusionar_resultados(densos, lexicos, top_k):
+    """
+    Junta los candidatos de la búsqueda densa ((clave, doc, distancia)) y de
+    la léxica ((clave, doc)) con Reciprocal Rank Fusion y arma los top_k resultados.
+    """
+    docs = {clave: doc for clave, doc in lexicos}
+    docs.update((clave, doc) for clave, doc, _ in densos)
+    distancia_de = {clave: distancia for clave, _, distancia in densos}
+    fusion = fusionar_rrf([[clave for clave, _, _ in densos], [clave for clave, _ in lexicos]], top_k)
+    return [_resultado(docs[clave], distancia_de.get(clave), score) for clave, score in fusion]
+
+
+def buscar_chunks_faiss(index, documents, modelo, pregunta, top_k=TOP_K, filtros=None, lexico=None):
     """
     1. Genera el embedding de la 'pregunta'.
-    2. Busca los top_k vecinos más cercanos en 'index'.
+    2. Busca los top_k vecinos más cercanos en 'index' (si hay 'filtros', sólo
+       entre los chunks que los cumplen; ver AlmacenChunks.ids_filtrados).
+       Si se pasa 'lexico' (el IndiceLexico de la versión) la búsqueda es
+       híbrida: FAISS y BM25 corren en paralelo (CANDIDATOS_HIBRIDA cada uno)
+       y se fusionan con Reciprocal Rank Fusion.
     3. Devuelve una lista de dicts con:
        - 'chunk_id'
        - 'doc_id'
        - 'texto' (párrafo completo)
-       - 'distancia' (valor retornado por FAISS)
+       - 'medio', 'seccion', 'fecha' (metadatos del artículo, si los tiene)
+       - 'distancia' (valor retornado por FAISS; None si sólo lo encontró BM25)
+       - 'score' (score de la fusión, en modo híbrido)
+    """
+    print(f"\n🔎 Vectorizando la consulta: \"{pregunta}\"")
+    vectorizar = lambda: encode_con_cache(modelo, [pregunta], EMBEDDING_MODEL_NAME)  # shape (1, dim)
+    return _buscar_faiss_lote(index, documents, [pregunta], vectorizar, top_k, filtros, lexico)[0]
+
+
+def buscar_chunks_faiss_lote(index, documents, modelo, preguntas, top_k=TOP_K, filtros=None, lexico=None):
+    """
+    buscar_chunks_faiss para una lista de preguntas: se vectorizan todas en
+    un solo encode y se buscan en una sola llamada a FAISS. Retorna una lista
+    de resultados (los mismos dicts) por pregunta, en el mismo orden.
+    """
+    vectorizar = lambda: encode_con_cache(modelo, list(preguntas), EMBEDDING_MODEL_NAME)
+    return _buscar_faiss_lote(index, documents, preguntas, vectorizar, top_k, filtros, lexico)
+
+
+def _buscar_faiss_lote(index, documents, preguntas, vectorizar, top_k, filtros=None, lexico=None):
+    """
+    buscar_chunks_faiss para varias preguntas a la vez: 'vectorizar()' devuelve
+    sus embeddings (una fila por pregunta) y FAISS las busca en una sola
+    llamada. Retorna una lista de resultados por pregunta.
+    """
+    ids_permitidos = None
+    if filtros:
+        if not hasattr(documents, "ids_filtrados"):
+            raise ValueError("El mapping en formato pickle no tiene metadatos: rearmá el índice para poder filtrar.")
+        ids_permitidos = documents.ids_filtrados(filtros)
+
+    if lexico is None:
+        densos = _busqueda_densa(index, documents, vectorizar(), top_k, ids_permitidos)
+        return [[_resultado(doc, distancia) for _, doc, distancia in d] for d in densos]
+
+    # La densa (encode + FAISS) va en otro hilo mientras acá corre BM25
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        densa = pool.submit(lambda: _busqueda_densa(index, documents, vectorizar(), CANDIDATOS_HIBRIDA, ids_permitidos))
+        lexicos = [
+            [(i, documents.get(i)) for _, _, i in
+             buscar_bm25([(None, lexico, documents, ids_permitidos)], pregunta, CANDIDATOS_HIBRIDA)]
+            for pregunta in preguntas
+        ]
+        densos = densa.result()
+    return [fusionar_resultados(d, l, top_k) for d, l in zip(densos, lexicos)]
+
+def _a_timestamp(fecha):
+    """None, timestamp o fecha en texto (ISO / RFC 2822) -> timestamp."""
+    if fecha is None or isinstance(fecha, (int, float)):
+        return fecha
+    ts = parsear_fecha(fecha)
+    if ts is None:
+        raise ValueError(f"No se entiende la fecha: {fecha!r}")
+    return ts
+
+
+def armar_filtros(medio=None, seccion=None, desde=None, hasta=None):
+    """
+    Filtros por metadatos para buscar_chunks_faiss: 'medio' y 'seccion' pueden
+    ser un valor o una lista ("clarin.com", ["economia", "el-pais"]), y
+    'desde' / 'hasta' timestamps. Devuelve None si no hay ningún filtro.
+    """
+    filtros = {}
+    if medio:
+        filtros["medio"] = medio
+    if seccion:
+        filtros["seccion"] = seccion
+    if desde is not None or hasta is not None:
+        filtros["fecha"] = (desde, hasta)
+    return filtros or None
+
+
+def buscar_chunks_particionado(modelo, pregunta, top_k=TOP_K, desde=None, hasta=None, filtros=None,
+                               hibrida=False):
+    """
+    Igual que buscar_chunks_faiss pero sobre el índice partido por fecha:
+    sólo busca en las particiones entre 'desde' y 'hasta' (None = sin límite).
+    Con hibrida=True suma BM25 sobre las mismas particiones y fusiona con RRF.
     """
-    # 3.1. Vectorizar la pregunta
     print(f"\n🔎 Vectorizando la consulta: \"{pregunta}\"")
-    embedding_query = modelo.encode([pregunta])  # devuelve shape (1, dim)
-
-    # 3.2. Realizar la búsqueda en FAISS
-    # index.search recibe (array_de_queries, k) y devuelve (distancias, índices)
-    distancias, indices = index.search(embedding_query, top_k)
-    distancias = distancias[0]  # porque solo pasamos 1 consulta
-    indices = indices[0]
-
-    resultados = []
-    for i, idx in enumerate(indices):
-        # Si idx = -1 puede significar que no hay más vectores; pero con IndexFlatL2 
-        # normalmente no pasa si top_k < total de vectores
-        if idx < 0 or idx >= len(documents):
-            continue
-        doc = documents[idx]
-        resultados.append({
-            "chunk_id": doc["chunk_id"],
-            "doc_id": doc["doc_id"],
-            "texto": doc["texto"],
-            "distancia": float(distancias[i])
-        })
-
-    return resultados
+    vectorizar = lambda: encode_con_cache(modelo, [pregunta], EMBEDDING_MODEL_NAME)
+    return _buscar_particionado_lote([pregunta], vectorizar, top_k, desde, hasta, filtros, hibrida)[0]
+
+
+def _buscar_particionado_lote(preguntas, vectorizar, top_k, desde=None, hasta=None, filtros=None, hibrida=False):
+    """Como _buscar_faiss_lote, sobre el índice particionado."""
+
+    def densa(k):
+        encontrados = buscar_particionado(vectorizar(), k, desde=desde, hasta=hasta, filtros=filtros)
+        return [[((r["particion"], r["id"]), r["chunk"], r["distancia"]) for r in fila if r["chunk"] is not None]
+                for fila in encontrados]
+
+    if not hibrida:
+        return [[_resultado(doc, distancia) for _, doc, distancia in d] for d in densa(top_k)]
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futura = pool.submit(densa, CANDIDATOS_HIBRIDA)
+        lexicos = [
+            [((r["particion"], r["id"]), r["chunk"]) for r in
+             buscar_lexico_particionado(pregunta, CANDIDATOS_HIBRIDA, desde, hasta, filtros)
+             if r["chunk"] is not None]
+            for pregunta in preguntas
+        ]
+        densos = futura.result()
+    return [fusionar_resultados(d, l, top_k) for d, l in zip(densos, lexicos)]
+
+
+def cargar_fuente():
+    """
+    Abre el índice contra el que se consulta: el particionado por fecha si
+    existe; si no la versión publicada del incremental o los archivos del
+    build completo. Retorna un dict con 'tipo', 'index', 'documents',
+    'lexico' y 'version' (ver fuente_desactualizada).
+    """
+    if os.path.isdir(PARTICIONES_DIR):
+        # Cada partición se abre (y se vuelve a abrir si cambia) al buscar
+        print(f"🗓️ Usando el índice particionado en '{PARTICIONES_DIR}'")
+        return {"tipo": "particionado", "index": None, "documents": None, "lexico": None, "version": None}
+    publicado = cargar_version(INDICES_DIR, mmap=True)
+    if publicado is not None:
+        index, documents, _, puntero = publicado
+        print(f"🔍 Usando el índice publicado en '{INDICES_DIR}' (versión {puntero['version']}, "
+              f"{index.ntotal} vectores)")
+        lexico = abrir_lexico(INDICES_DIR, os.path.join(INDICES_DIR, puntero["carpeta"]))
+        fuente = {"tipo": "publicado", "index": index, "documents": documents, "lexico": lexico,
+                  "version": puntero["version"]}
+    else:
+        index = cargar_indice(FAISS_INDEX_FILE)
+        documents = cargar_mapping(MAPPING_DIR if os.path.isdir(MAPPING_DIR) else MAPPING_PICKLE_FILE)
+        lexico = abrir_lexico(MAPPING_DIR, MAPPING_DIR) if os.path.isdir(MAPPING_DIR) else None
+        fuente = {"tipo": "completo", "index": index, "documents": documents, "lexico": lexico,
+                  "version": os.path.getmtime(FAISS_INDEX_FILE)}
+    if MODO_BUSQUEDA == "hibrida" and lexico is None:
+        print("⚠️ El índice no tiene índice léxico (BM25): uso sólo la búsqueda densa.")
+    return fuente
+
+
+def fuente_desactualizada(fuente):
+    """True si desde que se abrió 'fuente' se publicó otro índice (hay que volver a cargarla)."""
+    if fuente["tipo"] == "particionado":
+        return not os.path.isdir(PARTICIONES_DIR)
+    if os.path.isdir(PARTICIONES_DIR):
+        return True
+    puntero = version_actual(INDICES_DIR)
+    if fuente["tipo"] == "publicado":
+        return puntero is None or puntero["version"] != fuente["version"]
+    return puntero is not None or os.path.getmtime(FAISS_INDEX_FILE) != fuente["version"]
+
+
+def version_indice(fuente=None, desde=None, hasta=None):
+    """
+    Qué versión del índice responde una búsqueda en [desde, hasta]: la de
+    'fuente' o, si no se pasa, la publicada en disco (sin abrir nada). Con el
+    particionado son las versiones de las particiones del rango. Es parte de
+    la clave del cache de resultados.
+    """
+    if fuente is not None and fuente["tipo"] != "particionado":
+        return fuente["version"]
+    if os.path.isdir(PARTICIONES_DIR):
+        return versiones_en_rango(desde, hasta)
+    puntero = version_actual(INDICES_DIR)
+    if puntero is not None:
+        return puntero["version"]
+    return os.path.getmtime(FAISS_INDEX_FILE)
+
+
+def buscar_en_fuente(fuente, preguntas, vectorizar, top_k=TOP_K, desde=None, hasta=None, medio=None, seccion=None,
+                     hibrida=None):
+    """
+    Busca varias preguntas en la 'fuente' de cargar_fuente con los mismos
+    filtros. 'vectorizar()' devuelve sus embeddings (una fila por pregunta):
+    hay un solo encode y una sola búsqueda en FAISS para todas.
+    Retorna una lista de resultados (ver buscar_chunks_faiss) por pregunta.
+    """
+    hibrida = MODO_BUSQUEDA == "hibrida" if hibrida is None else hibrida
+    if fuente["tipo"] == "particionado":
+        return _buscar_particionado_lote(preguntas, vectorizar, top_k, desde, hasta,
+                                         armar_filtros(medio, seccion), hibrida)
+    return _buscar_faiss_lote(fuente["index"], fuente["documents"], preguntas, vectorizar, top_k,
+                              armar_filtros(medio, seccion, desde, hasta),
+                              fuente["lexico"] if hibrida else None)
+
+@dataclass
+class ResultadoConsulta:
+    """Lo que devuelve consultar_lote para cada pregunta."""
+    pregunta: str
+    resultados: list = field(default_factory=list)  # dicts de buscar_chunks_faiss, de mejor a peor
+    version: object = None    # versión del índice contra la que se buscó (ver version_indice)
+    segundos: float = 0.0     # lo que tardó el lote entero (encode + búsqueda + rerank)
+
+
+def consultar_lote(preguntas, top_k=TOP_K, desde=None, hasta=None, medio=None, seccion=None, rerank=None,
+                   fuente=None, modelo=None, usar_cache=None):
+    """
+    Busca una lista de preguntas (por ej. las consultas fijas del clipping
+    diario) con los mismos filtros que run_query, sin imprimir nada: un solo
+    encode para todas y una sola búsqueda en FAISS. 'fuente' (cargar_fuente)
+    y 'modelo' se cargan si no se pasan; conviene pasarlos si se llama seguido.
+    Con el cache (USAR_CACHE_CONSULTAS) las preguntas que ya se hicieron contra
+    la misma versión del índice no se vuelven a buscar, y si están todas no
+    se abre el índice.
+    Retorna un ResultadoConsulta por pregunta, en el mismo orden.
+    """
+    inicio = time.perf_counter()
+    preguntas = list(preguntas)
+    if not preguntas:
+        return []
+    desde, hasta = _a_timestamp(desde), _a_timestamp(hasta)
+    modelo = modelo or obtener_modelo(EMBEDDING_MODEL_NAME)
+    rerank = RERANK if rerank is None else rerank
+    cache = obtener_cache_consultas() if (USAR_CACHE_CONSULTAS if usar_cache is None else usar_cache) else None
+
+    por_pregunta = [None] * len(preguntas)
+    pendientes = list(range(len(preguntas)))
+    version = None
+    if cache is not None:
+        embeddings = cache.vectorizar(modelo, preguntas, EMBEDDING_MODEL_NAME)
+        vectorizar = lambda: embeddings[pendientes]
+        version = version_indice(fuente, desde, hasta)
+        filtros = (desde, hasta, medio, seccion, rerank)
+        for i in pendientes:
+            guardados = cache.buscar_resultados(cache.clave_resultados(embeddings[i], top_k, filtros, version))
+            if guardados is not None:
+                por_pregunta[i] = [dict(r) for r in guardados]
+        pendientes = [i for i in pendientes if por_pregunta[i] is None]
+    else:
+        vectorizar = lambda: encode_con_cache(modelo, preguntas, EMBEDDING_MODEL_NAME)
+
+    if pendientes:
+        if fuente is None:
+            fuente = cargar_fuente()
+            version = version_indice(fuente, desde, hasta)
+        candidatos = max(CANDIDATOS_RERANK, top_k) if rerank else top_k
+        nuevos = buscar_en_fuente(fuente, [preguntas[i] for i in pendientes], vectorizar, candidatos,
+                                  desde, hasta, medio, seccion)
+        if rerank:
+            reranker = obtener_reranker()
+            nuevos = [reranker.reordenar(preguntas[i], resultados, top_k)
+                      for i, resultados in zip(pendientes, nuevos)]
+        for i, resultados in zip(pendientes, nuevos):
+            por_pregunta[i] = resultados
+            if cache is not None:
+                cache.guardar_resultados(cache.clave_resultados(embeddings[i], top_k, filtros, version),
+                                         [dict(r) for r in resultados])
+        if version is None:
+            version = version_indice(fuente, desde, hasta)
+
+    segundos = time.perf_counter() - inicio
+    return [ResultadoConsulta(pregunta, resultados, version, segundos)
+            for pregunta, resultados in zip(preguntas, por_pregunta)]
+
+
+def imprimir_resultados(consulta):
+    """Muestra en pantalla un ResultadoConsulta."""
+    print(f"\n🏅 Top {len(consulta.resultados)} chunks más cercanos a: \"{consulta.pregunta}\"\n")
+    for i, res in enumerate(consulta.resultados, start=1):
+        print(f"{i}. [doc_id: {res['doc_id']}, chunk_id: {res['chunk_id']}, medio: {res['medio']}, "
+              f"sección: {res['seccion']} ]")
+        if res["distancia"] is not None:
+            print(f"   Distancia: {res['distancia']:.4f}")
+        if res["score"] is not None:
+            print(f"   Score (RRF): {res['score']:.4f}")
+        if res["score_rerank"] is not None:
+            print(f"   Score (cross-encoder): {res['score_rerank']:.4f}")
+        print(f"   Texto: {res['texto'][:200]}...")  # muestro los primeros 200 caracteres
+        print()
 
 # -----------------------------------
 # 4. Bloque principal para prueba
 # -----------------------------------
 
-def run_query(query: str):
+def run_query(query: str, desde=None, hasta=None, medio=None, seccion=None, rerank=None):
     """
     Función principal para realizar una consulta RAG (Retrieval-Augmented Generation).
     Carga el índice FAISS, el mapping de chunks y permite buscar los párrafos más relevantes
-    según una pregunta dada.
+    según una pregunta dada. 'desde' / 'hasta' (timestamp o fecha en texto) acotan
+    la búsqueda a esas fechas (con el índice particionado, sólo se abren esas
+    particiones); 'medio' / 'seccion' la acotan a un medio ("clarin.com") o sección.
+    Con rerank=True (o RERANK) los resultados pasan por el cross-encoder.
+    Para muchas preguntas juntas y sin imprimir, ver consultar_lote.
     """
     print("\n🚀 Iniciando consulta RAG...")
+    desde, hasta = _a_timestamp(desde), _a_timestamp(hasta)
 
-    # 4.1. Cargar índice FAISS
-    index = cargar_indice(FAISS_INDEX_FILE)
-
-    # 4.2. Cargar mapping (lista de chunks)
-    documents = cargar_mapping(MAPPING_PICKLE_FILE)
+    # 4.1. El índice FAISS + mapping (particionado, publicado o build completo)
+    # lo abre consultar_lote, y sólo si la respuesta no está en el cache
+    if os.path.isdir(PARTICIONES_DIR):
+        print(f"🗓️ {len(particiones_en_rango(desde, hasta))} particiones en el rango")
 
-    # 4.3. Cargar modelo de embeddings (mismo que en build)
+    # 4.3. Cargar modelo de embeddings (mismo modelo y backend que en build)
     print("🔄 Cargando modelo de embeddings para query...")
-    modelo = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    modelo = obtener_modelo(EMBEDDING_MODEL_NAME)
 
     # 4.4. Pedirle al usuario una pregunta (o definirla fijo para la prueba)
     # Podés descomentar la línea con input() si querés un prompt interactivo:
@@ -114,16 +452,22 @@ def run_query(query: str):
     if (query==None or query==""):
         query = "¿Qué es lo más relevante en la política Argentina hoy?"
     
-    # 4.5. Buscar los chunks más relevantes
-    resultados = buscar_chunks_faiss(index, documents, modelo, query, top_k=TOP_K)
+    # 4.5. Buscar los chunks más relevantes (con rerank se traen más candidatos
+    # y se reordenan con el cross-encoder dentro del presupuesto de tiempo)
+    print(f"\n🔎 Vectorizando la consulta: \"{query}\"")
+    rerank = RERANK if rerank is None else rerank
+    if rerank:
+        print(f"🎯 Reordenando con el cross-encoder (presupuesto {PRESUPUESTO_RERANK_MS} ms)...")
+    consulta = consultar_lote([query], TOP_K, desde, hasta, medio, seccion, rerank, modelo=modelo)[0]
 
     # 4.6. Mostrar en pantalla los resultados encontrados
-    print(f"\n🏅 Top {TOP_K} chunks más cercanos a la consulta:\n")
-    for i, res in enumerate(resultados, start=1):
-        print(f"{i}. [doc_id: {res['doc_id']}, chunk_id: {res['chunk_id']} ]")
-        print(f"   Distancia: {res['distancia']:.4f}")
-        print(f"   Texto: {res['texto'][:200]}...")  # muestro los primeros 200 caracteres
-        print()
+    imprimir_resultados(consulta)
+    if USAR_CACHE_CONSULTAS:
+        niveles = obtener_cache_consultas().estadisticas()
+        print(f"💾 Cache de consultas: embeddings {niveles['embeddings']['aciertos']} aciertos / "
+              f"{niveles['embeddings']['fallos']} fallos, resultados {niveles['resultados']['aciertos']} / "
+              f"{niveles['resultados']['fallos']}")
+    return consulta
 
 
 if __name__ == "__main__":
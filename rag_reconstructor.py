@@ -2,9 +2,11 @@ import json
 import pickle
 import csv
 from collections import defaultdict
-from transformers import pipeline
 from tqdm import tqdm
 
+from articulos_io import iterar_articulos
+from registro_modelos import obtener_pipeline
+
 
 class RAGReconstructor:
     def __init__(self, json_articulos, clustering_pkl):
@@ -17,13 +19,12 @@ class RAGReconstructor:
 
     def cargar_datos(self):
         print("📥 Cargando artículos originales y resultados de clustering...")
-        with open(self.json_articulos, "r", encoding="utf-8") as f:
-            articulos = json.load(f)
         with open(self.clustering_pkl, "rb") as f:
             clustering = pickle.load(f)
 
         self.texto_por_id = {}
-        for articulo in articulos:
+        # Recorremos los artículos de a uno, sin cargar todo el JSON en memoria
+        for articulo in iterar_articulos(self.json_articulos):
             for chunk in articulo.get("chunks", []):
                 chunk_id = chunk["chunk_id"]
                 texto = chunk.get("texto", "")
@@ -39,7 +40,7 @@ class RAGReconstructor:
 class ImportanciaClassifier:
     def __init__(self):
         print("🧠 Cargando modelo de clasificación de importancia...")
-        self.modelo = pipeline("text-classification", model="cross-encoder/nli-deberta-v3-base")
+        self.modelo = obtener_pipeline("text-classification", "cross-encoder/nli-deberta-v3-base")
 
     def clasificar(self, texto: str):
         try:
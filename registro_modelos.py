@@ -0,0 +1,137 @@
+# registro_modelos.py
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+
+from backend_onnx import BACKEND_EMBEDDINGS, cargar_modelo
+
+# Registro de modelos compartido por todo el proceso. Cada modelo se carga la
+# primera vez que alguien lo pide y queda una sola instancia por
+# (modelo, backend), así las etapas que corren juntas (main.py) no vuelven a
+# deserializar lo mismo. Para cada carga se anota cuánto tardó y cuánta
+# memoria residente sumó.
+
+_modelos = {}        # (nombre, backend) -> instancia
+_estadisticas = {}   # (nombre, backend) -> {"segundos": ..., "rss_mb": ...}
+_locks = {}          # (nombre, backend) -> lock de esa carga
+_lock = threading.Lock()
+
+
+def memoria_residente_mb():
+    """Memoria residente (RSS) actual del proceso, en MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        # Fuera de Linux: usamos el pico de memoria (en macOS viene en bytes)
+        import resource
+        import sys
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo / 2**20 if sys.platform == "darwin" else maximo / 2**10
+
+
+def _obtener(clave, cargador):
+    """Devuelve la instancia de 'clave'; si no existe la carga con cargador()."""
+    if clave in _modelos:
+        return _modelos[clave]
+    with _lock:
+        lock_clave = _locks.setdefault(clave, threading.Lock())
+    # Un lock por modelo: dos hilos que piden el mismo modelo esperan a una
+    # sola carga, pero cargar uno no bloquea a los demás
+    with lock_clave:
+        if clave not in _modelos:
+            nombre, backend = clave
+            print(f"🔄 Cargando '{nombre}' ({backend})...")
+            rss_antes = memoria_residente_mb()
+            inicio = time.perf_counter()
+            _modelos[clave] = cargador()
+            _estadisticas[clave] = {
+                "segundos": round(time.perf_counter() - inicio, 2),
+                "rss_mb": round(memoria_residente_mb() - rss_antes, 1),
+            }
+        return _modelos[clave]
+
+
+def obtener_modelo(nombre, backend=None):
+    """SentenceTransformer 'nombre' con el backend pedido ("torch" u "onnx")."""
+    backend = backend or BACKEND_EMBEDDINGS
+    return _obtener((nombre, backend), lambda: cargar_modelo(nombre, backend))
+
+
+def obtener_motor(nombre, backend=None):
+    """MotorEmbeddings multi-proceso sobre el modelo compartido de obtener_modelo."""
+    from embedding_engine import MotorEmbeddings
+
+    backend = backend or BACKEND_EMBEDDINGS
+    return _obtener(
+        (nombre, f"motor-{backend}"),
+        lambda: MotorEmbeddings(nombre, modelo=obtener_modelo(nombre, backend), backend=backend),
+    )
+
+
+def obtener_pipeline(tarea, modelo):
+    """Pipeline de transformers (por ejemplo "text-classification")."""
+    from transformers import pipeline
+
+    return _obtener((modelo, f"pipeline-{tarea}"), lambda: pipeline(tarea, model=modelo))
+
+
+def obtener_reranker(modelo=None):
+    """Reranker (cross-encoder) de reranker.py, con su cache de scores compartido."""
+    from reranker import MODELO_RERANK, Reranker
+
+    modelo = modelo or MODELO_RERANK
+    return _obtener((modelo, "reranker"), lambda: Reranker(modelo))
+
+
+def obtener_cliente_openai(api_key=None):
+    """
+    Cliente de OpenAI, uno por api_key (si no se pasa usa la variable
+    OPENAI_API_KEY). En la clave del registro va un hash, no la key.
+    """
+    from openai import OpenAI
+
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    huella = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else None
+    return _obtener(("openai", huella), lambda: OpenAI(api_key=api_key))
+
+
+def precalentar(embeddings=(), motores=(), pipelines=(), backend=None):
+    """
+    Carga por adelantado los modelos indicados:
+      - embeddings: nombres de SentenceTransformer
+      - motores: nombres de modelos para MotorEmbeddings
+      - pipelines: pares (tarea, modelo) de transformers
+    """
+    for nombre in embeddings:
+        obtener_modelo(nombre, backend)
+    for nombre in motores:
+        obtener_motor(nombre, backend)
+    for tarea, modelo in pipelines:
+        obtener_pipeline(tarea, modelo)
+
+
+def reporte():
+    """Lista de dicts con nombre, backend, segundos de carga y MB residentes de cada modelo."""
+    return [
+        {"nombre": nombre, "backend": backend, **stats}
+        for (nombre, backend), stats in _estadisticas.items()
+    ]
+
+
+def imprimir_reporte():
+    print("📊 Modelos cargados en este proceso:")
+    for fila in reporte():
+        print(f"   • {fila['nombre']} ({fila['backend']}): {fila['segundos']} s, +{fila['rss_mb']} MB")
+    print(f"   • Memoria residente total: {memoria_residente_mb():.1f} MB")
+
+
+@atexit.register
+def _cerrar_motores():
+    for modelo in _modelos.values():
+        if hasattr(modelo, "cerrar"):
+            modelo.cerrar()
@@ -0,0 +1,111 @@
+# reranker.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Segunda etapa de query_rag: se traen más candidatos de los que se muestran
+# (CANDIDATOS_RERANK) y un cross-encoder puntúa cada par (pregunta, chunk)
+# leyendo los dos textos juntos, que ordena mucho mejor que la distancia
+# entre embeddings. Como es caro, tiene un presupuesto de tiempo por consulta:
+# se puntúa de a batches en el orden de la primera etapa y se corta cuando el
+# próximo batch ya no entra. Los scores quedan en un cache LRU, así las
+# preguntas repetidas no vuelven a pasar por el modelo.
+MODELO_RERANK = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # multilingüe (entiende español)
+CANDIDATOS_RERANK = 50       # candidatos que se piden a la primera etapa
+BATCH_RERANK = 16            # pares por llamada al modelo
+PRESUPUESTO_RERANK_MS = 300  # tiempo máximo de reranking por consulta
+TAMANO_CACHE_RERANK = 20_000
+
+
+def _clave_texto(texto):
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+class Reranker:
+    """
+    Cross-encoder de transformers (pipeline "text-classification" con pares
+    de textos) con presupuesto de tiempo y cache de scores. Conviene pedirlo
+    con registro_modelos.obtener_reranker() para compartir modelo y cache.
+    """
+    def __init__(self, modelo=MODELO_RERANK, batch_size=BATCH_RERANK, tamano_cache=TAMANO_CACHE_RERANK):
+        from registro_modelos import obtener_pipeline
+
+        self.nombre = modelo
+        self.pipeline = obtener_pipeline("text-classification", modelo)
+        self.batch_size = batch_size
+        self.tamano_cache = tamano_cache
+        self.cache = OrderedDict()   # (pregunta, hash del chunk) -> score
+        self.lock = threading.Lock()
+        self.lock_modelo = threading.Lock()   # el tokenizer rápido no se puede usar desde dos hilos a la vez
+        self.segundos_por_par = None  # promedio móvil, para saber si el próximo batch entra
+        self.estadisticas = {"aciertos_cache": 0, "pares_puntuados": 0, "cortes_por_presupuesto": 0}
+
+    def _desde_cache(self, clave):
+        with self.lock:
+            score = self.cache.get(clave)
+            if score is not None:
+                self.cache.move_to_end(clave)
+                self.estadisticas["aciertos_cache"] += 1
+            return score
+
+    def _guardar(self, clave, score):
+        with self.lock:
+            self.cache[clave] = score
+            self.cache.move_to_end(clave)
+            while len(self.cache) > self.tamano_cache:
+                self.cache.popitem(last=False)
+
+    def _puntuar_batch(self, pregunta, textos):
+        pares = [{"text": pregunta, "text_pair": texto} for texto in textos]
+        # function_to_apply="none": el logit crudo (los cross-encoders de MS MARCO tienen una sola salida)
+        with self.lock_modelo:
+            salida = self.pipeline(pares, batch_size=self.batch_size, truncation=True, function_to_apply="none")
+        return [float(s["score"]) for s in salida]
+
+    def puntuar(self, pregunta, textos, presupuesto_ms=PRESUPUESTO_RERANK_MS):
+        """
+        Score de cada texto para la pregunta (más alto = más relevante), o None
+        para los que no llegaron a puntuarse dentro del presupuesto. Se
+        puntúan en el orden recibido, así lo que queda afuera es el final.
+        """
+        pregunta = " ".join(pregunta.split())
+        claves = [(pregunta, _clave_texto(texto)) for texto in textos]
+        scores = [self._desde_cache(clave) for clave in claves]
+        pendientes = [i for i, score in enumerate(scores) if score is None]
+
+        limite = time.perf_counter() + presupuesto_ms / 1000
+        posicion = 0
+        while posicion < len(pendientes):
+            # Sin estimación todavía (primera consulta) se mide con un solo par
+            # antes de arriesgar un batch entero contra el presupuesto
+            tamano = 1 if self.segundos_por_par is None else self.batch_size
+            lote = pendientes[posicion:posicion + tamano]
+            ahora = time.perf_counter()
+            if ahora + (self.segundos_por_par or 0) * len(lote) > limite:
+                self.estadisticas["cortes_por_presupuesto"] += 1
+                break
+            for i, score in zip(lote, self._puntuar_batch(pregunta, [textos[i] for i in lote])):
+                scores[i] = score
+                self._guardar(claves[i], score)
+            por_par = (time.perf_counter() - ahora) / len(lote)
+            self.segundos_por_par = por_par if self.segundos_por_par is None else 0.8 * self.segundos_por_par + 0.2 * por_par
+            self.estadisticas["pares_puntuados"] += len(lote)
+            posicion += len(lote)
+        return scores
+
+    def reordenar(self, pregunta, resultados, top_k, presupuesto_ms=PRESUPUESTO_RERANK_MS):
+        """
+        Reordena los 'resultados' de la primera etapa (dicts con "texto", de
+        mejor a peor) por el score del cross-encoder y devuelve los top_k, con
+        el score en "score_rerank". Sólo se reordena el tramo inicial que se
+        llegó a puntuar; lo que quedó fuera del presupuesto sigue atrás en el
+        orden original y con score_rerank None (aunque hubiera un score en el
+        cache, no se usó para ordenar).
+        """
+        scores = self.puntuar(pregunta, [r["texto"] for r in resultados], presupuesto_ms)
+        puntuados = next((i for i, score in enumerate(scores) if score is None), len(scores))
+        tramo = sorted(range(puntuados), key=lambda i: -scores[i])
+        orden = tramo + list(range(puntuados, len(resultados)))
+        return [dict(resultados[i], score_rerank=scores[i] if i < puntuados else None) for i in orden[:top_k]]
@@ -0,0 +1,263 @@
+# servidor_consultas.py
+
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cache_consultas import obtener_cache_consultas
+from embedding_cache import encode_con_cache
+from query_rag import (CANDIDATOS_RERANK, EMBEDDING_MODEL_NAME, RERANK, TOP_K, USAR_CACHE_CONSULTAS, _a_timestamp,
+                       buscar_en_fuente, cargar_fuente, fuente_desactualizada, version_indice)
+from registro_modelos import obtener_modelo, obtener_reranker
+
+# Servicio de consultas residente: carga el índice, el mapping y el modelo una
+# sola vez y atiende pedidos HTTP locales. Las consultas que llegan dentro de
+# VENTANA_LOTE_MS se juntan en un lote: un solo encode y una sola búsqueda en
+# FAISS para todas. Cuando se publica un índice nuevo se carga sin reiniciar.
+# Pasa por el mismo cache de consultas que query_rag (USAR_CACHE_CONSULTAS).
+#
+#   python servidor_consultas.py
+#   curl "http://127.0.0.1:8765/consulta?q=inflación&medio=clarin.com&top_k=5"
+HOST = "127.0.0.1"
+PUERTO = 8765
+VENTANA_LOTE_MS = 5            # cuánto se espera a que lleguen más consultas para el mismo lote
+MAX_LOTE = 64                  # consultas por lote como máximo
+SEGUNDOS_ENTRE_CHEQUEOS = 2    # cada cuánto se mira si se publicó un índice nuevo
+MAX_TOP_K = 100
+
+
+def _clave_filtros(valor):
+    """Las listas de medios / secciones pasan a tupla, para poder agrupar por filtros."""
+    return tuple(valor) if isinstance(valor, list) else valor
+
+
+class ServidorConsultas:
+    """
+    Índice + modelo cargados y un hilo que arma los lotes. consultar() se puede
+    llamar desde muchos hilos a la vez (uno por pedido HTTP).
+    """
+    def __init__(self):
+        print("🔄 Cargando modelo de embeddings para query...")
+        self.modelo = obtener_modelo(EMBEDDING_MODEL_NAME)
+        self.fuente = cargar_fuente()
+        self.ultimo_chequeo = time.monotonic()
+        self.pendientes = queue.Queue()
+        self.estadisticas = {"consultas": 0, "lotes": 0, "recargas": 0}
+        self.cache = obtener_cache_consultas() if USAR_CACHE_CONSULTAS else None
+        threading.Thread(target=self._atender, name="lotes", daemon=True).start()
+
+    def consultar(self, pregunta, top_k=TOP_K, desde=None, hasta=None, medio=None, seccion=None, rerank=None):
+        """
+        Encola la consulta, espera a que se busque su lote y devuelve
+        (resultados, versión del índice). El reranking (si corresponde) corre
+        en el hilo de quien pregunta, así no frena el armado de lotes.
+        """
+        rerank = RERANK if rerank is None else rerank
+        pedido = {
+            "pregunta": " ".join(pregunta.split()),
+            "top_k": max(CANDIDATOS_RERANK, top_k) if rerank else top_k,
+            "filtros": (desde, hasta, _clave_filtros(medio), _clave_filtros(seccion)),
+            "listo": threading.Event(),
+            "resultados": None,
+            "version": None,
+            "error": None,
+        }
+        self.pendientes.put(pedido)
+        pedido["listo"].wait()
+        if pedido["error"] is not None:
+            raise pedido["error"]
+        resultados = pedido["resultados"]
+        if rerank:
+            resultados = obtener_reranker().reordenar(pedido["pregunta"], resultados, top_k)
+        return resultados, pedido["version"]
+
+    def estado(self):
+        lotes = self.estadisticas["lotes"]
+        return dict(self.estadisticas, tipo=self.fuente["tipo"], version=self.fuente["version"],
+                    consultas_por_lote=round(self.estadisticas["consultas"] / lotes, 2) if lotes else None,
+                    cache=self.cache.estadisticas() if self.cache is not None else None)
+
+    def _juntar_lote(self):
+        lote = [self.pendientes.get()]
+        limite = time.monotonic() + VENTANA_LOTE_MS / 1000
+        while len(lote) < MAX_LOTE:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.pendientes.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _recargar_si_cambio(self):
+        ahora = time.monotonic()
+        if ahora - self.ultimo_chequeo < SEGUNDOS_ENTRE_CHEQUEOS:
+            return
+        self.ultimo_chequeo = ahora
+        if fuente_desactualizada(self.fuente):
+            print("🔁 Se publicó un índice nuevo: lo cargo sin cortar el servicio...")
+            # Sólo este hilo busca: la fuente vieja se suelta al terminar el lote anterior
+            self.fuente = cargar_fuente()
+            self.estadisticas["recargas"] += 1
+
+    def _atender(self):
+        while True:
+            lote = self._juntar_lote()
+            try:
+                self._recargar_si_cambio()
+                self._buscar_lote(lote)
+            except Exception as e:
+                print(f"❌ Falló un lote de {len(lote)} consultas: {e}")
+                for pedido in lote:
+                    if not pedido["listo"].is_set():
+                        pedido["error"] = e
+                        pedido["listo"].set()
+
+    def _responder(self, pedido, resultados, version, error=None):
+        pedido["resultados"] = resultados
+        pedido["version"] = version
+        pedido["error"] = error
+        pedido["listo"].set()
+
+    def _buscar_lote(self, lote):
+        # Un solo encode para todo el lote (sólo las preguntas que no estén en el
+        # cache); después una búsqueda por cada combinación de filtros (casi siempre es una sola)
+        preguntas = [p["pregunta"] for p in lote]
+        if self.cache is not None:
+            embeddings = self.cache.vectorizar(self.modelo, preguntas, EMBEDDING_MODEL_NAME)
+        else:
+            embeddings = encode_con_cache(self.modelo, preguntas, EMBEDDING_MODEL_NAME)
+        grupos = {}
+        for fila, pedido in enumerate(lote):
+            grupos.setdefault(pedido["filtros"], []).append(fila)
+
+        for (desde, hasta, medio, seccion), filas in grupos.items():
+            version = version_indice(self.fuente, desde, hasta)
+            claves = {}
+            if self.cache is not None:
+                # Resultados sin rerank (el rerank va después, en el hilo del pedido)
+                for f in filas:
+                    claves[f] = self.cache.clave_resultados(embeddings[f], lote[f]["top_k"],
+                                                            (desde, hasta, medio, seccion, False), version)
+                    guardados = self.cache.buscar_resultados(claves[f])
+                    if guardados is not None:
+                        self._responder(lote[f], [dict(r) for r in guardados], version)
+                filas = [f for f in filas if not lote[f]["listo"].is_set()]
+                if not filas:
+                    continue
+
+            top_k = max(lote[f]["top_k"] for f in filas)
+            try:
+                por_pregunta = buscar_en_fuente(self.fuente, [preguntas[f] for f in filas],
+                                                lambda: embeddings[filas], top_k, desde, hasta, medio, seccion)
+            except ValueError as e:  # un filtro inválido no tiene que tirar el resto del lote
+                for f in filas:
+                    self._responder(lote[f], None, version, e)
+                continue
+            for f, resultados in zip(filas, por_pregunta):
+                resultados = resultados[:lote[f]["top_k"]]
+                if f in claves:
+                    self.cache.guardar_resultados(claves[f], [dict(r) for r in resultados])
+                self._responder(lote[f], resultados, version)
+
+        self.estadisticas["lotes"] += 1
+        self.estadisticas["consultas"] += len(lote)
+
+
+def _a_bool(valor):
+    if isinstance(valor, str):
+        return valor.strip().lower() in ("1", "true", "si", "sí")
+    return valor
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    """GET /consulta?q=... (o POST con JSON), GET /estado."""
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/estado":
+            self._responder(200, self.server.consultas.estado())
+        elif url.path == "/consulta":
+            parametros = {clave: valores if len(valores) > 1 else valores[0]
+                          for clave, valores in parse_qs(url.query).items()}
+            self._consultar(parametros)
+        else:
+            self._responder(404, {"error": f"No existe {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/consulta":
+            self._responder(404, {"error": f"No existe {self.path}"})
+            return
+        try:
+            parametros = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._responder(400, {"error": "El cuerpo no es JSON válido"})
+            return
+        self._consultar(parametros)
+
+    def _consultar(self, parametros):
+        inicio = time.perf_counter()
+        pregunta = (parametros.get("q") or parametros.get("pregunta") or "").strip()
+        if not pregunta:
+            self._responder(400, {"error": "Falta la pregunta (q)"})
+            return
+        try:
+            top_k = max(1, min(int(parametros.get("top_k", TOP_K)), MAX_TOP_K))
+            resultados, version = self.server.consultas.consultar(
+                pregunta, top_k,
+                desde=_a_timestamp(parametros.get("desde")),
+                hasta=_a_timestamp(parametros.get("hasta")),
+                medio=parametros.get("medio"),
+                seccion=parametros.get("seccion"),
+                rerank=_a_bool(parametros.get("rerank")),
+            )
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+            return
+        self._responder(200, {
+            "pregunta": pregunta,
+            "version": version,
+            "ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "resultados": resultados,
+        })
+
+    def log_message(self, formato, *args):
+        pass  # sin una línea por pedido
+
+
+def servir(host=HOST, puerto=PUERTO):
+    """Levanta el servicio (bloquea hasta Ctrl+C)."""
+    httpd = ThreadingHTTPServer((host, puerto), _Manejador)
+    httpd.daemon_threads = True
+    httpd.consultas = ServidorConsultas()
+    print(f"🛰️ Atendiendo consultas en http://{host}:{puerto}/consulta?q=... (Ctrl+C para cortar)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Cortando el servicio de consultas.")
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de consultas RAG (índice y modelo en memoria)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    args = parser.parse_args()
+    servir(args.host, args.puerto)
@@ -0,0 +1,113 @@
+# triage_snippets.py
+
+import re
+
+import numpy as np
+
+from article_store import ARTICLE_STORE_DB, ArticleStore, canonicalizar_url
+from registro_modelos import obtener_modelo
+
+# Modelo chico (y multilingüe) para puntuar títulos + snippets del RSS
+MODELO_TRIAGE = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Temas que nos interesan para el clipping. La relevancia de cada entrada es
+# su similitud coseno con el tema más parecido.
+TEMAS_RELEVANTES = [
+    "Política argentina: gobierno nacional, presidente, ministros y Congreso",
+    "Economía argentina: inflación, dólar, FMI, presupuesto y medidas económicas",
+    "Elecciones, candidatos y partidos políticos en Argentina",
+    "Justicia argentina: causas judiciales contra funcionarios y la Corte Suprema",
+    "Gobernadores, provincias y conflictos sindicales en Argentina",
+]
+
+UMBRAL_RELEVANCIA = 0.30  # por debajo de esto la entrada se considera fuera de tema (sin calibrar todavía)
+UMBRAL_DUPLICADO = 0.90   # por encima de esto es la misma nota que ya tenemos
+MAX_GUARDADOS = 2000      # cuántos artículos recientes del store se usan para comparar
+
+# "priorizar": se bajan igual, pero al final de la cola
+# "saltear": no se bajan las entradas fuera de tema o repetidas. Cambia lo que se
+#            junta, así que conviene usarlo recién cuando UMBRAL_RELEVANCIA esté medido
+MODO_TRIAGE = "priorizar"
+
+
+def _clave_link(ent):
+    """URL canónica de la entrada, o None si no tiene link (eso lo saltea fetch_full_articles)."""
+    link = (ent.get("link") or "").strip()
+    return canonicalizar_url(link) if link else None
+
+
+def _texto_entrada(ent):
+    snippet = re.sub(r"<[^>]+>", " ", ent.get("snippet", "") or "")
+    return re.sub(r"\s+", " ", f"{ent.get('titulo', '')}. {snippet}").strip()
+
+
+def triage_entradas(entradas, modelo=None, umbral_relevancia=UMBRAL_RELEVANCIA,
+                    umbral_duplicado=UMBRAL_DUPLICADO, modo=MODO_TRIAGE, store_path=ARTICLE_STORE_DB):
+    """
+    Puntúa título + snippet de cada entrada del RSS (todo en un solo batch) y
+    decide cuáles vale la pena bajar completas:
+      - relevancia: similitud con TEMAS_RELEVANTES
+      - duplicado: similitud con una nota que ya tenemos en el ArticleStore
+        (o con otra entrada anterior del mismo RSS)
+    Cada entrada vuelve con la clave "triage". Retorna (a_bajar, descartadas);
+    en modo "priorizar" no se descarta nada, sólo se reordena.
+    """
+    if not entradas:
+        return [], []
+    if modelo is None:
+        print(f"🔄 Cargando modelo de triage '{MODELO_TRIAGE}'...")
+        modelo = obtener_modelo(MODELO_TRIAGE)
+
+    store = ArticleStore(store_path)
+    guardados = store.recientes(MAX_GUARDADOS)
+    store.cerrar()
+
+    textos = [_texto_entrada(ent) for ent in entradas]
+    titulos = [ent.get("titulo", "") or "" for ent in entradas]
+    titulos_guardados = [g["titulo"] or "" for g in guardados]
+    print(f"🧮 Puntuando {len(textos)} entradas del RSS contra {len(guardados)} notas guardadas...")
+    # Un solo encode para todo: título + snippet (relevancia), temas y títulos (duplicados)
+    vectores = modelo.encode(textos + TEMAS_RELEVANTES + titulos + titulos_guardados,
+                             batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+    n, t = len(textos), len(TEMAS_RELEVANTES)
+    v_entradas = vectores[:n]
+    v_temas = vectores[n:n + t]
+    v_titulos = vectores[n + t:2 * n + t]
+    v_guardados = vectores[2 * n + t:]
+
+    relevancia = (v_entradas @ v_temas.T).max(axis=1)
+    # Para los duplicados comparamos título contra título
+    sim_guardados = v_titulos @ v_guardados.T if len(guardados) else np.zeros((n, 0))
+    sim_entre_entradas = v_titulos @ v_titulos.T
+
+    a_bajar, descartadas = [], []
+    for i, ent in enumerate(entradas):
+        clave = _clave_link(ent)
+        duplicado_de = None
+        if sim_guardados.shape[1]:
+            j = int(sim_guardados[i].argmax())
+            # El mismo link no cuenta como duplicado: de eso se ocupa el ArticleStore
+            if sim_guardados[i, j] >= umbral_duplicado and guardados[j]["url_canonica"] != clave:
+                duplicado_de = guardados[j]["id"]
+        if duplicado_de is None and i > 0:
+            j = int(sim_entre_entradas[i, :i].argmax())
+            if sim_entre_entradas[i, j] >= umbral_duplicado and _clave_link(entradas[j]) != clave:
+                duplicado_de = entradas[j].get("link")
+
+        ent = dict(ent, triage={"relevancia": round(float(relevancia[i]), 3), "duplicado_de": duplicado_de})
+        if relevancia[i] < umbral_relevancia or duplicado_de is not None:
+            descartadas.append(ent)
+        else:
+            a_bajar.append(ent)
+
+    a_bajar.sort(key=lambda e: -e["triage"]["relevancia"])
+    if modo == "priorizar":
+        print(f"   • {len(a_bajar)} entradas en tema, {len(descartadas)} fuera de tema o repetidas "
+              f"(se bajan igual, al final de la cola)")
+        descartadas.sort(key=lambda e: -e["triage"]["relevancia"])
+        return a_bajar + descartadas, []
+    print(f"   • {len(a_bajar)} entradas para bajar")
+    if descartadas:
+        print(f"⚠️ {len(descartadas)} entradas NO se van a bajar (fuera de tema o repetidas, "
+              f"umbral {umbral_relevancia}). Ver la lista en links_descartados.json")
+    return a_bajar, descartadas